@@ -1,12 +1,17 @@
 import logging
 import tkinter as tk
-from tkinter import ttk, messagebox
-import requests
+from tkinter import ttk, messagebox, filedialog
+
+from progress_dialog import ProgressDialog
+from vin_decoder import (BATCH_SIZE, BulkIntakeReport, chunked, decode_and_insert, normalize_vin, parse_vin_text,
+                         read_vin_file, split_valid_vins)
+
 
 class AddCarPage(tk.Frame):
     def __init__(self, parent, controller, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.controller = controller
+        self.pending_vins = set()  # VINs submitted for decoding that haven't come back yet
 
         # VIN Entry
         self.vin_entry = ttk.Entry(self)
@@ -21,54 +26,155 @@ class AddCarPage(tk.Frame):
         # Bind return key (Enter key) to enter_vin method
         self.vin_entry.bind('<Return>', lambda event: self.enter_vin())
 
+        self.create_bulk_intake_ui()
+
+    def create_bulk_intake_ui(self):
+        # Bulk intake: paste a list of VINs or load them from a text/CSV file
+        ttk.Label(self, text="Bulk VINs:").grid(row=1, column=0, padx=10, pady=10, sticky="ne")
+        self.bulk_text = tk.Text(self, height=10, width=40)
+        self.bulk_text.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
+
+        bulk_buttons = ttk.Frame(self)
+        bulk_buttons.grid(row=1, column=2, padx=10, pady=10, sticky="n")
+        ttk.Button(bulk_buttons, text="Load File...", command=self.load_vin_file).pack(fill="x", pady=5)
+        ttk.Button(bulk_buttons, text="Add All", command=self.enter_bulk_vins).pack(fill="x", pady=5)
+
+        # Spreadsheet import: cars with their data, added or updated by VIN
+        ttk.Button(bulk_buttons, text="Import Cars...", command=self.import_cars).pack(fill="x", pady=(15, 5))
+        self.decode_missing_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(bulk_buttons, text="Decode rows without make/model",
+                        variable=self.decode_missing_var).pack(fill="x")
+
+        # Per-VIN status: pending while decoding, then added or the reason it failed
+        ttk.Label(self, text="Status:").grid(row=2, column=0, padx=10, pady=10, sticky="ne")
+        self.status_tree = ttk.Treeview(self, columns=("vin", "status"), show="headings", height=10)
+        self.status_tree.heading("vin", text="VIN")
+        self.status_tree.heading("status", text="Status")
+        self.status_tree.column("vin", width=180)
+        self.status_tree.column("status", width=360)
+        self.status_tree.grid(row=2, column=1, columnspan=2, padx=10, pady=10, sticky="ew")
+
+        self.cache_label = ttk.Label(self, text="")
+        self.cache_label.grid(row=3, column=1, columnspan=2, padx=10, sticky="w")
+
+    def update_cache_label(self):
+        cache = self.controller.vin_service.cache
+        if cache is None:
+            return
+        stats = cache.stats()
+        self.cache_label.config(text=f"Decode cache: {stats['hits'] + stats['pattern_hits']} hits, "
+                                     f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+    def set_vin_status(self, vin, status):
+        if self.status_tree.exists(vin):
+            self.status_tree.item(vin, values=(vin, status))
+        else:
+            self.status_tree.insert("", 0, iid=vin, values=(vin, status))
+
     def enter_vin(self):
-        vin = self.vin_entry.get().upper()  # Convert VIN to uppercase for consistency
+        vin = normalize_vin(self.vin_entry.get())  # Convert VIN to uppercase for consistency
         logging.debug(f"Entered VIN: {vin}")
+        if self.submit_vins([vin]):
+            self.vin_entry.delete(0, tk.END)
 
-        # Check for invalid characters in the VIN
-        if any(char in vin for char in "IOQ"):
-            messagebox.showerror("Error", "VIN cannot contain the characters I, O, or Q.")
-            logging.debug("Invalid VIN characters detected")
+    def load_vin_file(self):
+        path = filedialog.askopenfilename(filetypes=[("VIN lists", "*.txt *.csv"), ("All files", "*.*")])
+        if not path:
             return
-
-        # Check if the VIN exceeds 17 characters
-        if len(vin) > 17 or len(vin) < 11:
-            messagebox.showerror("Error", "VIN must be between 11 and 17 characters.")
-            logging.debug("Invalid VIN length detected")
+        try:
+            vins = read_vin_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            logging.error(f"Failed to read VIN file {path}: {e}")
+            messagebox.showerror("Error", f"Failed to read VIN file: {str(e)}")
             return
+        self.bulk_text.insert(tk.END, "\n".join(vins) + "\n")
+        logging.debug(f"Loaded {len(vins)} VINs from {path}")
 
-        # Start the process to fetch VIN details and update inventory
-        self.fetch_vin_details(vin)
-
-    def fetch_vin_details(self, vin):
-        url = 'https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVINValuesBatch/'
-        post_fields = {'format': 'json', 'data': vin}
-        response = requests.post(url, data=post_fields)
-        logging.debug("API request sent to decode VIN")
-        self.process_vin_response(response.json(), vin)
-
-    def process_vin_response(self, response_data, vin):
-        if response_data["Count"] > 0:
-            result = response_data["Results"][0]
-            make = result.get("Make", "N/A").upper()
-            model = result.get("Model", "N/A").upper()
-            model_year = result.get("ModelYear", "N/A")
-            series = result.get("Series", "N/A").upper()
-
-            # Default values for options and key features
-            options = " "
-            key_features = " "
-            stock_number = vin[-4:]  # Last 4 digits of VIN
+    def import_cars(self):
+        path = filedialog.askopenfilename(filetypes=[("Car spreadsheets", "*.csv *.jsonl"), ("All files", "*.*")])
+        if not path:
+            return
+        dialog = ProgressDialog(self, "Importing Cars")
+        try:
+            job = self.controller.import_cars(
+                path, self.decode_missing_var.get(),
+                on_done=lambda report: self.import_finished(dialog, report),
+                on_error=lambda error: self.import_failed(dialog, error),
+                on_progress=dialog.update_progress)
+        except ValueError as e:
+            self.import_failed(dialog, e)
+            return
+        dialog.on_cancel = job.cancel
 
+    def import_finished(self, dialog, report):
+        dialog.close()
+        self.update_cache_label()
+        if report.inserted or report.updated:
+            inventory_page = self.controller.frames.get('InventoryPage')
+            if inventory_page is not None:
+                inventory_page.update_inventory_list()
+        if not report.errors:
+            messagebox.showinfo("Import", report.summary())
+            return
+        if not messagebox.askyesno("Import", f"{report.summary()}.\n\nSave the failed rows to a file?"):
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if path:
             try:
-                # Insert car data into the database and update the inventory page
-                self.controller.insert_car(vin, make, model, model_year, series, options, key_features, stock_number)
-                logging.debug("Car data inserted into the database")
-                self.controller.frames['InventoryPage'].update_inventory_list()
-                self.controller.show_frame("InventoryPage")
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
-                logging.error(f"Error inserting car data: {e}")
-        else:
-            messagebox.showerror("Error", "No results found for the entered VIN.")
-            logging.debug("No results found for the entered VIN")
+                report.write_errors(path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to save the error report: {str(e)}")
+
+    def import_failed(self, dialog, error):
+        dialog.close()
+        logging.error(f"Failed to import cars: {error}")
+        messagebox.showerror("Error", f"Failed to import cars: {str(error)}")
+
+    def enter_bulk_vins(self):
+        vins = parse_vin_text(self.bulk_text.get("1.0", tk.END))
+        if not vins:
+            messagebox.showerror("Error", "Please enter at least one VIN.")
+            return
+        self.submit_vins(vins)
+        self.bulk_text.delete("1.0", tk.END)
+
+    def submit_vins(self, vins):
+        """Validates VINs and queues the valid ones for background decoding. Returns False if none were queued."""
+        report = BulkIntakeReport()
+        valid_vins = [vin for vin in split_valid_vins(vins, report) if vin not in self.pending_vins]
+        for vin, reason in report.failures:
+            self.set_vin_status(vin, reason)
+        if len(vins) == 1 and report.failures:
+            messagebox.showerror("Error", report.failures[0][1])
+            return False
+
+        for chunk in chunked(valid_vins, BATCH_SIZE):
+            for vin in chunk:
+                self.pending_vins.add(vin)
+                self.set_vin_status(vin, "Decoding...")
+            self.controller.ui_queue.run(
+                self.controller.vin_service.executor, decode_and_insert, chunk,
+                self.controller.vin_service.decode, self.controller.insert_cars,
+                on_done=lambda report, chunk=chunk: self.chunk_finished(report, chunk),
+                on_error=lambda error, chunk=chunk: self.chunk_failed(chunk, error))
+        return bool(valid_vins)
+
+    def chunk_failed(self, chunk, error):
+        logging.error(f"Error inserting car data: {error}")
+        for vin in chunk:
+            self.pending_vins.discard(vin)
+            self.set_vin_status(vin, str(error))
+
+    def chunk_finished(self, report, chunk):
+        # Called on the Tk thread once a chunk of VINs has been decoded and inserted
+        for vin in chunk:
+            self.pending_vins.discard(vin)
+        for vin in report.added:
+            self.set_vin_status(vin, "Added")
+        for vin, reason in report.failures:
+            self.set_vin_status(vin, reason)
+        self.update_cache_label()
+
+        if report.added:
+            logging.debug(f"Inserted {len(report.added)} decoded cars into the database")
+            self.controller.frames['InventoryPage'].update_inventory_list()
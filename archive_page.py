@@ -2,6 +2,33 @@ import logging
 import tkinter as tk
 from tkinter import ttk, messagebox
 from notification_frame import NotificationFrame
+from inventory_db import ARCHIVED, PAGE_SIZE
+from schema import format_model_year
+from virtual_list import PagedListLoader, VirtualList
+
+
+class ArchiveRow(ttk.Frame):
+    """A recyclable archive row; render() points it at a different car."""
+
+    def __init__(self, parent, page):
+        super().__init__(parent, borderwidth=2, relief="groove")
+        self.car = None
+
+        # Main clickable area representing the car
+        self.car_button = ttk.Button(self, command=lambda: page.show_car_details(self.car))
+        self.car_button.pack(side="left", fill="both", expand=True)
+
+        # Frame for quick action buttons
+        action_frame = ttk.Frame(self)
+        action_frame.pack(side="right", fill="y")
+
+        # De-Archive button
+        dearchive_button = ttk.Button(action_frame, text="De-Archive", command=lambda: page.dearchive_car(self.car))
+        dearchive_button.pack(fill="x", pady=5)
+
+    def render(self, car):
+        self.car = car
+        self.car_button.config(text=f"{car.make} {car.model} ({format_model_year(car.model_year)}) - {car.series}")
 
 
 class ArchivePage(tk.Frame):
@@ -18,20 +45,15 @@ class ArchivePage(tk.Frame):
         scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
         scrollbar.pack(side="right", fill="y")
 
-        # Configure the canvas to use the scrollbar
-        self.canvas.configure(yscrollcommand=scrollbar.set)
-
-        # Create a frame inside the canvas to hold the archive list
-        self.archive_container = ttk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.archive_container, anchor="nw")
+        # Only the visible rows get widgets; they are recycled as the canvas scrolls
+        self.car_list = VirtualList(self.canvas, scrollbar, lambda parent: ArchiveRow(parent, self),
+                                    key=lambda car: car.id)
+        # Rows are loaded a page at a time as the list is scrolled
+        self.loader = PagedListLoader(self.car_list, self.fetch_page, PAGE_SIZE)
 
         # Bind the canvas to make it scrollable with mouse wheel
         self.bind_mousewheel(self.canvas)
 
-        # Configure event for updating scroll region
-        self.archive_container.bind("<Configure>",
-                                    lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-
         self.update_inventory_list()
 
     def bind_mousewheel(self, widget):
@@ -44,40 +66,20 @@ class ArchivePage(tk.Frame):
     def unbind_mousewheel(self, widget):
         self.unbind_all("<MouseWheel>")
 
-    def update_inventory_list(self):
-        # Clear the previous inventory list
-        for widget in self.archive_container.winfo_children():
-            widget.destroy()
-
-        cars = self.controller.fetch_archived_cars()
-        for car in cars:
-            car_frame = ttk.Frame(self.archive_container, borderwidth=2, relief="groove")
-            car_frame.pack(fill="x", padx=10, pady=5, expand=True)
+    def fetch_page(self, after, limit):
+        return self.controller.query_cars(status=ARCHIVED, after=after, limit=limit)
 
-            # Main clickable area representing the car
-            car_button = ttk.Button(car_frame,
-                                    text=f"{car[2]} {car[3]} ({car[4]}) - {car[5]}",
-                                    command=lambda c=car: self.show_car_details(c))
-            car_button.pack(side="left", fill="both", expand=True)
-
-            # Frame for quick action buttons
-            action_frame = ttk.Frame(car_frame)
-            action_frame.pack(side="right", fill="y")
-
-            # De-Archive button
-            dearchive_button = ttk.Button(action_frame, text="De-Archive", command=lambda c=car: self.dearchive_car(c))
-            dearchive_button.pack(fill="x", pady=5)
+    def update_inventory_list(self):
+        self.loader.reload()
 
     def show_car_details(self, car):
-        self.controller.show_car_details(car)
+        self.controller.show_frame("CarDetailsPage", vin=car.vin)
 
     def dearchive_car(self, car):
-        vin = car[1]
+        vin = car.vin
         try:
-            # Insert car back into the inventory
-            self.controller.insert_car_into_inventory(car)
-            # Delete car from archived cars
-            self.controller.delete_car_from_archive(vin)
+            # Flip the car back to active in one atomic update
+            self.controller.dearchive_car(vin)
             # Update the archive list
             self.update_inventory_list()
             self.notification_frame.add_notification("Car de-archived successfully!")
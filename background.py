@@ -0,0 +1,50 @@
+import logging
+import queue
+
+
+class TkCallbackQueue:
+    """
+    Hands results from worker threads back to the Tk main thread.
+
+    Tk widgets may only be touched from the thread running mainloop, so workers post
+    callbacks here and the queue is drained on the Tk thread with after().
+    """
+
+    def __init__(self, widget, interval=50):
+        self.widget = widget
+        self.interval = interval
+        self._queue = queue.Queue()
+        self.widget.after(self.interval, self._drain)
+
+    def post(self, callback, *args):
+        self._queue.put((callback, args))
+
+    def run(self, executor, func, *args, on_done=None, on_error=None):
+        """Runs func(*args) on executor and calls on_done(result) or on_error(exc) on the Tk thread."""
+        future = executor.submit(func, *args)
+
+        def done(f):
+            if f.cancelled():
+                return
+            error = f.exception()
+            if error is not None:
+                logging.error(f"Background task {getattr(func, '__name__', func)} failed: {error}")
+                if on_error:
+                    self.post(on_error, error)
+            elif on_done:
+                self.post(on_done, f.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def _drain(self):
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                logging.exception("Error in UI callback from background task")
+        self.widget.after(self.interval, self._drain)
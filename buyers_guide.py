@@ -0,0 +1,264 @@
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+from PyPDF2.generic import ArrayObject, BooleanObject, DictionaryObject, NameObject, TextStringObject
+
+from inventory_report import REPORT_DIR, ReportCancelled, unique_report_path
+from schema import format_model_year
+
+GUIDE_TEMPLATE = 'buyers_guide_orig.pdf'
+GUIDE_PREFIX = 'buyers_guide'
+
+# Form field -> car attribute it is filled from
+GUIDE_FIELDS = {
+    "make": "make",
+    "model": "model",
+    "year": "model_year",
+    "vin": "vin",
+    "stock_number": "stock_number",
+}
+GUIDE_COLUMNS = tuple(GUIDE_FIELDS.values())
+
+# Cars filled per worker task; batches smaller than this are filled without starting a process pool
+GUIDE_CHUNK = 25
+
+# Parsed templates of this process, keyed by path and checked against the file's mtime
+_templates = {}
+
+
+def guide_values(car):
+    values = {field: getattr(car, column) for field, column in GUIDE_FIELDS.items()}
+    values["year"] = format_model_year(values["year"])
+    return {field: "" if value is None else str(value) for field, value in values.items()}
+
+
+def page_annotations(page):
+    # Indexing resolves indirect objects; get() would return the bare reference
+    return page["/Annots"] if "/Annots" in page else ()
+
+
+class GuideTemplate:
+    """
+    The buyers guide form, parsed once. widgets maps each page index to the
+    (annotation index, field name) pairs of its form fields, so filling a guide goes
+    straight to the fields instead of walking every annotation.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.reader = PyPDF2.PdfReader(io.BytesIO(f.read()))
+        root = self.reader.trailer["/Root"]
+        self.form = root["/AcroForm"] if "/AcroForm" in root else DictionaryObject()
+        self.widgets = {}
+        for page_index, page in enumerate(self.reader.pages):
+            for annot_index, annot in enumerate(page_annotations(page)):
+                name = annot.get_object().get("/T")
+                if name:
+                    self.widgets.setdefault(page_index, []).append((annot_index, str(name)))
+
+    def fill(self, writer, values, suffix=""):
+        """
+        Appends the template's pages to writer with values filled in. Field names get
+        suffix, so guides merged into one document don't share values. Returns the
+        references of the new field widgets for the AcroForm.
+        """
+        fields = []
+        for page_index, page in enumerate(self.reader.pages):
+            added = writer.add_page(page)
+            widgets = self.widgets.get(page_index)
+            if not widgets:
+                continue
+            # Page copies share their annotations with the template; give this copy its own widgets
+            annots = ArrayObject(added["/Annots"])
+            for annot_index, name in widgets:
+                widget = DictionaryObject(annots[annot_index].get_object())
+                widget[NameObject("/T")] = TextStringObject(name + suffix)
+                widget[NameObject("/V")] = TextStringObject(values.get(name, ""))
+                widget[NameObject("/P")] = added.indirect_reference
+                annots[annot_index] = writer._add_object(widget)
+                fields.append(annots[annot_index])
+            added[NameObject("/Annots")] = annots
+        return fields
+
+    def finish(self, writer, fields):
+        """Gives writer an AcroForm listing fields; viewers draw the filled values themselves."""
+        form = DictionaryObject({
+            NameObject("/Fields"): ArrayObject(fields),
+            NameObject("/NeedAppearances"): BooleanObject(True),
+        })
+        if "/DA" in self.form:
+            form[NameObject("/DA")] = self.form["/DA"]
+        if "/DR" in self.form:
+            form[NameObject("/DR")] = self.form["/DR"].clone(writer)
+        writer._root_object[NameObject("/AcroForm")] = writer._add_object(form)
+
+
+def load_template(path=GUIDE_TEMPLATE):
+    """This process's parsed copy of the template, re-read only when the file changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _templates.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _templates[path] = (mtime, GuideTemplate(path))
+        logging.debug(f"Parsed buyers guide template {path}")
+    return cached[1]
+
+
+def fill_guides(guides, template_path=GUIDE_TEMPLATE, directory=None):
+    """
+    Fills (vin, values, suffix) guides. Without a directory they go into one document,
+    returned as PDF bytes; otherwise every guide is written to <directory>/<vin>.pdf and
+    the paths are returned. Runs in the process pool, so it only takes picklable arguments.
+    """
+    template = load_template(template_path)
+    if directory is None:
+        writer = PyPDF2.PdfWriter()
+        fields = []
+        for vin, values, suffix in guides:
+            fields += template.fill(writer, values, suffix)
+        template.finish(writer, fields)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    paths = []
+    for vin, values, suffix in guides:
+        writer = PyPDF2.PdfWriter()
+        template.finish(writer, template.fill(writer, values))
+        path = os.path.join(directory, f"{vin}.pdf")
+        with open(path, "wb") as output:
+            writer.write(output)
+        paths.append(path)
+    return paths
+
+
+def merge_guides(template, documents, file_path):
+    """Concatenates filled chunk documents into file_path with one AcroForm over all of them."""
+    writer = PyPDF2.PdfWriter()
+    fields = []
+    for document in documents:
+        for page in PyPDF2.PdfReader(io.BytesIO(document)).pages:
+            added = writer.add_page(page)
+            fields += [annot for annot in page_annotations(added) if "/T" in annot.get_object()]
+    template.finish(writer, fields)
+    with open(file_path, "wb") as output:
+        writer.write(output)
+
+
+class BuyersGuideBatch:
+    """
+    Buyers guides for a set of cars. Cars are read from the database in chunks and
+    filled GUIDE_CHUNK at a time in a process pool, or in this process for small
+    batches and single-core machines. merged=True writes one PDF with a guide per car;
+    otherwise one PDF per VIN in a new folder. run() is meant for a worker thread;
+    progress(stage, done, total) is called as chunks finish and cancel() drops the
+    chunks that haven't started.
+    """
+
+    def __init__(self, db, car_ids, merged=True, template_path=GUIDE_TEMPLATE, directory=REPORT_DIR, workers=None):
+        self.db = db
+        self.car_ids = list(car_ids)
+        self.merged = merged
+        self.template_path = template_path
+        self.directory = directory
+        self.workers = workers
+        self.cancelled = False
+        self._pool = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _chunks(self):
+        index = 0
+        for cars in self.db.iter_cars_by_ids(self.car_ids, GUIDE_COLUMNS, GUIDE_CHUNK):
+            chunk = []
+            for car in cars:
+                chunk.append((car.vin, guide_values(car), f"_{index}" if self.merged else ""))
+                index += 1
+            yield chunk
+
+    def _workers(self):
+        return self.workers or os.cpu_count() or 1
+
+    def _fill_here(self, chunks, target, output, progress, total):
+        """Fills every chunk in this process; merged guides go straight into one writer."""
+        template = load_template(self.template_path)
+        writer = PyPDF2.PdfWriter() if self.merged else None
+        fields = []
+        done = 0
+        for chunk in chunks:
+            if self.cancelled:
+                raise ReportCancelled()
+            if self.merged:
+                for vin, values, suffix in chunk:
+                    fields += template.fill(writer, values, suffix)
+            else:
+                fill_guides(chunk, self.template_path, target)
+            done += len(chunk)
+            if progress:
+                progress("Filling guides", done, total)
+        if self.merged:
+            template.finish(writer, fields)
+            with open(output, "wb") as f:
+                writer.write(f)
+
+    def _fill_in_pool(self, chunks, target, output, progress, total):
+        """Fills the chunks in a process pool; merged chunk documents are concatenated at the end."""
+        results = []
+        done = 0
+        self._pool = ProcessPoolExecutor(max_workers=self._workers())
+        with self._pool:
+            futures = [self._pool.submit(fill_guides, chunk, self.template_path, target) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                if self.cancelled:
+                    raise ReportCancelled()
+                results.append(future.result())
+                done += len(chunk)
+                if progress:
+                    progress("Filling guides", done, total)
+        if self.cancelled:
+            raise ReportCancelled()
+        if self.merged:
+            if progress:
+                progress("Merging guides", done, total)
+            merge_guides(load_template(self.template_path), results, output)
+
+    def run(self, progress=None):
+        """Returns the merged PDF's path or the per-VIN folder, or None if cancelled."""
+        started = time.perf_counter()
+        total = len(self.car_ids)
+        if self.merged:
+            output = unique_report_path(self.directory, GUIDE_PREFIX)
+            target = None
+        else:
+            output = target = unique_report_path(self.directory, GUIDE_PREFIX, folder=True)
+        try:
+            chunks = list(self._chunks())
+            # A pool only pays for its start-up and the final merge with several cores and chunks
+            if len(chunks) <= 1 or self._workers() <= 1:
+                self._fill_here(chunks, target, output, progress, total)
+            else:
+                self._fill_in_pool(chunks, target, output, progress, total)
+        except BaseException:
+            remove_output(output)
+            # Futures dropped by cancel() raise CancelledError
+            if self.cancelled:
+                logging.debug(f"Buyers guides for {total} cars cancelled")
+                return None
+            raise
+        logging.debug(f"Buyers guides for {total} cars written to {output} in {time.perf_counter() - started:.1f} s")
+        return output
+
+
+def remove_output(path):
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
+        os.rmdir(path)
+    elif os.path.exists(path):
+        os.remove(path)
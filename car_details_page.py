@@ -1,39 +1,58 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
 import logging
 
+from key_features import wheel_description
+from option_parser import split_pieces
+from schema import format_model_year, parse_model_year
+
 class CarDetailsPage(tk.Frame):
+    """
+    The details editor. One instance is created by the app and reused for every car
+    through update_details(), so opening a car only resets variables instead of
+    rebuilding ~200 Checkbuttons.
+
+    The option Checkbuttons of a category are built the first time its section is
+    expanded or scrolled into view. Which options are checked lives in
+    selected_options / selected_key_features, so categories that were never built still
+    save correctly.
+    """
+
     def __init__(self, parent, controller, car_details=None):
         super().__init__(parent)
         self.controller = controller
-        self.car_details = car_details  # This is a tuple
+        self.car_details = car_details  # A car_records.Car
         self.entries = {}  # Dictionary to keep track of the Entry widgets
-        self.vars = {}  # Dictionary to keep track of BooleanVars for checkboxes
-        self.key_feature_vars = {}  # Dictionary to keep track of BooleanVars for key feature checkboxes
-        self.load_options()
+        self.vars = {}  # BooleanVars of the option checkboxes built so far
+        self.key_feature_vars = {}  # BooleanVars of the key feature checkboxes built so far
+        self.selected_options = set()
+        self.selected_key_features = set()
+        self.category_sections = {}  # category -> {"header", "body", "expanded", "built"}
+        self.car_options = controller.car_options
+        controller.options_catalog.subscribe(lambda catalog: self.set_car_options(catalog.categories))
         self.create_scrollable_ui()
         if self.car_details:
             self.update_details(self.car_details)
 
-    def load_options(self):
-        with open('car_options.json', 'r') as file:
-            self.car_options = json.load(file)
-
     def create_scrollable_ui(self):
         self.canvas = tk.Canvas(self)
         self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
         self.scrollbar.pack(side="right", fill="y")
         self.canvas.pack(side="left", fill="both", expand=True)
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.configure(yscrollcommand=self.on_canvas_scroll)
 
         self.scrollable_frame = ttk.Frame(self.canvas)
         self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
         self.scrollable_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
         self.bind_mousewheel(self.canvas)
+        self.bind("<Map>", lambda e: self.after_idle(self.build_visible_categories))
 
         self.create_details_ui()
 
+    def on_canvas_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.after_idle(self.build_visible_categories)
+
     def create_details_ui(self):
         fields = ['Make', 'Model', 'Year', 'Series']
         for i, field in enumerate(fields):
@@ -85,33 +104,112 @@ class CarDetailsPage(tk.Frame):
 
         ttk.Checkbutton(wheels_frame, text="Key Feature", variable=self.wheel_key_feature_var, command=self.update_key_features_text).grid(row=3, column=0, columnspan=2, pady=5)
 
-        # Checkbox options with category frames
-        row += 1
-        for category, options in self.car_options.items():
-            category_frame = ttk.LabelFrame(self.scrollable_frame, text=category)
-            category_frame.grid(row=row, column=0, columnspan=2, sticky="ew", padx=10, pady=5)
-            option_row = 0
-            option_col = 0
-            for option in options:
-                var = tk.BooleanVar()
-                key_var = tk.BooleanVar()
-                chk = ttk.Checkbutton(category_frame, text=option, variable=var, command=self.update_options_text)
-                chk.grid(row=option_row, column=option_col, sticky="w", padx=10, pady=2)
-                key_chk = ttk.Checkbutton(category_frame, variable=key_var, command=self.update_key_features_text)
-                key_chk.grid(row=option_row, column=option_col + 1, sticky="w", padx=2, pady=2)
-                self.vars[option] = var
-                self.key_feature_vars[option] = key_var
-                option_col += 2
-                if option_col >= 4:
-                    option_col = 0
-                    option_row += 1
-            row += 1
+        # Collapsible category sections; their checkboxes are built on demand
+        self.categories_frame = ttk.Frame(self.scrollable_frame)
+        self.categories_frame.grid(row=row + 1, column=0, columnspan=2, sticky="ew")
+        self.create_category_sections()
 
         # Save Changes Button
-        ttk.Button(self.scrollable_frame, text="Save Changes", command=self.save_changes).grid(row=row + 1, column=0, columnspan=2, pady=10)
+        ttk.Button(self.scrollable_frame, text="Save Changes", command=self.save_changes).grid(row=row + 2, column=0, columnspan=2, pady=10)
+
+    def create_category_sections(self):
+        for category in self.car_options:
+            header = ttk.Button(self.categories_frame, command=lambda c=category: self.toggle_category(c))
+            header.pack(fill="x", padx=10, pady=(5, 0))
+            body = ttk.Frame(self.categories_frame)
+            body.pack(fill="x", padx=10, pady=(0, 5))
+            self.category_sections[category] = {"header": header, "body": body, "expanded": True, "built": False}
+            self.update_category_header(category)
+
+    def set_car_options(self, car_options):
+        """Rebuilds the category sections (unbuilt) for a changed option catalog."""
+        self.car_options = car_options
+        for section in self.category_sections.values():
+            section["header"].destroy()
+            section["body"].destroy()
+        self.category_sections = {}
+        self.vars = {}
+        self.key_feature_vars = {}
+        self.create_category_sections()
+        self.after_idle(self.build_visible_categories)
+
+    def update_category_header(self, category):
+        section = self.category_sections[category]
+        selected = sum(option in self.selected_options for option in self.car_options[category])
+        arrow = "\u25be" if section["expanded"] else "\u25b8"
+        text = f"{arrow} {category}" + (f" ({selected} selected)" if selected else "")
+        section["header"].configure(text=text)
+
+    def toggle_category(self, category):
+        section = self.category_sections[category]
+        section["expanded"] = not section["expanded"]
+        if section["expanded"]:
+            self.build_category(category)
+            section["body"].pack(fill="x", padx=10, pady=(0, 5), after=section["header"])
+        else:
+            section["body"].pack_forget()
+        self.update_category_header(category)
+
+    def build_visible_categories(self):
+        """Builds the expanded categories whose header is inside the visible part of the canvas."""
+        if not self.winfo_ismapped():
+            return
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        offset = self.categories_frame.winfo_y()
+        for category, section in self.category_sections.items():
+            if section["built"] or not section["expanded"]:
+                continue
+            y = offset + section["header"].winfo_y()
+            if y > bottom:
+                break
+            if y + section["header"].winfo_height() >= top:
+                self.build_category(category)
+
+    def build_category(self, category):
+        section = self.category_sections[category]
+        if section["built"]:
+            return
+        section["built"] = True
+        option_row = 0
+        option_col = 0
+        for option in self.car_options[category]:
+            var = tk.BooleanVar(value=option in self.selected_options)
+            key_var = tk.BooleanVar(value=option in self.selected_key_features)
+            chk = ttk.Checkbutton(section["body"], text=option, variable=var,
+                                  command=lambda o=option: self.on_option_toggled(o))
+            chk.grid(row=option_row, column=option_col, sticky="w", padx=10, pady=2)
+            key_chk = ttk.Checkbutton(section["body"], variable=key_var,
+                                      command=lambda o=option: self.on_key_feature_toggled(o))
+            key_chk.grid(row=option_row, column=option_col + 1, sticky="w", padx=2, pady=2)
+            self.vars[option] = var
+            self.key_feature_vars[option] = key_var
+            option_col += 2
+            if option_col >= 4:
+                option_col = 0
+                option_row += 1
+
+    def on_option_toggled(self, option):
+        toggle(self.selected_options, option, self.vars[option].get())
+        category = self.controller.options_catalog.category_of.get(option)
+        if category in self.category_sections:
+            self.update_category_header(category)
+        self.update_options_text()
+
+    def on_key_feature_toggled(self, option):
+        toggle(self.selected_key_features, option, self.key_feature_vars[option].get())
+        self.update_key_features_text()
+
+    def catalog_order(self, selected):
+        """The selected option names in catalog order, the order the checkboxes are laid out in."""
+        ordered = [option for options in self.car_options.values() for option in options if option in selected]
+        # Options that were removed from the catalog since the car was saved are kept at the end
+        seen = set(ordered)
+        ordered += sorted(option for option in selected if option not in seen)
+        return ordered
 
     def update_options_text(self):
-        selected_options = [option for option, var in self.vars.items() if var.get()]
+        selected_options = self.catalog_order(self.selected_options)
         wheel_description = self.generate_wheel_description()
         if wheel_description:
             selected_options.append(wheel_description)
@@ -119,39 +217,19 @@ class CarDetailsPage(tk.Frame):
         self.options_text.insert("1.0", ", ".join(selected_options))
 
     def update_key_features_text(self):
-        selected_key_features = [option for option, var in self.key_feature_vars.items() if var.get()]
-
-        # Handle special cases for moonroofs
-        moonroof_mappings = {
-            "POWER WINDOWS, LOCKS AND SEAT": "POWER SEAT",
-            "POWER WINDOWS, LOCKS, SEAT AND MOONROOF": "MOONROOF",
-            "POWER WINDOWS, LOCKS, SEATS AND MOONROOF": "MOONROOF",
-            "POWER WINDOWS, LOCKS, SEATS AND DUAL MOONROOF": "DUAL MOONROOF",
-            "POWER WINDOWS, LOCKS, SEATS AND PANORAMIC MOONROOF": "PANORAMIC MOONROOF"
-        }
-
-        for long_key, short_key in moonroof_mappings.items():
-            if long_key in selected_key_features:
-                selected_key_features.remove(long_key)
-                if short_key not in selected_key_features:
-                    selected_key_features.append(short_key)
-
-        if self.wheel_key_feature_var.get():
-            wheel_description = self.generate_wheel_description()
-            if wheel_description:
-                selected_key_features.append(wheel_description)
-
+        # Options are shortened by the key_feature_rules table, the same rules KeyFeatureJob applies in bulk
+        # Typed-in key features ("ONE OWNER") are kept, as KeyFeatureJob keeps them
+        rules = self.controller.key_feature_rules
+        wheels = self.generate_wheel_description()
+        free_text = rules.free_text(self.key_features_text.get("1.0", tk.END), self.controller.options_catalog.matcher,
+                                    wheels)
+        key_features = rules.compose(self.catalog_order(self.selected_key_features),
+                                     wheels if self.wheel_key_feature_var.get() else None, free_text)
         self.key_features_text.delete("1.0", tk.END)
-        self.key_features_text.insert("1.0", ", ".join(selected_key_features))
+        self.key_features_text.insert("1.0", key_features)
 
     def generate_wheel_description(self):
-        wheel_size = self.wheel_size_var.get()
-        wheel_material = self.wheel_material_var.get()
-        wheel_custom = self.wheel_custom_var.get()
-        if wheel_material == "None":
-            wheel_material = ""
-        wheel_description = f"{wheel_size} {wheel_material} {wheel_custom}".strip()
-        return wheel_description if wheel_description != "" else None
+        return wheel_description(self.wheel_size_var.get(), self.wheel_material_var.get(), self.wheel_custom_var.get())
 
     def bind_mousewheel(self, widget):
         widget.bind("<Enter>", lambda event: widget.bind_all("<MouseWheel>", self.on_mousewheel))
@@ -168,7 +246,7 @@ class CarDetailsPage(tk.Frame):
             updated_details = {
                 'make': self.entries['make'].get(),
                 'model': self.entries['model'].get(),
-                'model_year': self.entries['year'].get(),
+                'model_year': parse_model_year(self.entries['year'].get()),
                 'series': self.entries['series'].get(),
                 'options': self.options_text.get("1.0", tk.END).strip(),
                 'key_features': self.key_features_text.get("1.0", tk.END).strip(),
@@ -180,7 +258,12 @@ class CarDetailsPage(tk.Frame):
                 'custom_wheels': self.wheel_custom_var.get(),
                 'is_wheel_key_feature': self.wheel_key_feature_var.get()
             }
-            self.controller.update_car_details(self.car_details[1], **updated_details)
+            self.controller.save_car_details(
+                self.car_details.id,
+                self.car_details.vin,
+                updated_details,
+                self.catalog_order(self.selected_options),
+                self.catalog_order(self.selected_key_features))
             messagebox.showinfo("Success", "Details updated successfully!")
             self.controller.show_frame("InventoryPage")  # Redirect to the inventory frame
         except KeyError as e:
@@ -200,68 +283,63 @@ class CarDetailsPage(tk.Frame):
         self.wheel_material_var.set("None")
         self.wheel_custom_var.set("")
         self.wheel_key_feature_var.set(False)
+        # The page is reused, so start every car at the top
+        self.canvas.yview_moveto(0)
 
-        if new_details:
+        if not new_details:
+            self.update_options_checkboxes({})
+            self.update_key_features_checkboxes({})
+        else:
             self.car_details = new_details
             # Log the car details
             logging.debug(f"New car details: {self.car_details}")
             # Update the entries with the new details
-            for i, field in enumerate(['make', 'model', 'year', 'series']):
+            values = {
+                'make': self.car_details.make,
+                'model': self.car_details.model,
+                'year': format_model_year(self.car_details.model_year),
+                'series': self.car_details.series,
+            }
+            for field, value in values.items():
                 if field in self.entries:
-                    logging.debug(f"Setting {field} to {self.car_details[i + 2]}")
-                    self.entries[field].set(self.car_details[i + 2])
-            self.options_text.insert("1.0", self.car_details[6] if len(self.car_details) > 6 else "")
-            self.key_features_text.insert("1.0", self.car_details[7] if len(self.car_details) > 7 else "")
-            self.update_options_checkboxes()
-            self.update_key_features_checkboxes()
+                    logging.debug(f"Setting {field} to {value}")
+                    self.entries[field].set(value or "")
+            self.options_text.insert("1.0", self.car_details.options or "")
+            self.key_features_text.insert("1.0", self.car_details.key_features or "")
+            # Checked options come from the car_options table instead of re-parsing the text
+            car_options = self.controller.fetch_car_options(self.car_details.id)
+            self.update_options_checkboxes(car_options)
+            self.update_key_features_checkboxes(car_options)
             self.update_wheels_section()
 
-    def update_options_checkboxes(self):
-        options_text = self.car_details[6] if len(self.car_details) > 6 else ""
-        options_list = [opt.strip() for opt in options_text.split(',')]
-
-        # Special cases that require exact matching with commas
-        special_cases = [
-            "POWER WINDOWS, LOCKS AND MIRRORS",
-            "POWER WINDOWS, LOCKS AND SEAT",
-            "POWER WINDOWS, LOCKS AND SEATS",
-            "POWER WINDOWS, LOCKS, SEAT AND MOONROOF",
-            "POWER WINDOWS, LOCKS, SEATS AND MOONROOF",
-            "POWER WINDOWS, LOCKS, SEATS AND DUAL MOONROOF",
-            "POWER WINDOWS, LOCKS, SEATS AND PANORAMIC MOONROOF"
-        ]
-
-        # Clear all checkboxes first
+    def update_options_checkboxes(self, car_options):
+        self.selected_options = set(car_options)
         for option, var in self.vars.items():
-            var.set(False)
+            var.set(option in self.selected_options)
+        for category in self.category_sections:
+            self.update_category_header(category)
 
-        # Set checkboxes based on options_list and special cases
-        for option in self.vars.keys():
-            # Check if the exact option is in the options list or matches a special case
-            if option in options_list or option in special_cases and option in options_text:
-                self.vars[option].set(True)
-
-    def update_key_features_checkboxes(self):
-        key_features_text = self.car_details[7] if len(self.car_details) > 7 else ""
+    def update_key_features_checkboxes(self, car_options):
+        self.selected_key_features = {option for option, is_key_feature in car_options.items() if is_key_feature}
         for option, var in self.key_feature_vars.items():
-            var.set(option in key_features_text)
+            var.set(option in self.selected_key_features)
 
     def update_wheels_section(self):
-        self.wheel_size_var.set(self.car_details[9] if len(self.car_details) > 9 else "")
-        if self.car_details[10]:
-            self.wheel_material_var.set("ALLOY WHEELS")
-        elif self.car_details[11]:
-            self.wheel_material_var.set("TWO-TONE WHEELS")
-        elif self.car_details[12]:
-            self.wheel_material_var.set("CHROME WHEELS")
-        elif self.car_details[13]:
-            self.wheel_material_var.set("WHEELS")
-        else:
-            self.wheel_material_var.set("None")
-        self.wheel_custom_var.set(self.car_details[14] if len(self.car_details) > 14 else "")
+        self.wheel_size_var.set(self.car_details.wheel_size or "")
+        self.wheel_material_var.set(self.car_details.wheel_material)
+        self.wheel_custom_var.set(self.car_details.custom_wheels or "")
         wheel_description = self.generate_wheel_description()
-        key_features_text = self.car_details[7] if len(self.car_details) > 7 else ""
-        self.wheel_key_feature_var.set(wheel_description in key_features_text)
+        key_features_text = self.car_details.key_features or ""
+        # A whole piece of the key features, not a substring of some other feature
+        self.wheel_key_feature_var.set(wheel_description in split_pieces(key_features_text))
+
+
+def toggle(selected, option, checked):
+    if checked:
+        selected.add(option)
+    else:
+        selected.discard(option)
+
 
 # Add logging configuration
 logging.basicConfig(level=logging.DEBUG)
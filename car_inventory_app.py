@@ -1,6 +1,6 @@
-import json
 import logging
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, messagebox
 from home_page import HomePage
@@ -9,21 +9,29 @@ from add_car_page import AddCarPage
 from settings_page import SettingsPage
 from archive_page import ArchivePage
 from car_details_page import CarDetailsPage
+from background import TkCallbackQueue
+from facet_index import FacetIndex
+from inventory_db import ACTIVE, ARCHIVED, InventoryDatabase
+from buyers_guide import BuyersGuideBatch
+from inventory_export import InventoryExport
+from inventory_import import InventoryImport
+from inventory_report import InventoryReport
+from key_features import KeyFeatureJob, KeyFeatureRules
+from listings import ListingJob, load_channels, render_car
+from options_catalog import OptionsCatalog
+from vin_cache import VinDecodeCache
+from vin_decoder import VinDecodeService
+from vin_engine import LocalVinDecoder
 import sv_ttk  # Assuming sv_ttk provides set_theme() function
 
+# Background jobs that can run at once, e.g. a report while key features are regenerated
+JOB_WORKERS = 2
+
 
 class CarInventoryApp(tk.Tk):
     def __init__(self):
         super().__init__()
 
-        # Initialize main database connection and cursor
-        self.conn = sqlite3.connect('car_inventory.db', check_same_thread=False)
-        self.cursor = self.conn.cursor()
-
-        # Initialize archive database connection and cursor
-        self.archive_conn = sqlite3.connect('car_archive.db')
-        self.archive_cursor = self.archive_conn.cursor()
-
         # Initialize logging
         logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -38,17 +46,23 @@ class CarInventoryApp(tk.Tk):
         except tk.TclError:
             logging.error("Icon file 'logo.ico' not found. Please check the file path.")
 
-        # Initialize the SQLite databases
-        self.init_db()
-        self.init_archive_db()  # Call to initialize archive database
+        # Initialize the SQLite database; active and archived cars share one file
+        self.db = InventoryDatabase()
+        self.facet_index = None  # Built the first time the filter panel asks for counts
+        self.key_feature_rules = KeyFeatureRules.load(self.db)
 
-        # Load car options from JSON file
-        try:
-            with open('car_options.json', 'r') as f:
-                self.car_options = json.load(f)
-                logging.debug("Car options loaded successfully")
-        except FileNotFoundError:
-            logging.error("Car options file 'car_options.json' not found.")
+        # The option catalog is loaded once here; pages subscribe to it instead of reading car_options.json
+        self.options_catalog = OptionsCatalog()
+        self.options_catalog.subscribe(self.on_options_changed)
+        self.options_catalog.refresh()
+
+        # Background work (VIN decoding) reports back to the Tk thread through this queue
+        self.ui_queue = TkCallbackQueue(self)
+        self.vin_service = VinDecodeService(cache=VinDecodeCache(), local_decoder=LocalVinDecoder.open_if_present())
+        # Long-running jobs (key feature regeneration, reports) run here, off the Tk thread
+        self.job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="jobs")
+        self.active_jobs = set()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # default light mode
         sv_ttk.use_light_theme()
@@ -73,6 +87,15 @@ class CarInventoryApp(tk.Tk):
         self.add_sidebar_buttons()
         self.show_frame("HomePage")
 
+    def on_close(self):
+        self.vin_service.shutdown()
+        for job in list(self.active_jobs):
+            # Stops after the chunk in progress, before the database is closed under it
+            job.cancel()
+        self.job_executor.shutdown(wait=True, cancel_futures=True)
+        self.close_db()
+        self.destroy()
+
     def add_sidebar_buttons(self):
         home_button = ttk.Button(self.sidebar, text="Home", command=lambda: self.show_frame("HomePage"))
         home_button.pack(fill="x", pady=10)
@@ -88,6 +111,8 @@ class CarInventoryApp(tk.Tk):
 
     def show_frame(self, page_name, **kwargs):
         logging.debug(f"show_frame called with page_name={page_name} and kwargs={kwargs}")
+        # Picks up edits made to car_options.json outside the app; a stat() when nothing changed
+        self.options_catalog.refresh()
 
         # Hide all frames
         for frame in self.frames.values():
@@ -95,21 +120,15 @@ class CarInventoryApp(tk.Tk):
             if isinstance(frame, InventoryPage) or isinstance(frame, ArchivePage):
                 frame.unbind_mousewheel(frame.canvas)
 
-        # Dynamically create or update the requested frame
-        if page_name not in self.frames or 'vin' in kwargs:
-            # Check if the frame needs to be created or updated with new details
-            if page_name == "CarDetailsPage":
-                frame = CarDetailsPage(parent=self.main_content, controller=self, **kwargs)
-            else:
-                frame = self.frames.get(page_name, None)
-                if frame is None:
-                    # Create other pages normally if not already created
-                    frame = self.create_page(
-                        page_name)  # You should define create_page method or add specific conditions
-            # Store the new or updated frame
-            self.frames[page_name] = frame
-        else:
-            frame = self.frames[page_name]
+        # Pages are created once and reused; CarDetailsPage is switched to another car instead of rebuilt
+        frame = self.frames.get(page_name)
+        if frame is None:
+            frame = self.frames[page_name] = self.create_page(page_name)
+        if page_name == "CarDetailsPage" and ('vin' in kwargs or 'car_details' in kwargs):
+            car_details = kwargs.get('car_details') or self.fetch_car_by_vin(kwargs['vin'])
+            if car_details is None:
+                logging.error(f"No car found with VIN: {kwargs['vin']}")
+            frame.update_details(car_details)
 
         # Pack and show the requested frame
         frame.pack(fill="both", expand=True)
@@ -149,130 +168,199 @@ class CarInventoryApp(tk.Tk):
             logging.error(f"No page found for {page_name}")
             raise ValueError(f"No page found for {page_name}")
 
-    def init_db(self):
-        logging.debug("Initializing database")
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                vin TEXT UNIQUE NOT NULL,
-                make TEXT,
-                model TEXT,
-                model_year TEXT,
-                series TEXT,
-                options TEXT,
-                key_features TEXT,
-                stock_number TEXT,
-                wheel_size TEXT,
-                alloy_wheels BOOLEAN,
-                two_tone_wheels BOOLEAN,
-                chrome_wheels BOOLEAN,
-                wheels BOOLEAN,
-                custom_wheels TEXT,
-                is_wheel_key_feature BOOLEAN
-            )
-        ''')
-        self.conn.commit()
-        logging.debug("Database initialized successfully")
-
-    def init_archive_db(self):
-        try:
-            self.archive_cursor.execute('''
-                CREATE TABLE IF NOT EXISTS archived_cars (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    vin TEXT UNIQUE NOT NULL,
-                    make TEXT,
-                    model TEXT,
-                    model_year TEXT,
-                    series TEXT,
-                    options TEXT,
-                    key_features TEXT,
-                    stock_number TEXT,
-                    wheel_size TEXT,
-                    alloy_wheels BOOLEAN,
-                    two_tone_wheels BOOLEAN,
-                    chrome_wheels BOOLEAN,
-                    wheels BOOLEAN,
-                    custom_wheels TEXT,
-                    is_wheel_key_feature BOOLEAN
-                )
-            ''')
-            self.archive_conn.commit()
-            logging.debug("Archive database initialized successfully")
-        except sqlite3.Error as e:
-            logging.error(f"Error initializing archive database: {e}")
-
     def insert_car(self, vin, make, model, model_year, series, options, key_features, stock_number):
+        self.db.insert_car(vin, make, model, model_year, series, options, key_features, stock_number)
+
+    def insert_cars(self, cars):
+        """Inserts car tuples in one transaction; returns (vin, reason) pairs for the cars that were skipped."""
+        return self.db.insert_cars(cars)
+
+    def update_cars(self, updates):
+        """Applies (vin, {column: value}) pairs in one transaction; returns the number of cars updated."""
         try:
-            self.cursor.execute('''
-                INSERT INTO inventory (vin, make, model, model_year, series, options, key_features, stock_number)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (vin, make, model, model_year, series, options, key_features, stock_number))
-            self.conn.commit()
-            logging.debug(f"Inserted car with VIN: {vin}")
-        except sqlite3.IntegrityError as e:
-            logging.error(f"Error inserting car with VIN {vin}: {e}")
-            raise ValueError("Car with this VIN already exists in the inventory.")
+            return self.db.update_cars(updates, parser=self.options_catalog.matcher)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to update cars: {e}")
+            raise ValueError(f"Failed to update cars: {e}")
 
     def update_car_options(self, vin, options):
         try:
-            self.cursor.execute('''
-                UPDATE inventory
-                SET options = ?
-                WHERE vin = ?
-            ''', (options, vin))
-            self.conn.commit()
-            logging.debug(f"Updated options for car with VIN {vin}")
+            self.db.update_car_options(vin, options, parser=self.options_catalog.matcher)
         except sqlite3.Error as e:
             raise ValueError(f"Failed to update car options: {e}")
 
-    def update_car_details(self, vin, **details):
-        query = "UPDATE inventory SET "
-        query += ", ".join(f"{key} = ?" for key in details.keys())
-        query += " WHERE vin = ?"
-        params = list(details.values()) + [vin]
+    def save_car_details(self, car_id, vin, details, options, key_features=()):
         try:
-            logging.debug(f"Executing SQL query: {query} with params {params}")
-            self.cursor.execute(query, params)
-            self.conn.commit()
-            logging.debug("Car details updated successfully")
+            self.db.save_car_details(car_id, vin, details, options, key_features)
         except sqlite3.Error as e:
-            logging.error(f"Failed to update car details: {e}")
-            raise ValueError(f"Failed to update: {e}")
+            logging.error(f"Failed to save car {car_id}: {e}")
+            raise ValueError(f"Failed to save: {e}")
 
     def fetch_cars(self):
-        self.cursor.execute('SELECT * FROM inventory')
-        return self.cursor.fetchall()
+        return self.db.fetch_cars(ACTIVE)
 
     def fetch_archived_cars(self):
-        self.archive_cursor.execute("SELECT * FROM archived_cars")
-        return self.archive_cursor.fetchall()
+        return self.db.fetch_cars(ARCHIVED)
+
+    def query_cars(self, **query):
+        """One page of list rows; see InventoryDatabase.query_cars for the arguments."""
+        return self.db.query_cars(**query)
+
+    def search_cars(self, text, **query):
+        """Ranked full-text search; see InventoryDatabase.search_cars for the arguments."""
+        try:
+            return self.db.search_cars(text, **query)
+        except sqlite3.Error as e:
+            logging.error(f"Search for {text!r} failed: {e}")
+            return []
+
+    def fetch_cars_by_ids(self, ids):
+        return self.db.fetch_cars_by_ids(ids)
+
+    def facet_counts(self, filters):
+        """Per-value counts for the filter panel; see FacetIndex.counts."""
+        try:
+            if self.facet_index is None:
+                self.facet_index = FacetIndex(self.db)
+                self.facet_index.load()
+            else:
+                self.facet_index.refresh()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to update facet counts: {e}")
+        return self.facet_index.counts(filters)
+
+    @property
+    def car_options(self):
+        return self.options_catalog.categories
+
+    def on_options_changed(self, catalog):
+        # Subscribed first, so the ids are in place before any page is notified
+        self.sync_option_catalog(catalog.categories)
+
+    def sync_option_catalog(self, car_options):
+        """Makes sure every option in car_options has a stable id in the database."""
+        try:
+            self.options_catalog.set_ids(self.db.sync_option_catalog(car_options))
+        except sqlite3.Error as e:
+            logging.error(f"Failed to sync option catalog: {e}")
+
+    def fetch_car_options(self, car_id):
+        try:
+            return self.db.fetch_car_options(car_id)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to fetch options for car {car_id}: {e}")
+            return {}
+
+    def regenerate_key_features(self, dry_run, on_done, on_error=None, on_progress=None):
+        """
+        Runs a KeyFeatureJob on the job executor with the current rules and catalog order.
+        on_done(changes) and on_progress(done, total) are called on the Tk thread.
+        Returns the job so it can be cancelled.
+        """
+        self.key_feature_rules = KeyFeatureRules.load(self.db)
+        job = KeyFeatureJob(self.db, self.key_feature_rules, order=list(self.options_catalog),
+                            parser=self.options_catalog.matcher)
+        return self.run_job(job, (dry_run,), on_done, on_error, on_progress)
+
+    def generate_report(self, car_ids, on_done, on_error=None, on_progress=None):
+        """
+        Builds an InventoryReport of the cars on the job executor. on_done(path) gets None
+        if the report was cancelled; on_progress(stage, done, total) runs on the Tk thread.
+        Returns the report so it can be cancelled.
+        """
+        return self.run_job(InventoryReport(self.db, car_ids), (), on_done, on_error, on_progress)
+
+    def generate_guides(self, car_ids, merged, on_done, on_error=None, on_progress=None):
+        """
+        Fills buyers guides for the cars on the job executor, as one merged PDF or a folder
+        of per-VIN PDFs. on_done(path) gets None if cancelled. Returns the batch so it can
+        be cancelled.
+        """
+        return self.run_job(BuyersGuideBatch(self.db, car_ids, merged), (), on_done, on_error, on_progress)
+
+    def export_cars(self, path, status, filters, on_done, on_error=None, on_progress=None):
+        """
+        Exports the cars to path (CSV, JSON Lines or a SQLite snapshot, by extension) on the
+        job executor. on_done(path) gets None if cancelled. Returns the export so it can be
+        cancelled.
+        """
+        return self.run_job(InventoryExport(self.db, path, status=status, filters=filters), (),
+                            on_done, on_error, on_progress)
+
+    def import_cars(self, path, enrich, on_done, on_error=None, on_progress=None):
+        """
+        Adds or updates cars from a CSV or JSON Lines file on the job executor; with enrich,
+        rows without make or model are decoded first. on_done gets the ImportReport.
+        Returns the import so it can be cancelled.
+        """
+        job = InventoryImport(self.db, path, decode=self.vin_service.decode if enrich else None,
+                              parser=self.options_catalog.matcher)
+        return self.run_job(job, (), on_done, on_error, on_progress)
+
+    def render_listing(self, car_id, channel="html"):
+        """A car's marketplace listing for channel, or None if the car is gone."""
+        return render_car(self.db, car_id, load_channels()[channel])
+
+    def generate_listings(self, car_ids, feed, on_done, on_error=None, on_progress=None):
+        """
+        Renders listings for every channel on the job executor: the given cars, or with
+        car_ids None the cars changed since the last run. on_done gets (rendered, removed),
+        or None if cancelled. Returns the job so it can be cancelled.
+        """
+        job = ListingJob(self.db, load_channels(), car_ids=car_ids, feed=feed)
+        return self.run_job(job, (), on_done, on_error, on_progress)
+
+    def run_job(self, job, args, on_done, on_error=None, on_progress=None):
+        """Runs job.run(*args, progress) on the job executor, reporting back on the Tk thread."""
+        progress = (lambda *values: self.ui_queue.post(on_progress, *values)) if on_progress else None
+
+        def finished(callback, value):
+            self.active_jobs.discard(job)
+            if callback:
+                callback(value)
+
+        self.active_jobs.add(job)
+        self.ui_queue.run(self.job_executor, job.run, *args, progress,
+                          on_done=lambda result: finished(on_done, result),
+                          on_error=lambda error: finished(on_error, error))
+        return job
 
     def close_db(self):
-        self.conn.close()
-        self.archive_conn.close()
-        logging.debug("Database connections closed")
+        self.db.close()
 
     def archive_car(self, car):
-        vin = car[1]
-        car_details = car[1:]
-
+        vin = car.vin
         try:
-            self.archive_cursor.execute('''
-                INSERT INTO archived_cars (vin, make, model, model_year, series, options, key_features, stock_number, 
-                wheel_size, alloy_wheels, two_tone_wheels, chrome_wheels, wheels, custom_wheels, is_wheel_key_feature)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', car_details)
-            self.archive_conn.commit()
-            logging.debug(f"Archived car with VIN: {vin}")
-            self.delete_car(vin)
+            if self.db.set_status(vin, ARCHIVED):
+                logging.debug(f"Archived car with VIN: {vin}")
+            else:
+                logging.error(f"No active car with VIN {vin} to archive")
         except sqlite3.Error as e:
             logging.error(f"Error archiving car with VIN {vin}: {e}")
             messagebox.showerror("Error", f"Failed to archive car with VIN {vin}")
 
+    def archive_cars(self, vins):
+        """Archives every given active car in one transaction; returns the number archived."""
+        try:
+            archived = self.db.set_status_many(vins, ARCHIVED)
+            logging.debug(f"Archived {archived} cars")
+            return archived
+        except sqlite3.Error as e:
+            logging.error(f"Error archiving cars: {e}")
+            raise ValueError(f"Failed to archive cars: {e}")
+
+    def dearchive_car(self, vin):
+        try:
+            if not self.db.set_status(vin, ACTIVE):
+                raise ValueError(f"No archived car with VIN {vin}")
+            logging.debug(f"De-archived car with VIN: {vin}")
+        except sqlite3.Error as e:
+            logging.error(f"Error de-archiving car with VIN {vin}: {e}")
+            raise ValueError(f"Failed to de-archive car: {e}")
+
     def delete_car(self, vin):
         try:
-            self.cursor.execute("DELETE FROM inventory WHERE vin = ?", (vin,))
-            self.conn.commit()
+            self.db.delete_car(vin)
             logging.debug(f"Car with VIN {vin} deleted from inventory")
         except sqlite3.Error as e:
             logging.error(f"Error deleting car with VIN {vin}: {e}")
@@ -280,33 +368,9 @@ class CarInventoryApp(tk.Tk):
 
     def fetch_car_by_vin(self, vin):
         try:
-            self.cursor.execute("SELECT * FROM inventory WHERE vin = ?", (vin,))
-            car = self.cursor.fetchone()
+            car = self.db.fetch_car_by_vin(vin)
             logging.debug(f"Fetched car details for VIN {vin}: {car}")
             return car
         except sqlite3.Error as e:
             logging.error(f"Error fetching car with VIN {vin}: {e}")
             return None
-
-    def insert_car_into_inventory(self, car):
-        try:
-            self.cursor.execute('''
-                INSERT INTO inventory (vin, make, model, model_year, series, options, key_features, stock_number, wheel_size, alloy_wheels, two_tone_wheels, chrome_wheels, wheels, custom_wheels, is_wheel_key_feature)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', car[1:])
-            self.conn.commit()
-            logging.debug(f"Inserted car with VIN: {car[1]} back into inventory")
-        except sqlite3.IntegrityError as e:
-            logging.error(f"Error inserting car with VIN {car[1]}: {e}")
-            raise ValueError("Car with this VIN already exists in the inventory.")
-
-    def delete_car_from_archive(self, vin):
-        try:
-            self.archive_cursor.execute('''
-                DELETE FROM archived_cars WHERE vin = ?
-            ''', (vin,))
-            self.archive_conn.commit()
-            logging.debug(f"Deleted car with VIN: {vin} from archive")
-        except sqlite3.Error as e:
-            logging.error(f"Error deleting car with VIN {vin} from archive: {e}")
-            raise ValueError(f"Failed to delete car from archive: {e}")
\ No newline at end of file
@@ -107,13 +107,13 @@ class CarOptionsPage(tk.Frame):
 
     def update_entries(self, details):
         try:
-            self.entries['make'].set(details[2])  # Assuming 'make' is at index 2
-            self.entries['model'].set(details[3])  # Assuming 'model' is at index 3
-            self.entries['series'].set(details[5])  # Assuming 'series' is at index 4
+            self.entries['make'].set(details.make)
+            self.entries['model'].set(details.model)
+            self.entries['series'].set(details.series)
             logging.debug("Entries updated successfully.")
-        except IndexError as e:
+        except AttributeError as e:
             logging.error(f"Error updating entries: {e}")
-            messagebox.showerror("Error", "Failed to update entries because of an index error.")
+            messagebox.showerror("Error", "Failed to update entries because of a missing field.")
 
 
     def bind_mousewheel(self, widget):
@@ -0,0 +1,88 @@
+import sys
+
+from schema import CAR_COLUMNS, format_model_year
+
+# Columns the inventory and archive lists need; options and key features are left out
+LIST_COLUMNS = ("id", "vin", "make", "model", "model_year", "series", "stock_number")
+
+# Repeated across thousands of cars, so every row shares one string object per value
+INTERNED_COLUMNS = frozenset(("make", "model", "series", "status"))
+
+
+class CarSummary:
+    """The LIST_COLUMNS of a car, for the list views."""
+
+    __slots__ = LIST_COLUMNS
+    fields = LIST_COLUMNS
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_values(cls, columns, values):
+        record = cls.__new__(cls)
+        for name, value in zip(columns, values):
+            if name in INTERNED_COLUMNS and value.__class__ is str:
+                value = sys.intern(value)
+            setattr(record, name, value)
+        return record
+
+    @property
+    def title(self):
+        return f"{format_model_year(self.model_year)} {self.make} {self.model}"
+
+    def _values(self):
+        return tuple(getattr(self, name, None) for name in self.fields)
+
+    def __eq__(self, other):
+        # By value, so a re-queried car that didn't change isn't redrawn by VirtualList
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._values() == other._values()
+
+    # Mutable, so not hashable
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name, None)!r}" for name in self.fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Car(CarSummary):
+    """A full inventory row, for the details page, copy text and reports."""
+
+    __slots__ = tuple(column for column in CAR_COLUMNS + ("status",) if column not in LIST_COLUMNS)
+    fields = ("id",) + CAR_COLUMNS + ("status",)
+
+    @property
+    def wheel_material(self):
+        # Same precedence as the wheel_material facet
+        if self.alloy_wheels:
+            return "ALLOY WHEELS"
+        if self.two_tone_wheels:
+            return "TWO-TONE WHEELS"
+        if self.chrome_wheels:
+            return "CHROME WHEELS"
+        if self.wheels:
+            return "WHEELS"
+        return "None"
+
+
+def record_type_for(columns):
+    """CarSummary when columns fit in it, otherwise Car."""
+    return CarSummary if set(columns) <= set(LIST_COLUMNS) else Car
+
+
+def record_factory(record_type):
+    """A sqlite3 row_factory that builds record_type objects instead of tuples. Use one per cursor."""
+    description = None
+    columns = ()
+
+    def factory(cursor, row):
+        nonlocal description, columns
+        if cursor.description is not description:
+            description = cursor.description
+            columns = [column[0] for column in description]
+        return record_type.from_values(columns, row)
+    return factory
@@ -0,0 +1,135 @@
+import logging
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Connection tuning: WAL lets readers run during a write and only fsyncs at checkpoints,
+# synchronous=NORMAL is still crash-safe under WAL, and cache_size is in KiB when negative
+JOURNAL_MODE = 'wal'
+SYNCHRONOUS = 'NORMAL'
+CACHE_SIZE_KIB = 64 * 1024
+
+# How long SQLite itself waits on another connection's lock before reporting "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Further attempts at starting or committing a write after SQLite gave up waiting
+WRITE_RETRIES = 5
+RETRY_DELAY = 0.05
+
+
+def configure_connection(conn, wal=True):
+    """Applies the busy timeout, journal and cache pragmas; wal=False keeps SQLite's rollback-journal defaults."""
+    # Set first so the journal_mode change below also waits for other connections
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    if wal:
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KIB}")
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def retry_locked(operation, retries=WRITE_RETRIES):
+    """Runs operation(), retrying with jittered exponential backoff while the database is locked."""
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e) or attempt == retries:
+                raise
+            delay = RETRY_DELAY * (2 ** attempt) * (1 + random.random())
+            logging.debug(f"Database is locked, retrying in {delay * 1000:.0f} ms")
+            time.sleep(delay)
+
+
+@contextmanager
+def write_transaction(conn, retries=WRITE_RETRIES):
+    """
+    Runs the block in a BEGIN IMMEDIATE transaction on an autocommit connection. Taking the
+    write lock up front means the block can't fail halfway on a lock upgrade, so only the
+    BEGIN and the COMMIT need retrying. Rolls back if the block raises.
+    """
+    retry_locked(lambda: conn.execute("BEGIN IMMEDIATE"), retries)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    try:
+        retry_locked(lambda: conn.execute("COMMIT"), retries)
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+class ConnectionPool:
+    """
+    Connections to one SQLite database for the Tk thread and any worker threads.
+
+    Every thread reads through its own connection, so readers never share a cursor and
+    don't wait on each other. Writes go through one write connection behind a lock,
+    which keeps this process's writers in order; writers in other processes are handled
+    by busy_timeout and the retries in write_transaction().
+    """
+
+    def __init__(self, path, wal=True, retries=WRITE_RETRIES):
+        self.path = path
+        self.wal = wal
+        self.retries = retries
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_conn = self.connect()
+
+    def connect(self):
+        """A new configured connection in autocommit mode, closed along with the pool."""
+        # Each connection is still used by one thread at a time; this only lets close() run from any thread
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        configure_connection(conn, self.wal)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def reopen_writer(self):
+        """
+        Replaces the write connection. Needed after another connection changed the schema:
+        the old one can keep stale FTS5 state and fail its next write with "no such table".
+        """
+        with self._write_lock:
+            old = self._write_conn
+            self._write_conn = self.connect()
+            with self._connections_lock:
+                self._connections.remove(old)
+            old.close()
+
+    def reader(self):
+        """This thread's read connection; it only sees committed data."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+            conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """Holds the write lock and runs the block in one transaction on the write connection."""
+        with self._write_lock:
+            if self._write_conn.in_transaction:
+                # Nested use from the same thread joins the outer transaction
+                yield self._write_conn
+                return
+            with write_transaction(self._write_conn, self.retries) as conn:
+                yield conn
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        logging.debug(f"Closed {len(connections)} connections to {self.path}")
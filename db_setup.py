@@ -1,52 +1,18 @@
 import sqlite3
 import logging
 
+from schema import migrate, user_version
+
 
 def init_db(conn):
+    # Same schema and upgrade path as the app; see schema.py
     logging.debug("Initializing database")
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            vin TEXT UNIQUE NOT NULL,
-            make TEXT,
-            model TEXT,
-            model_year TEXT,
-            series TEXT,
-            options TEXT,
-            key_features TEXT,
-            stock_number TEXT
-        )
-    ''')
-    conn.commit()
-    logging.debug("Database initialized successfully")
-
-
-def init_archive_db(conn):
-    logging.debug("Initializing archive database")
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS archived_cars (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            vin TEXT UNIQUE NOT NULL,
-            make TEXT,
-            model TEXT,
-            model_year TEXT,
-            series TEXT,
-            options TEXT,
-            key_features TEXT,
-            stock_number TEXT
-        )
-    ''')
-    conn.commit()
-    logging.debug("Archive database initialized successfully")
+    migrate(conn)
+    logging.debug(f"Database initialized successfully at schema version {user_version(conn)}")
 
 
 if __name__ == "__main__":
-    conn = sqlite3.connect('car_inventory.db')
+    # The migrations manage their own transactions, so the connection is left in autocommit mode
+    conn = sqlite3.connect('car_inventory.db', isolation_level=None)
     init_db(conn)
     conn.close()
-
-    archive_conn = sqlite3.connect('car_archive.db')
-    init_archive_db(archive_conn)
-    archive_conn.close()
\ No newline at end of file
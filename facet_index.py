@@ -0,0 +1,145 @@
+import logging
+import time
+
+from inventory_db import ACTIVE, FACET_EXPRESSIONS
+
+# Facets shown in the filter panel, in display order
+FACETS = {
+    "make": "Make",
+    "model": "Model",
+    "model_year": "Model Year",
+    "series": "Series",
+    "wheel_size": "Wheel Size",
+    "wheel_material": "Wheel Material",
+}
+
+# Past this many changed cars refresh() rebuilds the whole index instead
+MAX_REFRESH_CARS = 5000
+
+
+def bitmap_from_ids(car_ids):
+    bits = bytearray(max(car_ids) // 8 + 1)
+    for car_id in car_ids:
+        bits[car_id >> 3] |= 1 << (car_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+class FacetIndex:
+    """
+    In-memory bitmap index of active cars for the filter panel.
+
+    Every facet value and every option has a Python int used as a bitmap, with bit n set
+    when car id n has that value. Counting a click is then a handful of ANDs and
+    bit_count() calls instead of a query per value. refresh() reads the car_changes log
+    kept by InventoryDatabase and re-indexes only the cars changed since the last load.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.seq = 0
+        self.active = 0  # bitmap of all active cars
+        self.values = {facet: {} for facet in FACETS}  # facet -> {value: bitmap}
+        self.options = {}  # option name -> bitmap
+
+    def load(self):
+        started = time.perf_counter()
+        # Read the sequence first so changes made while loading are picked up again by refresh()
+        self.seq = self.db.last_change_seq()
+        self.active = 0
+        self.values = {facet: {} for facet in FACETS}
+        self.options = {}
+        self._index_cars(None)
+        logging.debug(f"Facet index loaded {self.active.bit_count()} cars in "
+                      f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def refresh(self):
+        """Re-indexes the cars inserted, updated, archived or deleted since the last load or refresh."""
+        car_ids, seq = self.db.changes_since(self.seq)
+        if not car_ids:
+            return False
+        if len(car_ids) > MAX_REFRESH_CARS:
+            self.load()
+            return True
+        # Clear the changed cars from every bitmap at once, then index their current rows
+        keep = ~bitmap_from_ids(car_ids)
+        self.active &= keep
+        for bitmaps in list(self.values.values()) + [self.options]:
+            for value in list(bitmaps):
+                bitmaps[value] &= keep
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self._index_cars(car_ids)
+        self.seq = seq
+        logging.debug(f"Facet index refreshed {len(car_ids)} changed cars")
+        return True
+
+    def _index_cars(self, car_ids):
+        facets = list(FACETS)
+        select = ", ".join(FACET_EXPRESSIONS[facet] for facet in facets)
+        query = f"SELECT inventory.id, {select} FROM inventory WHERE status = ?"
+        # Option bitmaps may include archived cars; counts() always masks them with the active cars
+        option_query = "SELECT car_id, option_id FROM car_options"
+        params = [ACTIVE]
+        option_params = []
+        if car_ids is not None:
+            placeholders = ", ".join("?" * len(car_ids))
+            query += f" AND inventory.id IN ({placeholders})"
+            option_query += f" WHERE car_id IN ({placeholders})"
+            params += list(car_ids)
+            option_params = list(car_ids)
+
+        # Gather car ids per value first; OR-ing one bit at a time into a 100k-bit int is quadratic
+        rows = self.db.read().execute(query, params).fetchall()
+        if rows:
+            columns = list(zip(*rows))
+            self.active |= bitmap_from_ids(columns[0])
+            for facet, values in zip(facets, columns[1:]):
+                positions = {}
+                for car_id, value in zip(columns[0], values):
+                    positions.setdefault(value, []).append(car_id)
+                bitmaps = self.values[facet]
+                for value, ids in positions.items():
+                    value = str(value)
+                    bitmaps[value] = bitmaps.get(value, 0) | bitmap_from_ids(ids)
+
+        positions = {}
+        for car_id, option_id in self.db.read().execute(option_query, option_params):
+            positions.setdefault(option_id, []).append(car_id)
+        names = dict(self.db.read().execute("SELECT id, name FROM option_catalog"))
+        for option_id, ids in positions.items():
+            name = names[option_id]
+            self.options[name] = self.options.get(name, 0) | bitmap_from_ids(ids)
+
+    def _facet_mask(self, facet, selected):
+        mask = 0
+        for value in selected:
+            mask |= self.values[facet].get(value, 0)
+        return mask
+
+    def counts(self, filters):
+        """
+        Returns ({facet: {value: count}}, {option: count}, total) for filters shaped like
+        InventoryDatabase.filter_clause() expects. Values within a facet are OR'ed, so a
+        facet's counts ignore its own selection and show what selecting another value adds.
+        """
+        filters = filters or {}
+        masks = {facet: self._facet_mask(facet, values) for facet, values in filters.items()
+                 if facet in FACETS and values}
+        option_mask = self.active
+        for name in filters.get("options", ()):
+            option_mask &= self.options.get(name, 0)
+
+        facet_counts = {}
+        for facet in FACETS:
+            mask = option_mask
+            for other, other_mask in masks.items():
+                if other != facet:
+                    mask &= other_mask
+            facet_counts[facet] = {value: (bitmap & mask).bit_count()
+                                   for value, bitmap in self.values[facet].items()}
+
+        matching = option_mask
+        for facet_mask in masks.values():
+            matching &= facet_mask
+        option_counts = {name: (bitmap & matching).bit_count() for name, bitmap in self.options.items()}
+        return facet_counts, option_counts, matching.bit_count()
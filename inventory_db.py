@@ -0,0 +1,632 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+from car_records import LIST_COLUMNS, Car, record_factory, record_type_for
+from db_pool import ConnectionPool, write_transaction
+from option_parser import OptionParser
+from schema import CAR_COLUMNS, FTS_COLUMNS, migrate, table_exists, typed_expression
+
+INVENTORY_DB = 'car_inventory.db'
+
+# Archived cars used to live in their own database; it is merged into INVENTORY_DB on startup
+LEGACY_ARCHIVE_DB = 'car_archive.db'
+
+# Lifecycle states stored in inventory.status
+ACTIVE = 'active'
+ARCHIVED = 'archived'
+
+# Sort orders offered by query_cars, each backed by an index on (status, <expressions>, id).
+# Keyset comparisons don't work with NULLs, so cars without a model year sort as year 0.
+SORT_KEYS = {
+    "stock_number": ("stock_number",),
+    "model_year": ("IFNULL(model_year, 0)",),
+    "make_model": ("make", "model"),
+}
+
+# Rows fetched per page by the list views
+PAGE_SIZE = 200
+
+# VINs looked up per query when checking a bulk insert for duplicates
+VIN_LOOKUP_CHUNK = 500
+
+INSERT_COLUMNS = ("vin", "make", "model", "model_year", "series", "options", "key_features", "stock_number")
+
+# SQL values new cars get for columns an upsert leaves out, the same as car_from_result() gives decoded cars
+UPSERT_DEFAULTS = {
+    "options": "' '",
+    "key_features": "' '",
+    "stock_number": "substr(:vin, -4)",
+}
+
+# Columns indexed for full-text search, with their bm25 weights
+SEARCH_COLUMNS = dict(zip(FTS_COLUMNS, (4.0, 4.0, 2.0, 1.0, 1.5)))
+
+# SQL for each facet of the inventory filter panel; blanks are grouped under ''
+FACET_EXPRESSIONS = {
+    "make": "IFNULL(inventory.make, '')",
+    "model": "IFNULL(inventory.model, '')",
+    "model_year": "IFNULL(CAST(inventory.model_year AS TEXT), '')",
+    "series": "IFNULL(inventory.series, '')",
+    "wheel_size": "IFNULL(inventory.wheel_size, '')",
+    # Same precedence as CarDetailsPage.update_wheels_section
+    "wheel_material": '''CASE
+        WHEN inventory.alloy_wheels THEN 'ALLOY WHEELS'
+        WHEN inventory.two_tone_wheels THEN 'TWO-TONE WHEELS'
+        WHEN inventory.chrome_wheels THEN 'CHROME WHEELS'
+        WHEN inventory.wheels THEN 'WHEELS'
+        ELSE 'None' END''',
+}
+
+
+def filter_clause(filters):
+    """
+    Builds a WHERE fragment for {facet: values} filters. A car matches a facet if it has
+    any of the selected values; under the "options" key every selected option is required.
+    Returns (sql, params), with sql empty when nothing is selected.
+    """
+    conditions = []
+    params = []
+    for facet, values in (filters or {}).items():
+        values = list(values)
+        if not values:
+            continue
+        if facet == "options":
+            for name in values:
+                conditions.append('''inventory.id IN (
+                    SELECT car_id FROM car_options
+                    WHERE option_id = (SELECT id FROM option_catalog WHERE name = ?)
+                )''')
+                params.append(name)
+        elif facet in FACET_EXPRESSIONS:
+            conditions.append(f"{FACET_EXPRESSIONS[facet]} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            raise ValueError(f"Unknown facet: {facet}")
+    return " AND ".join(conditions), params
+
+
+# Words people type in searches that aren't worth matching on
+SEARCH_STOPWORDS = {"a", "an", "and", "the", "with", "w"}
+
+
+def build_match_query(text):
+    """
+    Turns what was typed in the search box into an FTS5 query: every word must match,
+    and the last word is a prefix so results show up while it is still being typed.
+    """
+    words = [word for word in re.findall(r"\w+", text.lower()) if word not in SEARCH_STOPWORDS]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if text[-1:].isalnum():
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def option_text_rows(parser, shortened, options, key_features):
+    """
+    (option name, is key feature) pairs for a car's option text. Key feature text lists
+    some options by the shorter name a key_feature_rules row gives them, so shortened
+    maps option -> key feature.
+    """
+    key_feature_names, leftover = parser.parse(key_features)
+    key_feature_names = set(key_feature_names) | set(leftover)
+    return [(name, name in key_feature_names or shortened.get(name) in key_feature_names)
+            for name in parser.parse(options)[0]]
+
+
+class InventoryDatabase:
+    """
+    Active and archived cars share the inventory table and are told apart by its
+    status column, so archiving or de-archiving a car is a single UPDATE.
+
+    Safe to use from worker threads: reads go through the calling thread's own
+    connection and writes through the pool's write transaction, see ConnectionPool.
+    """
+
+    def __init__(self, path=INVENTORY_DB, legacy_archive_path=LEGACY_ARCHIVE_DB, wal=True):
+        self.pool = ConnectionPool(path, wal)
+        self.fts_enabled = False
+        self.init_db()
+        self.migrate_archive_db(legacy_archive_path)
+
+    def init_db(self):
+        """Creates or upgrades the schema (see schema.py); a current database costs one PRAGMA read."""
+        conn = self.pool.connect()
+        try:
+            if migrate(conn):
+                logging.debug("Database schema created or upgraded")
+                self.pool.reopen_writer()
+        finally:
+            conn.close()
+        conn = self.read()
+        self.fts_enabled = table_exists(conn, "inventory_fts")
+        # Option text is converted to car_options rows the first time the catalog is synced
+        self.options_migrated = conn.execute("SELECT EXISTS (SELECT 1 FROM option_catalog)").fetchone()[0] == 1
+
+    def read(self):
+        """The calling thread's read connection."""
+        return self.pool.reader()
+
+    def read_records(self, record_type=Car):
+        """A cursor on the calling thread's read connection that returns record_type objects."""
+        cursor = self.pool.reader().cursor()
+        cursor.row_factory = record_factory(record_type)
+        return cursor
+
+    def last_change_seq(self):
+        return self.read().execute("SELECT IFNULL(MAX(seq), 0) FROM car_changes").fetchone()[0]
+
+    def changes_since(self, seq):
+        """(car ids changed after seq, newest seq)."""
+        rows = self.read().execute("SELECT car_id, seq FROM car_changes WHERE seq > ?", (seq,)).fetchall()
+        return [car_id for car_id, _ in rows], max((row_seq for _, row_seq in rows), default=seq)
+
+    def sync_option_catalog(self, car_options):
+        """
+        Gives every option in the {category: [option, ...]} mapping an id, keeping the ids
+        of options that already had one. Existing option text is converted to car_options
+        rows the first time this runs. Returns {option name: id}.
+        """
+        with self.pool.writer() as conn:
+            for category, options in car_options.items():
+                for option in options:
+                    conn.execute("INSERT OR IGNORE INTO option_catalog (name, category) VALUES (?, ?)",
+                                 (option, category))
+                    conn.execute("UPDATE option_catalog SET category = ? WHERE name = ? AND category != ?",
+                                 (category, option, category))
+            option_ids = dict(conn.execute("SELECT name, id FROM option_catalog"))
+        if not self.options_migrated:
+            self.migrate_option_text(option_ids)
+            self.options_migrated = True
+        return option_ids
+
+    def migrate_option_text(self, option_ids):
+        logging.debug("Converting option text to car_options rows")
+        parser = OptionParser(option_ids)
+        shortened = dict(self.fetch_key_feature_rules())
+        rows = []
+        for car_id, options, key_features in self.read().execute("SELECT id, options, key_features FROM inventory"):
+            rows.extend((car_id, option_ids[name], is_key_feature)
+                        for name, is_key_feature in option_text_rows(parser, shortened, options, key_features))
+        with self.pool.writer() as conn:
+            conn.executemany("INSERT OR IGNORE INTO car_options VALUES (?, ?, ?)", rows)
+        logging.debug(f"Created {len(rows)} car_options rows from option text")
+
+    def _replace_car_options(self, conn, car_id, options, key_features):
+        """
+        Replaces a car's options with the given option names; names in key_features are
+        flagged. A key feature is one of the car's options even if options leaves it out.
+        """
+        key_features = list(key_features)
+        flagged = set(key_features)
+        names = list(dict.fromkeys(list(options) + key_features))
+        conn.execute("DELETE FROM car_options WHERE car_id = ?", (car_id,))
+        conn.executemany('''
+            INSERT OR IGNORE INTO car_options (car_id, option_id, is_key_feature)
+            SELECT ?, id, ? FROM option_catalog WHERE name = ?
+        ''', ((car_id, name in flagged, name) for name in names))
+
+    def fetch_car_options(self, car_id):
+        """{option name: is key feature} for a car, in catalog order."""
+        return {name: bool(is_key_feature) for name, is_key_feature in self.read().execute('''
+            SELECT option_catalog.name, car_options.is_key_feature FROM car_options
+            JOIN option_catalog ON option_catalog.id = car_options.option_id
+            WHERE car_options.car_id = ?
+            ORDER BY option_catalog.id
+        ''', (car_id,))}
+
+    def fetch_key_feature_rules(self):
+        """[(option, key feature), ...] in the order they are applied."""
+        return self.read().execute("SELECT option, key_feature FROM key_feature_rules ORDER BY position").fetchall()
+
+    def set_key_feature_rules(self, rules):
+        """Replaces the rule table with (option, key feature) pairs, applied in the given order."""
+        with self.pool.writer() as conn:
+            conn.execute("DELETE FROM key_feature_rules")
+            conn.executemany("INSERT INTO key_feature_rules (option, key_feature) VALUES (?, ?)", rules)
+
+    def update_key_features(self, changes, flags=()):
+        """
+        Applies (car id, old text, new text) triples in one transaction. A car whose key
+        features no longer equal old text was edited meanwhile and is left alone. flags are
+        (car id, option name) pairs to mark as key features in car_options.
+        Returns the number of cars updated.
+        """
+        with self.pool.writer() as conn:
+            conn.executemany('''
+                UPDATE car_options SET is_key_feature = 1
+                WHERE car_id = ? AND option_id = (SELECT id FROM option_catalog WHERE name = ?)
+            ''', flags)
+            return sum(conn.execute("UPDATE inventory SET key_features = ? WHERE id = ? AND key_features IS ?",
+                                    (new, car_id, old)).rowcount
+                       for car_id, old, new in changes)
+
+    def migrate_archive_db(self, legacy_archive_path):
+        """Moves cars from the old car_archive.db into inventory as archived rows."""
+        if not legacy_archive_path or not os.path.exists(legacy_archive_path):
+            return
+        logging.debug(f"Migrating archived cars from {legacy_archive_path}")
+        # ATTACH can't run inside a transaction, so this gets a connection of its own
+        conn = self.pool.connect()
+        conn.execute("ATTACH DATABASE ? AS legacy", (legacy_archive_path,))
+        try:
+            legacy_columns = {row[1] for row in conn.execute("PRAGMA legacy.table_info(archived_cars)")}
+            copied = [column for column in CAR_COLUMNS if column in legacy_columns]
+            if copied:
+                columns = ", ".join(copied)
+                values = ", ".join(typed_expression(column) for column in copied)
+                with write_transaction(conn):
+                    migrated = conn.execute(f'''
+                        INSERT INTO inventory ({columns}, status)
+                        SELECT {values}, 'archived' FROM legacy.archived_cars
+                        WHERE vin NOT IN (SELECT vin FROM main.inventory)
+                    ''').rowcount
+                    skipped = conn.execute('''
+                        SELECT COUNT(*) FROM legacy.archived_cars WHERE vin IN (
+                            SELECT vin FROM main.inventory WHERE status = 'active'
+                        )
+                    ''').fetchone()[0]
+                logging.debug(f"Migrated {migrated} archived cars, kept {skipped} VINs that are active again")
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+            conn.close()
+        os.replace(legacy_archive_path, legacy_archive_path + '.migrated')
+
+    def close(self):
+        self.pool.close()
+        logging.debug("Database connections closed")
+
+    def insert_car(self, vin, make, model, model_year, series, options, key_features, stock_number):
+        try:
+            with self.pool.writer() as conn:
+                conn.execute('''
+                    INSERT INTO inventory (vin, make, model, model_year, series, options, key_features, stock_number)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (vin, make, model, model_year, series, options, key_features, stock_number))
+            logging.debug(f"Inserted car with VIN: {vin}")
+        except sqlite3.IntegrityError as e:
+            logging.error(f"Error inserting car with VIN {vin}: {e}")
+            raise ValueError(self.duplicate_vin_message(vin))
+
+    def insert_cars(self, cars):
+        """
+        Inserts (vin, make, model, model_year, series, options, key_features, stock_number)
+        tuples in a single transaction. Returns (vin, reason) pairs for cars that were skipped.
+        """
+        cars = list(cars)
+        failures = []
+        new_cars = []
+        query = f"INSERT INTO inventory ({', '.join(INSERT_COLUMNS)}) VALUES ({', '.join('?' * len(INSERT_COLUMNS))})"
+        # Duplicates are found inside the write transaction, so the rest can't collide and go
+        # through one executemany
+        with self.pool.writer() as conn:
+            existing = {}
+            vins = [car[0] for car in cars]
+            for start in range(0, len(vins), VIN_LOOKUP_CHUNK):
+                chunk = vins[start:start + VIN_LOOKUP_CHUNK]
+                existing.update(conn.execute(
+                    f"SELECT vin, status FROM inventory WHERE vin IN ({', '.join('?' * len(chunk))})", chunk))
+            for car in cars:
+                vin = car[0]
+                if vin in existing:
+                    logging.error(f"Error inserting car with VIN {vin}: VIN already exists")
+                    failures.append((vin, self.duplicate_vin_message(vin, existing[vin])))
+                else:
+                    existing[vin] = ACTIVE
+                    new_cars.append(car)
+            conn.executemany(query, new_cars)
+        logging.debug(f"Inserted {len(new_cars)} cars in one transaction")
+        return failures
+
+    def upsert_cars(self, cars, parser=None):
+        """
+        Inserts or updates {column: value} cars by VIN in one transaction. Only the given
+        columns of an existing car change; new cars get UPSERT_DEFAULTS for what is missing.
+        Cars with the same set of columns share one executemany. With an OptionParser, cars
+        whose options are given get their car_options rows rebuilt from the text.
+        Returns (inserted, updated) counts.
+        """
+        allowed = set(CAR_COLUMNS) | {"status"}
+        groups = {}
+        vins = set()
+        with_options = []
+        # One pass, so cars can be any iterable
+        for car in cars:
+            unknown = set(car) - allowed
+            if unknown or "vin" not in car:
+                raise ValueError(f"Unknown car columns or no VIN: {', '.join(sorted(unknown)) or car}")
+            groups.setdefault(tuple(car), []).append(car)
+            vins.add(car["vin"])
+            if "options" in car:
+                with_options.append(car)
+        with self.pool.writer() as conn:
+            existing = self._existing_vins(conn, list(vins))
+            for columns, rows in groups.items():
+                defaults = {column: sql for column, sql in UPSERT_DEFAULTS.items() if column not in columns}
+                updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "vin")
+                values = [f":{column}" for column in columns] + list(defaults.values())
+                conn.executemany(
+                    f"INSERT INTO inventory ({', '.join(columns + tuple(defaults))}) VALUES ({', '.join(values)}) "
+                    f"ON CONFLICT(vin) DO {f'UPDATE SET {updates}' if updates else 'NOTHING'}", rows)
+            if parser is not None:
+                self._replace_option_text_rows(conn, parser, with_options)
+        inserted = len(vins - existing)
+        logging.debug(f"Upserted {len(vins)} cars in one transaction, {inserted} of them new")
+        return inserted, len(vins) - inserted
+
+    def _existing_vins(self, conn, vins):
+        existing = set()
+        for start in range(0, len(vins), VIN_LOOKUP_CHUNK):
+            chunk = vins[start:start + VIN_LOOKUP_CHUNK]
+            existing.update(vin for vin, in conn.execute(
+                f"SELECT vin FROM inventory WHERE vin IN ({', '.join('?' * len(chunk))})", chunk))
+        return existing
+
+    def _replace_option_text_rows(self, conn, parser, cars):
+        shortened = dict(conn.execute("SELECT option, key_feature FROM key_feature_rules"))
+        for car in cars:
+            row = conn.execute("SELECT id, key_features FROM inventory WHERE vin = ?", (car["vin"],)).fetchone()
+            if row is None:
+                continue
+            car_id, key_features = row
+            conn.execute("DELETE FROM car_options WHERE car_id = ?", (car_id,))
+            conn.executemany('''
+                INSERT OR IGNORE INTO car_options (car_id, option_id, is_key_feature)
+                SELECT ?, id, ? FROM option_catalog WHERE name = ?
+            ''', ((car_id, is_key_feature, name)
+                  for name, is_key_feature in option_text_rows(parser, shortened, car["options"], key_features)))
+
+    def update_cars(self, updates, parser=None):
+        """
+        Applies (vin, {column: value}) updates in a single transaction. Updates that set the
+        same columns share one executemany. With an OptionParser, cars whose options are
+        set get their car_options rows rebuilt from the text, as in upsert_cars().
+        Returns the number of rows updated.
+        """
+        groups = {}
+        with_options = []
+        for vin, details in updates:
+            columns = tuple(details)
+            unknown = set(columns) - set(CAR_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown car columns: {', '.join(sorted(unknown))}")
+            groups.setdefault(columns, []).append([details[column] for column in columns] + [vin])
+            if "options" in details:
+                with_options.append({"vin": vin, "options": details["options"]})
+        updated = 0
+        with self.pool.writer() as conn:
+            for columns, params in groups.items():
+                if not columns:
+                    continue
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                updated += conn.executemany(f"UPDATE inventory SET {assignments} WHERE vin = ?", params).rowcount
+            if parser is not None:
+                self._replace_option_text_rows(conn, parser, with_options)
+        logging.debug(f"Updated {updated} cars in one transaction")
+        return updated
+
+    def set_status_many(self, vins, status):
+        """Moves every given car to status in a single transaction. Returns the number of cars moved."""
+        with self.pool.writer() as conn:
+            moved = conn.executemany("UPDATE inventory SET status = ? WHERE vin = ? AND status != ?",
+                                     ((status, vin, status) for vin in vins)).rowcount
+        logging.debug(f"Moved {moved} cars to {status}")
+        return moved
+
+    def duplicate_vin_message(self, vin, status=None):
+        if status is None:
+            row = self.read().execute("SELECT status FROM inventory WHERE vin = ?", (vin,)).fetchone()
+            status = row[0] if row else None
+        if status == ARCHIVED:
+            return "Car with this VIN is in the archive. De-archive it instead."
+        return "Car with this VIN already exists in the inventory."
+
+    def update_car_options(self, vin, options, parser=None):
+        """Sets a car's options text; with an OptionParser its car_options rows are rebuilt from it too."""
+        with self.pool.writer() as conn:
+            conn.execute('''
+                UPDATE inventory
+                SET options = ?
+                WHERE vin = ?
+            ''', (options, vin))
+            if parser is not None:
+                self._replace_option_text_rows(conn, parser, [{"vin": vin, "options": options}])
+        logging.debug(f"Updated options for car with VIN {vin}")
+
+    def update_car_details(self, vin, **details):
+        with self.pool.writer() as conn:
+            self._update_car_details(conn, vin, details)
+        logging.debug("Car details updated successfully")
+
+    def save_car_details(self, car_id, vin, details, options, key_features=()):
+        """
+        update_car_details() and set_car_options() in one transaction, so the options and
+        key_features text never disagree with the car's car_options rows.
+        """
+        with self.pool.writer() as conn:
+            self._update_car_details(conn, vin, details)
+            self._replace_car_options(conn, car_id, options, key_features)
+        logging.debug(f"Car details and options saved for car {car_id}")
+
+    def _update_car_details(self, conn, vin, details):
+        query = "UPDATE inventory SET "
+        query += ", ".join(f"{key} = ?" for key in details.keys())
+        query += " WHERE vin = ?"
+        params = list(details.values()) + [vin]
+        logging.debug(f"Executing SQL query: {query} with params {params}")
+        conn.execute(query, params)
+
+    def fetch_cars(self, status=ACTIVE):
+        return self.read_records().execute('SELECT * FROM inventory WHERE status = ?', (status,)).fetchall()
+
+    def query_cars(self, status=ACTIVE, columns=LIST_COLUMNS, sort="stock_number", descending=False, after=None,
+                   limit=PAGE_SIZE, filters=None):
+        """
+        Returns one page of cars as (rows, next_cursor), using keyset pagination.
+        filters narrows the rows as described in filter_clause().
+
+        Rows are CarSummary records, or Car records if columns go beyond LIST_COLUMNS.
+        Pass next_cursor back as after to get the following page; it is None once there
+        are no more rows.
+        """
+        allowed = {"id", "status"} | set(CAR_COLUMNS)
+        unknown = [column for column in columns if column not in allowed]
+        if unknown or sort not in SORT_KEYS:
+            raise ValueError(f"Unknown column or sort order: {unknown or sort}")
+
+        key_columns = SORT_KEYS[sort] + ("id",)
+        select = list(columns) + list(key_columns)
+        direction = "DESC" if descending else "ASC"
+        query = f"SELECT {', '.join(select)} FROM inventory WHERE status = ?"
+        params = [status]
+        conditions, filter_params = filter_clause(filters)
+        if conditions:
+            query += f" AND {conditions}"
+            params.extend(filter_params)
+        if after is not None:
+            query += f" AND ({', '.join(key_columns)}) {'<' if descending else '>'} ({', '.join('?' * len(key_columns))})"
+            params.extend(after)
+        query += f" ORDER BY {', '.join(f'{column} {direction}' for column in key_columns)} LIMIT ?"
+        params.append(limit)
+
+        # The sort key values trail the requested columns; they become the next cursor
+        rows = self.read().execute(query, params).fetchall()
+        record_type = record_type_for(columns)
+        records = [record_type.from_values(columns, row) for row in rows]
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = rows[-1][len(columns):]
+        return records, next_cursor
+
+    def search_cars(self, text, status=ACTIVE, columns=LIST_COLUMNS, limit=PAGE_SIZE, filters=None):
+        """Cars matching every word of text in make, model, series, options or key features, best matches first."""
+        match = build_match_query(text)
+        if match is None:
+            return []
+        conditions, filter_params = filter_clause(filters)
+        conditions = f"AND {conditions}" if conditions else ""
+        select = ", ".join(f"inventory.{column}" for column in columns)
+        cursor = self.read_records(record_type_for(columns))
+        if self.fts_enabled:
+            weights = ", ".join(str(weight) for weight in SEARCH_COLUMNS.values())
+            return cursor.execute(f'''
+                SELECT {select} FROM inventory_fts
+                JOIN inventory ON inventory.id = inventory_fts.rowid
+                WHERE inventory_fts MATCH ? AND inventory.status = ? {conditions}
+                ORDER BY bm25(inventory_fts, {weights})
+                LIMIT ?
+            ''', [match, status] + filter_params + [limit]).fetchall()
+
+        searchable = " || ' ' || ".join(f"IFNULL({column}, '')" for column in SEARCH_COLUMNS)
+        words = [term.strip('"*') for term in match.split()]
+        like = " AND ".join(f"({searchable}) LIKE ?" for _ in words)
+        return cursor.execute(f"SELECT {select} FROM inventory WHERE status = ? AND {like} {conditions} LIMIT ?",
+                              [status] + [f"%{word}%" for word in words] + filter_params + [limit]).fetchall()
+
+    def fetch_cars_by_ids(self, ids):
+        """Full rows for the given car ids, in stock number order."""
+        ids = list(ids)
+        if not ids:
+            return []
+        return self.read_records().execute(f"SELECT * FROM inventory WHERE id IN ({', '.join('?' * len(ids))}) "
+                                           f"ORDER BY stock_number, id", ids).fetchall()
+
+    def iter_cars_by_ids(self, ids, columns=CAR_COLUMNS, chunk_size=PAGE_SIZE):
+        """
+        fetch_cars_by_ids() for large selections: yields lists of at most chunk_size cars,
+        in stock number order across all chunks, so only one chunk of rows is held at a time.
+        """
+        # One JSON parameter instead of a placeholder per id, which could exceed SQLite's variable limit
+        ordered = [car_id for car_id, in self.read().execute(
+            "SELECT id FROM inventory WHERE id IN (SELECT value FROM json_each(?)) ORDER BY stock_number, id",
+            (json.dumps(list(ids)),))]
+        select = ", ".join(("id",) + tuple(column for column in columns if column != "id"))
+        record_type = record_type_for(("id",) + tuple(columns))
+        for start in range(0, len(ordered), chunk_size):
+            chunk = ordered[start:start + chunk_size]
+            cars = {car.id: car for car in self.read_records(record_type).execute(
+                f"SELECT {select} FROM inventory WHERE id IN ({', '.join('?' * len(chunk))})", chunk)}
+            # Cars deleted since the ids were read are skipped
+            yield [cars[car_id] for car_id in chunk if car_id in cars]
+
+    def fetch_car_by_vin(self, vin):
+        return self.read_records().execute("SELECT * FROM inventory WHERE vin = ?", (vin,)).fetchone()
+
+    def set_status(self, vin, status):
+        """Moves a car between lifecycle states in one statement. Returns False if the car wasn't found."""
+        with self.pool.writer() as conn:
+            moved = conn.execute("UPDATE inventory SET status = ? WHERE vin = ? AND status != ?",
+                                 (status, vin, status)).rowcount
+        return moved == 1
+
+    def delete_car(self, vin):
+        with self.pool.writer() as conn:
+            conn.execute("DELETE FROM inventory WHERE vin = ? AND status = ?", (vin, ACTIVE))
+
+
+def _benchmark_cars(count, prefix):
+    return [(f"{prefix}{i:012d}", "FORD", "F-150", "2020", "XLT", "AWD, TOW PACKAGE", " ", f"{i:04d}")
+            for i in range(count)]
+
+
+def _rate(count, elapsed):
+    return f"{count / elapsed:,.0f} rows/s"
+
+
+def benchmark(count=5000, wal=True):
+    """
+    Compares the per-row write path (one commit per car) with the bulk API for inserts,
+    updates and archiving, and prints rows/sec for each. Both run with the same journal
+    mode, so the difference is the bulk API's alone.
+    """
+    journal = "WAL" if wal else "rollback journal"
+    with tempfile.TemporaryDirectory() as directory:
+        for label, bulk in (("per-row", False), ("bulk", True)):
+            db = InventoryDatabase(os.path.join(directory, f"{label}.db"), os.path.join(directory, "none.db"), wal=wal)
+            cars = _benchmark_cars(count, "BENCH")
+            vins = [car[0] for car in cars]
+            timings = []
+
+            started = time.perf_counter()
+            if bulk:
+                db.insert_cars(cars)
+            else:
+                for car in cars:
+                    db.insert_car(*car)
+            timings.append(("insert", time.perf_counter() - started))
+
+            started = time.perf_counter()
+            if bulk:
+                db.update_cars((vin, {"series": "LARIAT"}) for vin in vins)
+            else:
+                for vin in vins:
+                    db.update_car_details(vin, series="LARIAT")
+            timings.append(("update", time.perf_counter() - started))
+
+            started = time.perf_counter()
+            if bulk:
+                db.set_status_many(vins, ARCHIVED)
+            else:
+                for vin in vins:
+                    db.set_status(vin, ARCHIVED)
+            timings.append(("archive", time.perf_counter() - started))
+            db.close()
+            print(f"{label}, {journal}: " + ", ".join(f"{name} {_rate(count, elapsed)}" for name, elapsed in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inventory database tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    benchmark_parser = subparsers.add_parser("benchmark", help="compare per-row and bulk write throughput")
+    benchmark_parser.add_argument("--count", type=int, default=5000)
+    benchmark_parser.add_argument("--no-wal", action="store_true", help="run both paths with the rollback journal")
+    args = parser.parse_args()
+
+    benchmark(args.count, wal=not args.no_wal)
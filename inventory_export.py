@@ -0,0 +1,199 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from inventory_db import ACTIVE, ARCHIVED, INVENTORY_DB, InventoryDatabase, filter_clause
+from schema import CAR_COLUMNS
+
+# Output format per file extension
+EXPORT_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".db": "sqlite",
+    ".sqlite": "sqlite",
+}
+
+# Rows fetched per fetchmany() call; only one batch is held in memory at a time
+EXPORT_BATCH = 5000
+
+# Database pages copied per step of a SQLite snapshot
+SNAPSHOT_PAGES = 1024
+
+EXPORT_COLUMNS = ("id",) + CAR_COLUMNS + ("status",)
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def format_for_path(path):
+    """The export format for a file name, from its extension; ValueError if there is none."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export file type: {extension or path}")
+    return EXPORT_FORMATS[extension]
+
+
+class InventoryExport:
+    """
+    Writes cars to a CSV, JSON Lines or SQLite file. status picks active or archived cars
+    (None for both), filters narrows them as in filter_clause() and columns picks the CSV
+    and JSON Lines fields. Rows are streamed through one cursor EXPORT_BATCH at a time; a
+    SQLite export is a snapshot of the whole database taken with the online backup API,
+    with the cars outside status/filters deleted from the copy afterwards.
+
+    run() is meant for a worker thread: progress(stage, done, total) is called after every
+    batch and cancel() stops the export between batches. The file is written next to path
+    and moved into place when complete, so a failed or cancelled export leaves nothing behind.
+    """
+
+    def __init__(self, db, path, export_format=None, status=ACTIVE, columns=EXPORT_COLUMNS, filters=None,
+                 batch_size=EXPORT_BATCH):
+        self.db = db
+        self.path = path
+        self.export_format = export_format or format_for_path(path)
+        if self.export_format not in EXPORT_FORMATS.values():
+            raise ValueError(f"Unknown export format: {self.export_format}")
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        if self.export_format == "sqlite" and tuple(columns) != EXPORT_COLUMNS:
+            raise ValueError("A SQLite snapshot always has every column")
+        self.status = status
+        self.columns = tuple(columns)
+        self.filters = filters
+        self.batch_size = batch_size
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _check_cancelled(self):
+        if self.cancelled:
+            raise ExportCancelled()
+
+    def _where(self):
+        conditions = []
+        params = []
+        if self.status is not None:
+            conditions.append("inventory.status = ?")
+            params.append(self.status)
+        filters, filter_params = filter_clause(self.filters)
+        if filters:
+            conditions.append(filters)
+            params.extend(filter_params)
+        return " AND ".join(conditions) or "1", params
+
+    def count(self):
+        where, params = self._where()
+        return self.db.read().execute(f"SELECT COUNT(*) FROM inventory WHERE {where}", params).fetchone()[0]
+
+    def _batches(self, progress):
+        """Yields lists of row tuples in id order, reporting progress after each."""
+        total = self.count()
+        where, params = self._where()
+        cursor = self.db.read().cursor()
+        cursor.arraysize = self.batch_size
+        cursor.execute(f"SELECT {', '.join(self.columns)} FROM inventory WHERE {where} ORDER BY id", params)
+        done = 0
+        try:
+            while True:
+                self._check_cancelled()
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield rows
+                done += len(rows)
+                if progress:
+                    progress("Exporting cars", done, total)
+        finally:
+            cursor.close()
+
+    def _write_csv(self, file_path, progress):
+        rows = 0
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            for batch in self._batches(progress):
+                writer.writerows(batch)
+                rows += len(batch)
+        return rows
+
+    def _write_jsonl(self, file_path, progress):
+        rows = 0
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        columns = self.columns
+        with open(file_path, "w", encoding="utf-8") as f:
+            for batch in self._batches(progress):
+                f.writelines(encode(dict(zip(columns, row))) + "\n" for row in batch)
+                rows += len(batch)
+        return rows
+
+    def _write_sqlite(self, file_path, progress):
+        def on_pages(status, remaining, total):
+            self._check_cancelled()
+            if progress:
+                progress("Copying database", total - remaining, total)
+
+        snapshot = sqlite3.connect(file_path, isolation_level=None)
+        try:
+            # The backup raises whatever on_pages raises, which is how cancel() gets through
+            self.db.read().backup(snapshot, pages=SNAPSHOT_PAGES, progress=on_pages)
+            # A standalone file: no -wal next to it
+            snapshot.execute("PRAGMA journal_mode = DELETE")
+            where, params = self._where()
+            if where != "1":
+                if progress:
+                    progress("Removing other cars", 0, 1)
+                snapshot.execute("BEGIN")
+                snapshot.execute(f"DELETE FROM inventory WHERE NOT ({where})", params)
+                snapshot.execute("DELETE FROM car_changes")
+                snapshot.execute("COMMIT")
+                snapshot.execute("VACUUM")
+            return snapshot.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+        finally:
+            snapshot.close()
+
+    def run(self, progress=None):
+        """Returns the path written to, or None if the export was cancelled."""
+        started = time.perf_counter()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".export-", suffix=".tmp")
+        os.close(fd)
+        try:
+            write = getattr(self, f"_write_{self.export_format}")
+            rows = write(temp_path, progress)
+            os.replace(temp_path, self.path)
+        except ExportCancelled:
+            os.remove(temp_path)
+            logging.debug(f"Export to {self.path} cancelled")
+            return None
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        logging.debug(f"Exported {rows} cars to {self.path} ({self.export_format}) "
+                      f"in {time.perf_counter() - started:.1f} s")
+        return self.path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export cars to CSV, JSON Lines or a SQLite snapshot")
+    parser.add_argument("path", help="output file; the format follows the extension (.csv, .jsonl, .db)")
+    parser.add_argument("--db", default=INVENTORY_DB)
+    parser.add_argument("--status", choices=(ACTIVE, ARCHIVED, "all"), default=ACTIVE)
+    parser.add_argument("--columns", help="comma-separated columns for CSV and JSON Lines")
+    args = parser.parse_args()
+
+    database = InventoryDatabase(args.db)
+    try:
+        columns = tuple(args.columns.split(",")) if args.columns else EXPORT_COLUMNS
+        export = InventoryExport(database, args.path, status=None if args.status == "all" else args.status,
+                                 columns=columns)
+        print(f"{export.count()} cars exported to {export.run()}")
+    finally:
+        database.close()
@@ -0,0 +1,278 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from inventory_db import ACTIVE, ARCHIVED, INVENTORY_DB, InventoryDatabase
+from options_catalog import OPTIONS_FILE, OptionsCatalog
+from schema import BOOLEAN_COLUMNS, CAR_COLUMNS, parse_model_year
+from vin_check import validate_vins
+from vin_decoder import BATCH_SIZE, car_from_result, chunked, normalize_vin
+
+# Input format per file extension
+IMPORT_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+}
+
+# Rows written per transaction
+IMPORT_BATCH = 1000
+
+# Spreadsheet headings accepted for car columns, after lower-casing and replacing spaces with _
+IMPORT_ALIASES = {
+    "year": "model_year",
+    "stock": "stock_number",
+    "stock_no": "stock_number",
+    "stock_#": "stock_number",
+    "trim": "series",
+}
+
+IMPORT_COLUMNS = CAR_COLUMNS + ("status",)
+
+# Upper-cased like decoded cars, so imported and decoded cars share facet values
+UPPERCASE_COLUMNS = ("make", "model", "series")
+
+TRUE_VALUES = {"1", "true", "yes", "y", "x"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+
+
+def column_for(heading):
+    name = str(heading).strip().lower().replace(" ", "_")
+    return IMPORT_ALIASES.get(name, name)
+
+
+def parse_flag(value):
+    if isinstance(value, bool) or value in (0, 1):
+        return int(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return 1
+    if text in FALSE_VALUES:
+        return 0
+    raise ValueError(f"Not a yes/no value: {value}")
+
+
+def raw_vin(row):
+    """The VIN cell of a raw row as written, for the error report."""
+    if isinstance(row, dict):
+        for heading, value in row.items():
+            if column_for(heading) == "vin" and value is not None:
+                return str(value).strip()
+    return ""
+
+
+def clean_row(row):
+    """
+    {column: value} for a raw CSV or JSON row. Blank cells are left out, so they don't
+    overwrite what an existing car already has. Raises ValueError for a bad value; the VIN
+    is only normalized here and checked a batch at a time by InventoryImport.
+    """
+    car = {}
+    for heading, value in row.items():
+        column = column_for(heading)
+        if column not in IMPORT_COLUMNS or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+        if column == "vin":
+            value = normalize_vin(str(value))
+        elif column == "model_year":
+            try:
+                value = parse_model_year(str(value))
+            except ValueError:
+                raise ValueError(f"Invalid model year: {value}")
+            if value is None:
+                continue
+        elif column in BOOLEAN_COLUMNS:
+            value = parse_flag(value)
+        elif column == "status":
+            value = str(value).lower()
+            if value not in (ACTIVE, ARCHIVED):
+                raise ValueError(f"Unknown status: {value}")
+        else:
+            value = str(value).upper() if column in UPPERCASE_COLUMNS else str(value)
+        car[column] = value
+    if "vin" not in car:
+        raise ValueError("No VIN")
+    return car
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []  # (line, vin, reason)
+        self.cancelled = False
+
+    def fail(self, line, vin, reason):
+        self.errors.append((line, vin, reason))
+
+    def summary(self):
+        text = f"{self.inserted} cars added, {self.updated} updated, {len(self.errors)} rows failed"
+        return text + " (cancelled)" if self.cancelled else text
+
+    def write_errors(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("line", "vin", "error"))
+            writer.writerows(self.errors)
+
+
+class InventoryImport:
+    """
+    Upserts cars from a CSV or JSON Lines file by VIN. The file is streamed and written
+    IMPORT_BATCH rows per transaction with InventoryDatabase.upsert_cars(), so memory
+    doesn't grow with the file. Rows with a bad VIN or value end up in the report's
+    errors with their line number. With decode, rows that have no make or model, for cars
+    that don't already have both, are decoded BATCH_SIZE VINs at a time first. With an
+    OptionParser, options text is also turned into car_options rows.
+
+    run() is meant for a worker thread: progress(stage, done, total) is called after every
+    batch, with total estimated from the share of the file read so far, and cancel() stops
+    the import between batches, keeping the batches already written.
+    """
+
+    def __init__(self, db, path, decode=None, parser=None, batch_size=IMPORT_BATCH):
+        self.db = db
+        self.path = path
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import file type: {extension or path}")
+        self.import_format = IMPORT_FORMATS[extension]
+        self.decode = decode
+        self.parser = parser
+        self.batch_size = batch_size
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _rows(self, f):
+        """Yields (line number, raw row dict); rows that aren't objects are yielded as their error."""
+        if self.import_format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                yield line, ValueError(f"Invalid JSON: {e}")
+                continue
+            yield line, row if isinstance(row, dict) else ValueError("Not a JSON object")
+
+    def _batches(self, f, report):
+        """Yields {vin: (line, car)} batches; a VIN repeated in a batch merges into its first row."""
+        batch = {}
+        for line, row in self._rows(f):
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                car = clean_row(row)
+            except ValueError as e:
+                report.fail(line, raw_vin(row), str(e))
+                continue
+            if car["vin"] in batch:
+                batch[car["vin"]][1].update(car)
+            else:
+                batch[car["vin"]] = (line, car)
+            if len(batch) >= self.batch_size:
+                yield self._validate(batch, report)
+                batch = {}
+        if batch:
+            yield self._validate(batch, report)
+
+    @staticmethod
+    def _validate(batch, report):
+        """Drops the cars whose VIN fails validate_vins(), check digit included, from batch."""
+        for vin, error in zip(list(batch), validate_vins(list(batch))):
+            if error:
+                report.fail(batch.pop(vin)[0], vin, error)
+        return batch
+
+    def _enrich(self, batch, report):
+        """Fills in make, model, model year and series from VIN decoding where they are missing."""
+        missing = [vin for vin, (_, car) in batch.items() if not car.get("make") or not car.get("model")]
+        if not missing:
+            return
+        complete = {vin for vin, in self.db.read().execute(
+            "SELECT vin FROM inventory WHERE vin IN (SELECT value FROM json_each(?)) "
+            "AND make IS NOT NULL AND model IS NOT NULL", (json.dumps(missing),))}
+        for chunk in chunked([vin for vin in missing if vin not in complete], BATCH_SIZE):
+            try:
+                results = self.decode(chunk)
+            except Exception as e:
+                results = {vin: {"ErrorText": f"Decode request failed: {e}"} for vin in chunk}
+            for vin in chunk:
+                result = results.get(vin)
+                line, car = batch[vin]
+                if result and result.get("Make"):
+                    _, make, model, model_year, series = car_from_result(vin, result)[:5]
+                    for column, value in (("make", make), ("model", model), ("model_year", model_year),
+                                          ("series", series)):
+                        if value is not None:
+                            car.setdefault(column, value)
+                else:
+                    report.fail(line, vin, (result or {}).get("ErrorText") or "No results found for this VIN.")
+                    del batch[vin]
+
+    def run(self, progress=None):
+        """Returns an ImportReport, also when cancelled."""
+        started = time.perf_counter()
+        report = ImportReport()
+        size = os.path.getsize(self.path)
+        done = 0
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            for batch in self._batches(f, report):
+                if self.cancelled:
+                    report.cancelled = True
+                    break
+                if self.decode is not None:
+                    self._enrich(batch, report)
+                cars = [car for _, car in batch.values()]
+                try:
+                    inserted, updated = self.db.upsert_cars(cars, self.parser)
+                except sqlite3.Error as e:
+                    logging.error(f"Import batch failed: {e}")
+                    for vin, (line, _) in batch.items():
+                        report.fail(line, vin, f"Database error: {e}")
+                else:
+                    report.inserted += inserted
+                    report.updated += updated
+                done += len(batch)
+                if progress:
+                    # The buffer's position runs ahead of the rows parsed by at most one read
+                    read = min(max(f.buffer.tell(), 1), size)
+                    progress("Importing cars", done, max(done, round(done * size / read)))
+        logging.debug(f"Import of {self.path}: {report.summary()} in {time.perf_counter() - started:.1f} s")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add or update cars from a CSV or JSON Lines file")
+    parser.add_argument("path")
+    parser.add_argument("--db", default=INVENTORY_DB)
+    parser.add_argument("--options", default=OPTIONS_FILE, help="options catalog for rebuilding car_options rows")
+    parser.add_argument("--errors", help="write the rows that failed to this CSV file")
+    args = parser.parse_args()
+
+    database = InventoryDatabase(args.db)
+    try:
+        # Same as the app: imported options text also becomes car_options rows
+        catalog = OptionsCatalog(args.options)
+        catalog.refresh()
+        database.sync_option_catalog(catalog.categories)
+        result = InventoryImport(database, args.path, parser=catalog.matcher).run()
+        print(result.summary())
+        if args.errors and result.errors:
+            result.write_errors(args.errors)
+    finally:
+        database.close()
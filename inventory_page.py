@@ -1,18 +1,65 @@
 import os
 import logging
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import pyperclip
-import PyPDF2
-from PyPDF2.generic import NameObject, TextStringObject, BooleanObject, IndirectObject
 import webbrowser
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
 
-from car_details_page import CarDetailsPage
+from car_records import Car
+from facet_index import FACETS
+from inventory_db import ACTIVE, PAGE_SIZE
+from listings import load_channels
+from options_catalog import OptionsCatalog
+from progress_dialog import ProgressDialog
+from virtual_list import PagedListLoader, SelectionModel, VirtualList
+
+# Milliseconds to wait after the last keystroke before searching
+SEARCH_DELAY = 250
+
+# Sort choices shown above the list, mapped to InventoryDatabase.query_cars sort keys
+SORT_CHOICES = {
+    "Stock #": "stock_number",
+    "Year": "model_year",
+    "Make/Model": "make_model",
+}
+
+
+class InventoryRow(ttk.Frame):
+    """A recyclable inventory row; render() points it at a different car."""
+
+    def __init__(self, parent, page):
+        super().__init__(parent, borderwidth=2, relief="groove")
+        self.page = page
+        self.car = None
+
+        self.car_button = tk.Button(self, command=lambda: page.show_car_details(self.car),
+                                    bg="#f0f0f0", fg="black", font=("Arial", 12), relief="raised", bd=2)
+        self.car_button.pack(side="left", fill="x", expand=True, padx=10, pady=5)
+        self.car_button.config(width=50, height=5)
+
+        action_frame = ttk.Frame(self)
+        action_frame.pack(side="right", fill="y", padx=10, pady=5)
+
+        self.car_var = tk.BooleanVar()
+        car_check = ttk.Checkbutton(action_frame, variable=self.car_var,
+                                    command=lambda: page.selection.set_selected(self.car.id, self.car_var.get()))
+        car_check.pack(fill="x", pady=5)
+
+        copy_button = ttk.Button(action_frame, text="Copy Text", command=lambda: page.copy_text(self.car))
+        copy_button.pack(fill="x", pady=5)
+        vin_button = ttk.Button(action_frame, text="Copy VIN", command=lambda: page.copy_vin(self.car))
+        vin_button.pack(fill="x", pady=5)
+        archive_button = ttk.Button(action_frame, text="Archive", command=lambda: page.archive_car(self.car))
+        archive_button.pack(fill="x", pady=5)
+        delete_button = ttk.Button(action_frame, text="Delete", command=lambda: page.delete_car(self.car))
+        delete_button.pack(fill="x", pady=5)
+        print_guide_button = ttk.Button(action_frame, text="Print Guide", command=lambda: page.print_guide(self.car))
+        print_guide_button.pack(fill="x", pady=5)
+
+    def render(self, car):
+        self.car = car
+        self.car_button.config(text=f"{car.stock_number}\n{car.title}")
+        self.car_var.set(self.page.selection.is_selected(car.id))
 
 
 class InventoryPage(tk.Frame):
@@ -20,23 +67,157 @@ class InventoryPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
+        self.selection = SelectionModel()  # Checked cars, keyed by car id
+        self.sort_var = tk.StringVar(value="Stock #")
+        self.descending_var = tk.BooleanVar(value=False)
+        self.search_var = tk.StringVar()
+        self.search_after_id = None
+        self.filters = {}  # facet -> set of selected values, "options" -> set of required options
+        self.facet_items = {}  # Treeview iid of a value row -> (facet, value)
+
+        self.create_filter_panel()
         self.canvas = tk.Canvas(self)
         self.canvas.pack(side="left", fill="both", expand=True)
         scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
         scrollbar.pack(side="right", fill="y")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
-        self.inventory_container = ttk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.inventory_container, anchor="nw")
+        # Only the visible rows get widgets; they are recycled as the canvas scrolls
+        self.car_list = VirtualList(self.canvas, scrollbar, lambda parent: InventoryRow(parent, self),
+                                    key=lambda car: car.id)
+        # Rows are loaded a page at a time as the list is scrolled
+        self.loader = PagedListLoader(self.car_list, self.fetch_page, PAGE_SIZE)
         self.bind_mousewheel(self.canvas)
-        self.inventory_container.bind("<Configure>",
-                                      lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
         self.update_inventory_list()
+        self.create_search_box()
+        self.create_sort_controls()
         self.create_print_button()
 
+    def create_search_box(self):
+        tk.Label(self, text="Search:").pack(side="top")
+        search_entry = ttk.Entry(self, textvariable=self.search_var, width=30)
+        search_entry.pack(side="top", padx=10)
+        self.search_var.trace_add("write", lambda *args: self.schedule_search())
+
+    def schedule_search(self):
+        # Debounce: only search once typing pauses for SEARCH_DELAY ms
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(SEARCH_DELAY, self.run_search)
+
+    def run_search(self):
+        self.search_after_id = None
+        self.canvas.yview_moveto(0)
+        self.loader.reset()
+
+    def create_sort_controls(self):
+        tk.Label(self, text="Sort by:").pack(side="top")
+        sort_box = ttk.Combobox(self, textvariable=self.sort_var, values=list(SORT_CHOICES), state="readonly", width=12)
+        sort_box.pack(side="top")
+        sort_box.bind("<<ComboboxSelected>>", lambda e: self.loader.reset())
+        ttk.Checkbutton(self, text="Descending", variable=self.descending_var,
+                        command=self.loader.reset).pack(side="top", pady=5)
+
+    def create_filter_panel(self):
+        # One parent row per facet and option category; clicking a value toggles it as a filter
+        panel = ttk.Frame(self)
+        panel.pack(side="left", fill="y", padx=(10, 0), pady=10)
+        ttk.Button(panel, text="Clear Filters", command=self.clear_filters).pack(side="top", fill="x", pady=(0, 5))
+        self.facet_tree = ttk.Treeview(panel, show="tree", selectmode="none", height=30)
+        self.facet_tree.column("#0", width=240)
+        self.facet_tree.pack(side="left", fill="y")
+        facet_scrollbar = ttk.Scrollbar(panel, orient="vertical", command=self.facet_tree.yview)
+        facet_scrollbar.pack(side="right", fill="y")
+        self.facet_tree.configure(yscrollcommand=facet_scrollbar.set)
+
+        for facet, label in FACETS.items():
+            self.facet_tree.insert("", "end", iid=facet, text=label)
+        self.option_categories = {}  # parent iid -> options in that category
+        self.add_option_categories(self.controller.car_options)
+        self.controller.options_catalog.subscribe(self.on_options_changed)
+        self.facet_tree.bind("<ButtonRelease-1>", self.on_facet_click)
+
+    def add_option_categories(self, car_options):
+        for i, (category, options) in enumerate(car_options.items()):
+            self.facet_tree.insert("", "end", iid=f"category{i}", text=category)
+            self.option_categories[f"category{i}"] = options
+
+    def on_options_changed(self, catalog):
+        # Category parents own option rows, so clear the value rows before replacing them
+        self.facet_tree.delete(*self.facet_items)
+        self.facet_items = {}
+        self.facet_tree.delete(*self.option_categories)
+        self.option_categories = {}
+        self.add_option_categories(catalog.categories)
+        self.refresh_facets()
+
+    def refresh_facets(self):
+        """Redraws every facet value with the number of cars selecting it would show."""
+        facet_counts, option_counts, total = self.controller.facet_counts(self.filters)
+        self.facet_tree.delete(*self.facet_items)
+        self.facet_items = {}
+
+        def add_values(parent, facet, counts):
+            selected = self.filters.get(facet, set())
+            for value in sorted(counts):
+                count = counts[value]
+                if not count and value not in selected:
+                    continue
+                mark = "\u2713 " if value in selected else ""
+                iid = self.facet_tree.insert(parent, "end", text=f"{mark}{value or '(blank)'} ({count})")
+                self.facet_items[iid] = (facet, value)
+
+        for facet in FACETS:
+            add_values(facet, facet, facet_counts.get(facet, {}))
+        for parent, options in self.option_categories.items():
+            add_values(parent, "options", {option: option_counts.get(option, 0) for option in options})
+        logging.debug(f"Facet counts refreshed, {total} cars match the filters")
+
+    def on_facet_click(self, event):
+        item = self.facet_tree.identify_row(event.y)
+        if item not in self.facet_items:
+            return
+        facet, value = self.facet_items[item]
+        selected = self.filters.setdefault(facet, set())
+        if value in selected:
+            selected.remove(value)
+        else:
+            selected.add(value)
+        self.apply_filters()
+
+    def clear_filters(self):
+        self.filters = {}
+        self.apply_filters()
+
+    def apply_filters(self):
+        self.refresh_facets()
+        self.canvas.yview_moveto(0)
+        self.loader.reset()
+
+    def fetch_page(self, after, limit):
+        search = self.search_var.get().strip()
+        if search:
+            # Search results come back ranked in a single page
+            return self.controller.search_cars(search, status=ACTIVE, filters=self.filters), None
+        return self.controller.query_cars(status=ACTIVE, sort=SORT_CHOICES[self.sort_var.get()],
+                                          descending=self.descending_var.get(), after=after, limit=limit,
+                                          filters=self.filters)
+
     def create_print_button(self):
         print_button = ttk.Button(self, text="Print Selected Cars", command=self.print_selected_cars)
         print_button.pack(side="top", pady=10)
 
+        guides_button = ttk.Button(self, text="Print Guides for Selected", command=self.print_selected_guides)
+        guides_button.pack(side="top")
+        self.merge_guides_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self, text="One PDF for all guides", variable=self.merge_guides_var).pack(side="top", pady=(0, 10))
+
+        export_button = ttk.Button(self, text="Export Cars...", command=self.export_cars)
+        export_button.pack(side="top", pady=(0, 10))
+
+        listings_button = ttk.Button(self, text="Generate Listings", command=self.generate_listings)
+        listings_button.pack(side="top")
+        self.listing_feed_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self, text="Also write feeds", variable=self.listing_feed_var).pack(side="top", pady=(0, 10))
+
         self.skip_fields_var = tk.IntVar(value=0)
         tk.Label(self, text="Skip fields:").pack(side="top")
         ttk.Spinbox(self, from_=0, to=3, textvariable=self.skip_fields_var, width=5).pack(side="top")
@@ -51,57 +232,17 @@ class InventoryPage(tk.Frame):
         self.unbind_all("<MouseWheel>")
 
     def update_inventory_list(self):
-        for widget in self.inventory_container.winfo_children():
-            widget.destroy()
-        logging.debug("Previous inventory list cleared")
-
-        cars = self.controller.fetch_cars()
-        self.car_check_vars = {}
-        for car in cars:
-            car_frame = ttk.Frame(self.inventory_container, borderwidth=2, relief="groove")
-            car_frame.pack(fill="x", padx=10, pady=5)
-            logging.debug(f"Created frame for car: {car}")
-
-            button_text = f"{car[8]}\n{car[4]} {car[2]} {car[3]}"
-            car_button = tk.Button(car_frame, text=button_text, command=lambda c=car: self.show_car_details(c),
-                                   bg="#f0f0f0", fg="black", font=("Arial", 12), relief="raised", bd=2)
-            car_button.pack(side="left", fill="x", expand=True, padx=10, pady=5)
-            car_button.config(width=50, height=5)
-            logging.debug(f"Added main clickable area for car: {car}")
-
-            action_frame = ttk.Frame(car_frame)
-            action_frame.pack(side="right", fill="y", padx=10, pady=5)
-            logging.debug(f"Created frame for quick action buttons for car: {car}")
-
-            car_var = tk.BooleanVar()
-            car_check = ttk.Checkbutton(action_frame, variable=car_var)
-            car_check.pack(fill="x", pady=5)
-            self.car_check_vars[car] = car_var
-
-            copy_button = ttk.Button(action_frame, text="Copy Text", command=lambda c=car: self.copy_text(c))
-            copy_button.pack(fill="x", pady=5)
-            vin_button = ttk.Button(action_frame, text="Copy VIN", command=lambda c=car: self.copy_vin(c))
-            vin_button.pack(fill="x", pady=5)
-            archive_button = ttk.Button(action_frame, text="Archive", command=lambda c=car: self.archive_car(c))
-            archive_button.pack(fill="x", pady=5)
-            delete_button = ttk.Button(action_frame, text="Delete", command=lambda c=car: self.delete_car(c))
-            delete_button.pack(fill="x", pady=5)
-            print_guide_button = ttk.Button(action_frame, text="Print Guide", command=lambda c=car: self.print_guide(c))
-            print_guide_button.pack(fill="x", pady=5)
-            logging.debug(f"Added Delete button for car: {car}")
+        self.refresh_facets()
+        self.loader.reload()
+        logging.debug(f"Inventory list updated with {len(self.loader.items)} cars loaded")
 
     def show_car_details(self, car):
-        vin = car[1]
+        vin = car.vin
         try:
             car_details = self.controller.fetch_car_by_vin(vin)
             if car_details:
-                if "CarDetailsPage" in self.controller.frames:
-                    self.controller.frames["CarDetailsPage"].update_details(car_details)
-                else:
-                    details_page = CarDetailsPage(parent=self.controller.main_content, controller=self.controller,
-                                                  car_details=car_details)
-                    self.controller.frames["CarDetailsPage"] = details_page
-                self.controller.show_frame("CarDetailsPage")
+                # The details page is created once and switched to this car
+                self.controller.show_frame("CarDetailsPage", car_details=car_details)
             else:
                 logging.error(f"No car found with VIN: {vin}")
                 messagebox.showerror("Error", f"No car details found for VIN: {vin}")
@@ -111,33 +252,9 @@ class InventoryPage(tk.Frame):
 
     def copy_text(self, car):
         try:
-            car_details = self.controller.fetch_car_by_vin(car[1])
-            if car_details:
-                year = car_details[4]
-                make = car_details[2]
-                model = car_details[3]
-                series = car_details[5]
-                options = car_details[6]
-                key_features = car_details[7].replace(", ", ", <br />") + "!"
-                text_to_copy = f'''
-                <div style="text-align: center;"><strong><span style="font-size: 36px;">{year} {make} {model} {series},<br />
-                <br />
-                <span style="font-size: 28px;"><span style="font-size: 24px;">LOW NO HAGGLE PRICE,<br />
-                AUTOCHECK CERTIFIED,<br />
-                LOW RATE FINANCING AVAILABLE,<br />
-                NATIONWIDE SHIPPING!<br />
-                <br />
-                {key_features}</span></span></span></strong><br />
-                <br />
-                <span style="font-size: 36px;"><span style="font-size: 28px;"><span style="font-size: 24px;"><span style="font-size: 18px;">THIS {year} {make} {model} {series} IS IN VERY NICE SHAPE IN AND OUT!<br />
-                THE EXTERIOR IS VERY NICE AND GLOSSY ALL AROUND.<br />
-                THE INTERIOR IS VERY CLEAN.<br />
-                THIS VEHICLE RUNS AND HANDLES EXCELLENT.<br />
-                BUY WITH CONFIDENCE!<br />
-                <br />
-                <strong>OPTIONS: </strong>{options}.</span></span></span></span><br />
-                &nbsp;</div>
-                '''
+            # The list row has no options or key features; the listing reads just its own columns
+            text_to_copy = self.controller.render_listing(car.id)
+            if text_to_copy:
                 pyperclip.copy(text_to_copy)
                 messagebox.showinfo("Success", "Car details copied to clipboard.")
             else:
@@ -147,178 +264,133 @@ class InventoryPage(tk.Frame):
             logging.error(f"Failed to copy text: {str(e)}")
 
     def copy_vin(self, car):
-        car_details = car[1]
+        car_details = car.vin
         pyperclip.copy(car_details)
         logging.debug(f"Copied car VIN details to clipboard: {car_details}")
 
     def archive_car(self, car):
         logging.debug(f"Archiving car: {car}")
         self.controller.archive_car(car)
+        self.selection.discard(car.id)
         self.update_inventory_list()
 
     def delete_car(self, car):
-        vin = car[1]
+        vin = car.vin
         logging.debug(f"Deleting car: {car}")
         if messagebox.askyesno("Delete Car", f"Are you sure you want to delete the car with VIN: {vin}?"):
             self.controller.delete_car(vin)
+            self.selection.discard(car.id)
             logging.debug(f"Deleted car with VIN: {vin}")
             self.update_inventory_list()
 
     def print_selected_cars(self):
-        selected_cars = [car for car, var in self.car_check_vars.items() if var.get()]
-        logging.debug(f"Selected cars for printing: {selected_cars}")
+        car_ids = self.selection.selected_keys()
+        logging.debug(f"Selected cars for printing: {len(car_ids)}")
 
-        if not selected_cars:
+        if not car_ids:
             messagebox.showerror("Error", "Please select at least one car to print.")
             return
 
-        try:
-            file_path = "car_inventory_report.pdf"
-            pdf = SimpleDocTemplate(
-                file_path,
-                pagesize=LETTER,
-                leftMargin=0.5 * inch,
-                rightMargin=0.2 * inch,
-                topMargin=0.2 * inch,
-                bottomMargin=0.2 * inch
-            )
-
-            # List to hold PDF elements
-            elements = []
-
-            # Define styles
-            styles = getSampleStyleSheet()
-            styleN = styles['Normal']
-
-            # Define style for car description (bigger and bold)
-            car_description_style = ParagraphStyle(
-                'CarDescription',
-                parent=styleN,
-                fontName='Helvetica-Bold',  # Bold font
-                fontSize=14,  # Larger font size
-                leading=16,  # Adjust leading to match the font size
-                spaceAfter=12  # Space after the paragraph
-            )
-
-            # Define spacing for options
-            options_style = ParagraphStyle(
-                'Options',
-                parent=styleN,
-                fontName='Helvetica',
-                fontSize=10,
-                leading=20,  # 1.5 line spacing
-                spaceBefore=6,  # Space before the options paragraph
-            )
-
-            for car in selected_cars:
-                year = car[4]
-                make = car[2]
-                model = car[3]
-                stock_number = car[8]
-                series = car[5]
-                options = car[6].replace(',', ', ')
-
-                # Car description
-                car_description = f"{year} {make} {model} - {stock_number} {series}"
-
-                # Create table structure for each car
-                data = [
-                    [
-                        "",  # Empty cell on the left
-                        [
-                            Paragraph(car_description, car_description_style),  # Use new style
-                            Spacer(1, 6),  # Space between description and options
-                            Paragraph(options, options_style)
-                        ]
-                    ]
-                ]
-
-                # Create a table with 100% width
-                table = Table(data, colWidths=[1.0 * inch, 6.5 * inch])
-
-                # Style the main table
-                table.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),  # Add grid lines
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align content to the top
-                    ('LEFTPADDING', (0, 0), (-1, -1), 6),  # Add left padding to all cells
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 6),  # Add right padding to all cells
-                    ('TOPPADDING', (0, 0), (-1, -1), 10),  # Add top padding to all cells
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),  # Add bottom padding to all cells
-                ]))
-
-                # Wrap the table in KeepTogether to ensure it stays on one page, if possible
-                elements.append(KeepTogether(table))
-                elements.append(Spacer(1, 12))  # Add space between each car's table
-
-            # Build the PDF
-            pdf.build(elements)
-
-            logging.debug(f"PDF generated: {file_path}")
-
+        # Built on a worker thread, reading the selected cars from the database in chunks
+        dialog = ProgressDialog(self, "Printing Selected Cars")
+        report = self.controller.generate_report(
+            car_ids,
+            on_done=lambda file_path: self.report_finished(dialog, file_path),
+            on_error=lambda error: self.report_failed(dialog, error),
+            on_progress=dialog.update_progress)
+        dialog.on_cancel = report.cancel
+
+    def report_finished(self, dialog, file_path):
+        dialog.close()
+        if file_path:
             # Open the PDF with the default application
             self.open_pdf_with_default_app(file_path)
 
-        except Exception as e:
-            logging.error(f"Failed to generate PDF report: {e}")
-            messagebox.showerror("Error", f"Failed to generate PDF report: {str(e)}")
+    def report_failed(self, dialog, error):
+        dialog.close()
+        logging.error(f"Failed to generate PDF report: {error}")
+        messagebox.showerror("Error", f"Failed to generate PDF report: {str(error)}")
 
-    def print_guide(self, car):
+    def export_cars(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("SQLite snapshot", "*.db")])
+        if not path:
+            return
+        # The cars the list currently shows, without the search text
+        dialog = ProgressDialog(self, "Exporting Cars")
         try:
-            pdf_reader = PyPDF2.PdfReader(open("buyers_guide_orig.pdf", "rb"))
-            pdf_writer = PyPDF2.PdfWriter()
-
-            for page in pdf_reader.pages:
-                pdf_writer.add_page(page)
-
-            field_values = {
-                "make": car[2],
-                "model": car[3],
-                "year": car[4],
-                "vin": car[1],
-                "stock_number": car[8]
-            }
-
-            for page in pdf_writer.pages:
-                if "/Annots" not in page:
-                    continue
-
-                for field_key in page["/Annots"]:
-                    field = field_key.get_object()
-                    field_name = field.get("/T")
-                    if field_name and field_name in field_values:
-                        logging.debug(f"Updating field {field_name} with value {field_values[field_name]}")
-                        field.update({NameObject("/V"): TextStringObject(field_values[field_name])})
-
-            self.set_need_appearances_writer(pdf_writer)
+            export = self.controller.export_cars(
+                path, ACTIVE, {facet: set(values) for facet, values in self.filters.items()},
+                on_done=lambda file_path: self.export_finished(dialog, file_path),
+                on_error=lambda error: self.export_failed(dialog, error),
+                on_progress=dialog.update_progress)
+        except ValueError as e:
+            self.export_failed(dialog, e)
+            return
+        dialog.on_cancel = export.cancel
+
+    def export_finished(self, dialog, file_path):
+        dialog.close()
+        if file_path:
+            messagebox.showinfo("Export", f"Cars exported to {file_path}")
+
+    def export_failed(self, dialog, error):
+        dialog.close()
+        logging.error(f"Failed to export cars: {error}")
+        messagebox.showerror("Error", f"Failed to export cars: {str(error)}")
+
+    def generate_listings(self):
+        # Checked cars if there are any, otherwise every car changed since the last run
+        car_ids = self.selection.selected_keys() or None
+        dialog = ProgressDialog(self, "Generating Listings")
+        job = self.controller.generate_listings(
+            car_ids, self.listing_feed_var.get(),
+            on_done=lambda result: self.listings_finished(dialog, result),
+            on_error=lambda error: self.listings_failed(dialog, error),
+            on_progress=dialog.update_progress)
+        dialog.on_cancel = job.cancel
+
+    def listings_finished(self, dialog, result):
+        dialog.close()
+        if result is not None:
+            rendered, removed = result
+            messagebox.showinfo("Listings", f"Listings written for {rendered} cars, removed for {removed}.")
+
+    def listings_failed(self, dialog, error):
+        dialog.close()
+        logging.error(f"Failed to generate listings: {error}")
+        messagebox.showerror("Error", f"Failed to generate listings: {str(error)}")
 
-            with open("filled_guide.pdf", "wb") as output_pdf:
-                pdf_writer.write(output_pdf)
+    def print_guide(self, car):
+        self.controller.generate_guides(
+            [car.id], merged=True,
+            on_done=lambda file_path: file_path and self.open_pdf_with_default_app(file_path),
+            on_error=self.guides_failed)
 
-            logging.debug("Filled PDF saved to filled_guide.pdf")
-            self.open_pdf_with_default_app("filled_guide.pdf")
-        except Exception as e:
-            logging.error(f"Failed to fill and save PDF form: {e}")
-            messagebox.showerror("Error", f"Failed to fill and save PDF form: {str(e)}")
+    def print_selected_guides(self):
+        car_ids = self.selection.selected_keys()
+        logging.debug(f"Selected cars for buyers guides: {len(car_ids)}")
 
-    def set_need_appearances_writer(self, writer):
-        try:
-            catalog = writer._root_object
-            if "/AcroForm" not in catalog:
-                writer._root_object.update(
-                    {
-                        NameObject("/AcroForm"): IndirectObject(
-                            len(writer._objects), 0, writer
-                        )
-                    }
-                )
-
-            need_appearances = NameObject("/NeedAppearances")
-            writer._root_object["/AcroForm"][need_appearances] = BooleanObject(True)
-            return writer
+        if not car_ids:
+            messagebox.showerror("Error", "Please select at least one car to print.")
+            return
 
-        except Exception as e:
-            logging.error(f"set_need_appearances_writer() exception: {repr(e)}")
-            return writer
+        # Filled on a worker thread, GUIDE_CHUNK cars per task in a process pool
+        dialog = ProgressDialog(self, "Printing Buyers Guides")
+        batch = self.controller.generate_guides(
+            car_ids,
+            merged=self.merge_guides_var.get(),
+            on_done=lambda path: self.report_finished(dialog, path),
+            on_error=lambda error: self.guides_failed(error, dialog),
+            on_progress=dialog.update_progress)
+        dialog.on_cancel = batch.cancel
+
+    def guides_failed(self, error, dialog=None):
+        if dialog is not None:
+            dialog.close()
+        logging.error(f"Failed to fill and save PDF form: {error}")
+        messagebox.showerror("Error", f"Failed to fill and save PDF form: {str(error)}")
 
     def open_pdf_with_default_app(self, pdf_file_path):
         try:
@@ -330,25 +402,45 @@ class InventoryPage(tk.Frame):
 
 
 class MainController:
+    car_options = {}
+    options_catalog = OptionsCatalog()
+
     def fetch_cars(self):
         return [
-            (1, "VIN1", "Make1", "Model1", "Year1", "Series1", "Options1", "KeyFeatures1", "StockNumber1"),
-            (2, "VIN2", "Make2", "Model2", "Year2", "Series2", "Options2", "KeyFeatures2", "StockNumber2"),
+            Car(id=1, vin="VIN1", make="Make1", model="Model1", model_year=2001, series="Series1", options="Options1",
+                key_features="KeyFeatures1", stock_number="StockNumber1"),
+            Car(id=2, vin="VIN2", make="Make2", model="Model2", model_year=2002, series="Series2", options="Options2",
+                key_features="KeyFeatures2", stock_number="StockNumber2"),
         ]
 
+    def query_cars(self, **query):
+        return self.fetch_cars(), None
+
+    def fetch_cars_by_ids(self, ids):
+        return [car for car in self.fetch_cars() if car.id in ids]
+
+    def facet_counts(self, filters):
+        return {}, {}, len(self.fetch_cars())
+
     def fetch_car_by_vin(self, vin):
         for car in self.fetch_cars():
-            if car[1] == vin:
+            if car.vin == vin:
                 return car
         return None
 
+    def render_listing(self, car_id, channel="html"):
+        for car in self.fetch_cars():
+            if car.id == car_id:
+                return load_channels()[channel].render(car)
+        return None
+
     def archive_car(self, car):
         pass
 
     def delete_car(self, vin):
         pass
 
-    def show_frame(self, frame_name):
+    def show_frame(self, frame_name, **kwargs):
         pass
 
 
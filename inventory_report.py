@@ -0,0 +1,174 @@
+import logging
+import os
+import time
+from xml.sax.saxutils import escape
+
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+
+from schema import format_model_year
+
+# Generated reports go here, one file per run
+REPORT_DIR = 'reports'
+REPORT_PREFIX = 'car_inventory_report'
+
+# Cars read from the database per query while the report is built
+REPORT_CHUNK = 200
+
+# Only the columns the report prints
+REPORT_COLUMNS = ("model_year", "make", "model", "stock_number", "series", "options")
+
+# Shared by every car's table; ReportLab styles are immutable once a document uses them
+CAR_TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),  # Add grid lines
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align content to the top
+    ('LEFTPADDING', (0, 0), (-1, -1), 6),  # Add left padding to all cells
+    ('RIGHTPADDING', (0, 0), (-1, -1), 6),  # Add right padding to all cells
+    ('TOPPADDING', (0, 0), (-1, -1), 10),  # Add top padding to all cells
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),  # Add bottom padding to all cells
+])
+
+_styleN = getSampleStyleSheet()['Normal']
+
+# Car description (bigger and bold)
+CAR_DESCRIPTION_STYLE = ParagraphStyle(
+    'CarDescription',
+    parent=_styleN,
+    fontName='Helvetica-Bold',  # Bold font
+    fontSize=14,  # Larger font size
+    leading=16,  # Adjust leading to match the font size
+    spaceAfter=12  # Space after the paragraph
+)
+
+# Spacing for options
+OPTIONS_STYLE = ParagraphStyle(
+    'Options',
+    parent=_styleN,
+    fontName='Helvetica',
+    fontSize=10,
+    leading=20,  # 1.5 line spacing
+    spaceBefore=6,  # Space before the options paragraph
+)
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+def unique_report_path(directory=REPORT_DIR, prefix=REPORT_PREFIX, folder=False):
+    """
+    Creates and returns a new empty file (or folder) named after the current time.
+    O_EXCL / mkdir make two reports started in the same second get different names
+    instead of sharing one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    suffix = "" if folder else ".pdf"
+    for attempt in range(1000):
+        name = f"{prefix}-{stamp}" if attempt == 0 else f"{prefix}-{stamp}-{attempt}"
+        path = os.path.join(directory, name + suffix)
+        try:
+            if folder:
+                os.mkdir(path)
+            else:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free report name for {prefix}-{stamp} in {directory}")
+
+
+def car_flowable(car):
+    year = format_model_year(car.model_year)
+    options = escape((car.options or "").replace(',', ', '))
+    car_description = escape(f"{year} {car.make} {car.model} - {car.stock_number} {car.series}")
+    data = [
+        [
+            "",  # Empty cell on the left
+            [
+                Paragraph(car_description, CAR_DESCRIPTION_STYLE),
+                Spacer(1, 6),  # Space between description and options
+                Paragraph(options, OPTIONS_STYLE)
+            ]
+        ]
+    ]
+    table = Table(data, colWidths=[1.0 * inch, 6.5 * inch])
+    table.setStyle(CAR_TABLE_STYLE)
+    # Keep each car's table on one page, if possible
+    return KeepTogether(table)
+
+
+class InventoryReport:
+    """
+    The printable list of selected cars. run() is meant for a worker thread: cars are
+    read REPORT_CHUNK at a time, progress(stage, done, total) is called while cars are
+    read ("Reading cars") and laid out ("Laying out pages"), and cancel() stops either
+    stage. The report is written to its own file from unique_report_path(), which is
+    removed again if the report fails or is cancelled.
+    """
+
+    def __init__(self, db, car_ids, directory=REPORT_DIR):
+        self.db = db
+        self.car_ids = list(car_ids)
+        self.directory = directory
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _check_cancelled(self):
+        if self.cancelled:
+            raise ReportCancelled()
+
+    def run(self, progress=None):
+        """Returns the path of the finished PDF, or None if the report was cancelled."""
+        started = time.perf_counter()
+        total = len(self.car_ids)
+        file_path = unique_report_path(self.directory)
+        try:
+            elements = []
+            done = 0
+            for cars in self.db.iter_cars_by_ids(self.car_ids, REPORT_COLUMNS, REPORT_CHUNK):
+                self._check_cancelled()
+                for car in cars:
+                    elements.append(car_flowable(car))
+                    elements.append(Spacer(1, 12))  # Add space between each car's table
+                done += len(cars)
+                if progress:
+                    progress("Reading cars", done, total)
+
+            pdf = SimpleDocTemplate(
+                file_path,
+                pagesize=LETTER,
+                leftMargin=0.5 * inch,
+                rightMargin=0.2 * inch,
+                topMargin=0.2 * inch,
+                bottomMargin=0.2 * inch
+            )
+            flowables = len(elements)
+            reported = -1
+
+            def on_layout(kind, value):
+                nonlocal reported
+                # PROGRESS values are flowables laid out so far, two per car
+                if kind == "PROGRESS":
+                    self._check_cancelled()
+                    laid_out = min(value, flowables) // 2
+                    if progress and laid_out != reported:
+                        reported = laid_out
+                        progress("Laying out pages", laid_out, flowables // 2)
+
+            pdf.setProgressCallBack(on_layout)
+            pdf.build(elements)
+        except ReportCancelled:
+            os.remove(file_path)
+            logging.debug(f"Report of {total} cars cancelled")
+            return None
+        except BaseException:
+            os.remove(file_path)
+            raise
+        logging.debug(f"PDF generated: {file_path} ({total} cars in {time.perf_counter() - started:.1f} s)")
+        return file_path
@@ -0,0 +1,255 @@
+import argparse
+import csv
+import logging
+import sys
+import time
+
+from inventory_db import ACTIVE, INVENTORY_DB, InventoryDatabase
+from option_parser import OptionParser, normalize, split_pieces
+
+# Cars recomputed per read and per write transaction by KeyFeatureJob
+KEY_FEATURE_CHUNK = 1000
+
+# Car columns key features are built from, besides the options flagged as key features
+SOURCE_COLUMNS = ("id", "vin", "key_features", "wheel_size", "alloy_wheels", "two_tone_wheels",
+                  "chrome_wheels", "wheels", "custom_wheels", "is_wheel_key_feature")
+
+# Header of the rule table as CSV; an empty key feature drops the option
+RULE_HEADER = ("option", "key_feature")
+
+
+def wheel_description(wheel_size, wheel_material, custom_wheels):
+    """'18" ALLOY WHEELS' and the like; None when nothing about the wheels is known."""
+    if wheel_material == "None":
+        wheel_material = ""
+    description = f"{wheel_size or ''} {wheel_material or ''} {custom_wheels or ''}".strip()
+    return description or None
+
+
+class KeyFeatureRules:
+    """
+    The key_feature_rules table: (option, key feature) pairs applied in order. When a
+    car's key features include the option it is replaced by the key feature, listed once
+    after the other key features; an empty key feature drops the option. Pieces typed by
+    hand ("ONE OWNER") are kept after them, see free_text().
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.shortened = dict(self.rules)
+        self._key_features = {normalize(key_feature) for _, key_feature in self.rules if key_feature}
+
+    @classmethod
+    def load(cls, db):
+        return cls(db.fetch_key_feature_rules())
+
+    def compose(self, names, wheels=None, free_text=()):
+        """
+        key_features text for key-feature option names (in catalog order), hand-typed
+        free_text pieces and an optional wheel description.
+        """
+        features = list(names)
+        for option, key_feature in self.rules:
+            if option in features:
+                features.remove(option)
+                if key_feature and key_feature not in features:
+                    features.append(key_feature)
+        features.extend(piece for piece in free_text if piece not in features)
+        if wheels:
+            features.append(wheels)
+        return ", ".join(features)
+
+    def free_text(self, text, parser, wheels=None):
+        """
+        The pieces of key_features text that don't come from an option (as parser knows
+        them), a rule's key feature or a wheel description: what was typed by hand.
+        """
+        wheels = normalize(wheels or "")
+        return [piece for piece in parser.parse(text)[1]
+                if normalize(piece) not in self._key_features and normalize(piece) != wheels
+                and "WHEEL" not in piece.upper()]
+
+    def listed_as(self, option, pieces):
+        """Whether key feature text split into pieces lists option, under its own name or its rule's key feature."""
+        return option in pieces or self.shortened.get(option) in pieces
+
+    def compose_car(self, car, names, parser):
+        """compose() for a Car with at least SOURCE_COLUMNS, keeping its hand-typed key features."""
+        wheels = wheel_description(car.wheel_size, car.wheel_material, car.custom_wheels)
+        return self.compose(names, wheels if car.is_wheel_key_feature else None,
+                            self.free_text(car.key_features, parser, wheels))
+
+
+def read_rules(f):
+    """(option, key feature) pairs from CSV rows as write_rules() writes them; the header is optional."""
+    rules = []
+    for line, row in enumerate(csv.reader(f), 1):
+        if not row or (line == 1 and tuple(cell.strip().lower() for cell in row) == RULE_HEADER):
+            continue
+        if len(row) != 2 or not row[0].strip():
+            raise ValueError(f"Line {line}: expected option,key feature")
+        rules.append((row[0].strip(), row[1].strip()))
+    return rules
+
+
+def write_rules(rules, f):
+    writer = csv.writer(f)
+    writer.writerow(RULE_HEADER)
+    writer.writerows(rules)
+
+
+def format_diff(changes):
+    """The changes from KeyFeatureJob.run() as text, one -/+ pair per car."""
+    lines = []
+    for car_id, vin, old, new in changes:
+        lines.append(f"{vin} (car {car_id})")
+        lines.append(f"  - {old}")
+        lines.append(f"  + {new}")
+    return "\n".join(lines)
+
+
+class KeyFeatureJob:
+    """
+    Recomputes inventory.key_features from each car's key-feature options, wheels and
+    the rule table, so a rule change reaches cars nobody opens. Pieces typed by hand are
+    kept; parser (the catalog's names by default) tells them apart from options. Cars are read in id
+    order, chunk_size at a time, and every chunk is written in its own short transaction,
+    so the UI and other writers are never locked out for long. Meant to run on a worker
+    thread; progress(done, total) is called after every chunk and cancel() stops the job
+    between chunks.
+    """
+
+    def __init__(self, db, rules=None, order=None, status=ACTIVE, chunk_size=KEY_FEATURE_CHUNK, parser=None):
+        self.db = db
+        self.rules = rules if rules is not None else KeyFeatureRules.load(db)
+        if parser is None:
+            parser = OptionParser(name for name, in db.read().execute("SELECT name FROM option_catalog"))
+        self.parser = parser
+        # Catalog order of the option names, as CarDetailsPage lists them; option ids otherwise
+        self.position = {name: i for i, name in enumerate(order or ())}
+        self.status = status
+        self.chunk_size = chunk_size
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _where(self):
+        return ("", []) if self.status is None else (" AND status = ?", [self.status])
+
+    def count(self):
+        where, params = self._where()
+        return self.db.read().execute(f"SELECT COUNT(*) FROM inventory WHERE 1{where}", params).fetchone()[0]
+
+    def _chunk(self, after_id):
+        where, params = self._where()
+        cars = self.db.read_records().execute(f'''
+            SELECT {", ".join(SOURCE_COLUMNS)} FROM inventory
+            WHERE id > ?{where} ORDER BY id LIMIT ?
+        ''', [after_id] + params + [self.chunk_size]).fetchall()
+        if not cars:
+            return cars, {}
+        options = {}
+        for car_id, name, is_key_feature in self.db.read().execute('''
+            SELECT car_options.car_id, option_catalog.name, car_options.is_key_feature FROM car_options
+            JOIN option_catalog ON option_catalog.id = car_options.option_id
+            WHERE car_options.car_id BETWEEN ? AND ?
+            ORDER BY option_catalog.id
+        ''', (cars[0].id, cars[-1].id)):
+            options.setdefault(car_id, []).append((name, is_key_feature))
+        return cars, options
+
+    def _key_feature_names(self, car, options):
+        """
+        The car's key-feature options. Options converted from text before the rule table
+        existed may be unflagged although the text lists them by their rule's key feature
+        ("MOONROOF"); those count too and are returned as the second value for flagging.
+        """
+        names = []
+        unflagged = []
+        pieces = None
+        for name, is_key_feature in options:
+            if not is_key_feature:
+                if name not in self.rules.shortened:
+                    continue
+                if pieces is None:
+                    pieces = set(split_pieces(car.key_features))
+                if not self.rules.listed_as(name, pieces):
+                    continue
+                unflagged.append(name)
+            names.append(name)
+        if self.position:
+            end = len(self.position)
+            names.sort(key=lambda name: self.position.get(name, end))
+        return names, unflagged
+
+    def run(self, dry_run=False, progress=None):
+        """
+        Returns [(car id, vin, old text, new text), ...] for the cars whose key features
+        differ from what the rules produce. With dry_run nothing is written.
+        """
+        started = time.perf_counter()
+        total = self.count()
+        changes = []
+        done = 0
+        after_id = 0
+        flagged = 0
+        while not self.cancelled:
+            cars, options = self._chunk(after_id)
+            if not cars:
+                break
+            chunk_changes = []
+            flags = []
+            for car in cars:
+                names, unflagged = self._key_feature_names(car, options.get(car.id, ()))
+                flags.extend((car.id, name) for name in unflagged)
+                new = self.rules.compose_car(car, names, self.parser)
+                # New cars are stored with a placeholder " "; whitespace alone is not a difference
+                if (car.key_features or "").strip() != new:
+                    chunk_changes.append((car.id, car.vin, car.key_features, new))
+            flagged += len(flags)
+            if (chunk_changes or flags) and not dry_run:
+                updated = self.db.update_key_features(
+                    [(car_id, old, new) for car_id, _, old, new in chunk_changes], flags)
+                if updated < len(chunk_changes):
+                    logging.debug(f"{len(chunk_changes) - updated} cars were edited during key feature regeneration")
+            changes.extend(chunk_changes)
+            done += len(cars)
+            after_id = cars[-1].id
+            if progress:
+                progress(done, total)
+        logging.debug(f"Key feature {'dry run' if dry_run else 'regeneration'} checked {done} cars, "
+                      f"{len(changes)} differ, {flagged} options {'need' if dry_run else 'got'} their key feature "
+                      f"flag, in {time.perf_counter() - started:.1f} s{' (cancelled)' if self.cancelled else ''}")
+        return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute key_features from the key feature rule table")
+    parser.add_argument("--db", default=INVENTORY_DB)
+    parser.add_argument("--dry-run", action="store_true", help="only print the changes")
+    parser.add_argument("--all", action="store_true", help="include archived cars")
+    parser.add_argument("--list-rules", action="store_true", help="print the rule table as CSV and exit")
+    parser.add_argument("--set-rules", metavar="CSV",
+                        help="replace the rule table with option,key_feature rows, then recompute")
+    args = parser.parse_args()
+
+    database = InventoryDatabase(args.db)
+    try:
+        if args.list_rules:
+            write_rules(database.fetch_key_feature_rules(), sys.stdout)
+        else:
+            rules = None
+            if args.set_rules:
+                with open(args.set_rules, newline="", encoding="utf-8-sig") as f:
+                    rules = KeyFeatureRules(read_rules(f))
+                if not args.dry_run:
+                    database.set_key_feature_rules(rules.rules)
+                print(f"{len(rules.rules)} rules {'would be set' if args.dry_run else 'set'}")
+            job = KeyFeatureJob(database, rules=rules, status=None if args.all else ACTIVE)
+            diff = job.run(dry_run=args.dry_run)
+            if diff:
+                print(format_diff(diff))
+            print(f"{len(diff)} cars {'would change' if args.dry_run else 'updated'}")
+    finally:
+        database.close()
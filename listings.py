@@ -0,0 +1,310 @@
+import argparse
+import hashlib
+import html
+import json
+import logging
+import os
+import string
+import tempfile
+import time
+from operator import itemgetter
+
+from inventory_db import ACTIVE, INVENTORY_DB, InventoryDatabase
+from option_parser import split_pieces
+from schema import format_model_year
+
+# Generated listings: <LISTING_DIR>/<channel>/<vin><extension>, plus <channel>.jsonl feeds
+LISTING_DIR = 'listings'
+
+# Optional <channel>.html / <channel>.txt files that add channels or replace the built-in ones
+TEMPLATE_DIR = 'listing_templates'
+
+# What the last run rendered: change sequence number, template digests and car id -> VIN
+MANIFEST = 'manifest.json'
+
+# Cars read from the database per query while rendering
+LISTING_CHUNK = 500
+
+LISTING_COLUMNS = ("vin", "model_year", "make", "model", "series", "options", "key_features", "stock_number")
+
+# Fields a template can use; key_feature_list puts every key feature on its own line
+LISTING_FIELDS = ("year", "make", "model", "series", "options", "key_features", "key_feature_list", "vin",
+                  "stock_number")
+
+# The listing Copy Text has always put on the clipboard
+HTML_LISTING = '''<div style="text-align: center;"><strong><span style="font-size: 36px;">{year} {make} {model} {series},<br />
+<br />
+<span style="font-size: 28px;"><span style="font-size: 24px;">LOW NO HAGGLE PRICE,<br />
+AUTOCHECK CERTIFIED,<br />
+LOW RATE FINANCING AVAILABLE,<br />
+NATIONWIDE SHIPPING!<br />
+<br />
+{key_feature_list}!</span></span></span></strong><br />
+<br />
+<span style="font-size: 36px;"><span style="font-size: 28px;"><span style="font-size: 24px;"><span style="font-size: 18px;">THIS {year} {make} {model} {series} IS IN VERY NICE SHAPE IN AND OUT!<br />
+THE EXTERIOR IS VERY NICE AND GLOSSY ALL AROUND.<br />
+THE INTERIOR IS VERY CLEAN.<br />
+THIS VEHICLE RUNS AND HANDLES EXCELLENT.<br />
+BUY WITH CONFIDENCE!<br />
+<br />
+<strong>OPTIONS: </strong>{options}.</span></span></span></span><br />
+&nbsp;</div>
+'''
+
+# The same listing for marketplaces that only take plain text
+TEXT_LISTING = '''{year} {make} {model} {series}
+
+LOW NO HAGGLE PRICE,
+AUTOCHECK CERTIFIED,
+LOW RATE FINANCING AVAILABLE,
+NATIONWIDE SHIPPING!
+
+{key_feature_list}!
+
+THIS {year} {make} {model} {series} IS IN VERY NICE SHAPE IN AND OUT!
+THE EXTERIOR IS VERY NICE AND GLOSSY ALL AROUND.
+THE INTERIOR IS VERY CLEAN.
+THIS VEHICLE RUNS AND HANDLES EXCELLENT.
+BUY WITH CONFIDENCE!
+
+OPTIONS: {options}.
+'''
+
+# channel -> (template, file extension)
+DEFAULT_CHANNELS = {
+    "html": (HTML_LISTING, ".html"),
+    "text": (TEXT_LISTING, ".txt"),
+}
+
+
+class ListingTemplate:
+    """
+    A channel's listing template with {field} placeholders from LISTING_FIELDS, parsed
+    once: rendering is a single str.format() over the fields the template uses, in order.
+    Values are HTML-escaped for .html templates.
+    """
+
+    def __init__(self, channel, text, extension):
+        self.channel = channel
+        self.extension = extension
+        self.is_html = extension in (".html", ".htm")
+        self.line_break = ", <br />" if self.is_html else ",\n"
+        self.digest = hashlib.sha1(f"{extension}\0{text}".encode("utf-8")).hexdigest()
+        parts = []
+        fields = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(text):
+            parts.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field not in LISTING_FIELDS:
+                raise ValueError(f"Unknown field {{{field}}} in the {channel} listing template")
+            parts.append("{" + (f"!{conversion}" if conversion else "") + (f":{format_spec}" if format_spec else "") + "}")
+            fields.append(field)
+        self._format = "".join(parts).format
+        self._fields = itemgetter(*fields) if fields else (lambda values: ())
+        self._single = len(fields) == 1
+
+    def values(self, car):
+        """The template fields of a car with at least LISTING_COLUMNS."""
+        # Quotes stay as typed: 18" WHEELS, OWNER'S MANUAL
+        escape = (lambda text: html.escape(text, quote=False)) if self.is_html else str
+        values = {
+            "year": format_model_year(car.model_year),
+            "make": car.make or "",
+            "model": car.model or "",
+            "series": car.series or "",
+            "options": car.options or "",
+            "key_features": (car.key_features or "").strip(),
+            "vin": car.vin,
+            "stock_number": car.stock_number or "",
+        }
+        values = {field: escape(value) for field, value in values.items()}
+        values["key_feature_list"] = self.line_break.join(
+            escape(piece) for piece in split_pieces(car.key_features or ""))
+        return values
+
+    def render(self, car):
+        fields = self._fields(self.values(car))
+        return self._format(fields) if self._single else self._format(*fields)
+
+    def file_name(self, car):
+        return car.vin + self.extension
+
+
+def load_channels(directory=TEMPLATE_DIR):
+    """{channel: ListingTemplate}: the built-in channels plus any template files in directory."""
+    templates = {channel: ListingTemplate(channel, text, extension)
+                 for channel, (text, extension) in DEFAULT_CHANNELS.items()}
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            channel, extension = os.path.splitext(name)
+            if extension.lower() not in (".html", ".htm", ".txt"):
+                continue
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                templates[channel] = ListingTemplate(channel, f.read(), extension.lower())
+            logging.debug(f"Loaded {channel} listing template from {name}")
+    return templates
+
+
+def write_file(path, text):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+
+class ListingJob:
+    """
+    Renders listings for every channel into LISTING_DIR. Without car_ids the whole active
+    inventory is covered incrementally: only cars changed since the last run (by the
+    car_changes sequence) are rendered, and listings of cars that were archived or deleted
+    are removed. A changed template re-renders everything. With car_ids, just those cars
+    are rendered. With feed, each channel's listings are also collected into
+    <channel>.jsonl. run() is meant for a worker thread; progress(stage, done, total) is
+    called after every chunk and cancel() stops between chunks.
+    """
+
+    def __init__(self, db, templates, directory=LISTING_DIR, car_ids=None, feed=False, chunk_size=LISTING_CHUNK):
+        self.db = db
+        self.templates = templates
+        self.directory = directory
+        self.car_ids = None if car_ids is None else list(car_ids)
+        self.feed = feed
+        self.chunk_size = chunk_size
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"seq": None, "templates": {}, "cars": {}}
+        except (OSError, ValueError) as e:
+            logging.error(f"Unreadable listing manifest, rendering everything: {e}")
+            return {"seq": None, "templates": {}, "cars": {}}
+        # JSON object keys are strings
+        manifest["cars"] = {int(car_id): vin for car_id, vin in manifest["cars"].items()}
+        return manifest
+
+    def _save_manifest(self, manifest):
+        fd, temp_path = tempfile.mkstemp(prefix=".manifest-", suffix=".json", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(temp_path, self._manifest_path())
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _remove(self, vin):
+        for template in self.templates.values():
+            path = os.path.join(self.directory, template.channel, vin + template.extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _plan(self, manifest):
+        """(car ids to render, car ids whose listings go, sequence number to record or None)."""
+        if self.car_ids is not None:
+            return self.car_ids, [], None
+        digests = {channel: template.digest for channel, template in self.templates.items()}
+        active = "SELECT id FROM inventory WHERE status = ?"
+        if manifest["seq"] is None or manifest["templates"] != digests:
+            seq = self.db.last_change_seq()
+            ids = [car_id for car_id, in self.db.read().execute(active, (ACTIVE,))]
+            current = set(ids)
+            return ids, [car_id for car_id in manifest["cars"] if car_id not in current], seq
+        changed, seq = self.db.changes_since(manifest["seq"])
+        if not changed:
+            return [], [], seq
+        still_active = {car_id for car_id, in self.db.read().execute(
+            f"{active} AND id IN (SELECT value FROM json_each(?))", (ACTIVE, json.dumps(changed)))}
+        return ([car_id for car_id in changed if car_id in still_active],
+                [car_id for car_id in changed if car_id not in still_active and car_id in manifest["cars"]], seq)
+
+    def _write_feeds(self, manifest, progress):
+        cars = manifest["cars"]
+        for template in self.templates.values():
+            feed_path = os.path.join(self.directory, f"{template.channel}.jsonl")
+            fd, temp_path = tempfile.mkstemp(prefix=".feed-", suffix=".jsonl", dir=self.directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as feed:
+                    for done, vin in enumerate(cars.values(), 1):
+                        with open(os.path.join(self.directory, template.channel, vin + template.extension),
+                                  encoding="utf-8") as f:
+                            feed.write(json.dumps({"vin": vin, "listing": f.read()}, ensure_ascii=False) + "\n")
+                        if progress and done % self.chunk_size == 0:
+                            progress(f"Writing {template.channel} feed", done, len(cars))
+                os.replace(temp_path, feed_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+    def run(self, progress=None):
+        """Returns (listings rendered, listings removed) counted in cars, or None if cancelled."""
+        started = time.perf_counter()
+        for template in self.templates.values():
+            os.makedirs(os.path.join(self.directory, template.channel), exist_ok=True)
+        manifest = self._load_manifest()
+        render_ids, remove_ids, seq = self._plan(manifest)
+
+        rendered = 0
+        for cars in self.db.iter_cars_by_ids(render_ids, LISTING_COLUMNS, self.chunk_size):
+            if self.cancelled:
+                break
+            for car in cars:
+                old_vin = manifest["cars"].get(car.id)
+                if old_vin is not None and old_vin != car.vin:
+                    self._remove(old_vin)
+                for template in self.templates.values():
+                    write_file(os.path.join(self.directory, template.channel, template.file_name(car)),
+                               template.render(car))
+                manifest["cars"][car.id] = car.vin
+            rendered += len(cars)
+            if progress:
+                progress("Rendering listings", rendered, len(render_ids))
+        if not self.cancelled:
+            for car_id in remove_ids:
+                self._remove(manifest["cars"].pop(car_id))
+            if seq is not None:
+                manifest["seq"] = seq
+                manifest["templates"] = {channel: template.digest for channel, template in self.templates.items()}
+        # Saved when cancelled too, so the listings written so far are known; the sequence only moves on completion
+        self._save_manifest(manifest)
+        if self.cancelled:
+            logging.debug(f"Listing generation cancelled after {rendered} cars")
+            return None
+        if self.feed:
+            self._write_feeds(manifest, progress)
+        logging.debug(f"Rendered listings for {rendered} cars and removed {len(remove_ids)} "
+                      f"in {time.perf_counter() - started:.1f} s")
+        return rendered, len(remove_ids)
+
+
+def render_car(db, car_id, template):
+    """One car's listing, or None if the car doesn't exist."""
+    for cars in db.iter_cars_by_ids([car_id], LISTING_COLUMNS):
+        for car in cars:
+            return template.render(car)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render marketplace listings for the active inventory")
+    parser.add_argument("--db", default=INVENTORY_DB)
+    parser.add_argument("--out", default=LISTING_DIR)
+    parser.add_argument("--templates", default=TEMPLATE_DIR)
+    parser.add_argument("--feed", action="store_true", help="also write a <channel>.jsonl feed per channel")
+    args = parser.parse_args()
+
+    database = InventoryDatabase(args.db)
+    try:
+        result = ListingJob(database, load_channels(args.templates), args.out, feed=args.feed).run()
+        print(f"{result[0]} cars rendered, {result[1]} removed")
+    finally:
+        database.close()
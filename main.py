@@ -1,28 +1,36 @@
 import logging
+import multiprocessing
 from car_inventory_app import CarInventoryApp
 
-# Clear the existing log file by opening it in 'w' mode
-with open('car_inventory.log', 'w'):
-    pass
 
-# Create a custom logger
-logger = logging.getLogger()
+def setup_logging():
+    # Clear the existing log file by opening it in 'w' mode
+    with open('car_inventory.log', 'w'):
+        pass
 
-# Set the minimum log level
-logger.setLevel(logging.DEBUG)
+    # Create a custom logger
+    logger = logging.getLogger()
 
-# Create a file handler
-file_handler = logging.FileHandler('car_inventory.log')
-file_handler.setLevel(logging.DEBUG)
+    # Set the minimum log level
+    logger.setLevel(logging.DEBUG)
 
-# Create a formatter and set it for the handler
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-file_handler.setFormatter(formatter)
+    # Create a file handler
+    file_handler = logging.FileHandler('car_inventory.log')
+    file_handler.setLevel(logging.DEBUG)
+
+    # Create a formatter and set it for the handler
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    file_handler.setFormatter(formatter)
+
+    # Add the file handler to the logger
+    logger.addHandler(file_handler)
+    return logger
 
-# Add the file handler to the logger
-logger.addHandler(file_handler)
 
 if __name__ == "__main__":
+    # Buyers guide workers re-import this module when processes are spawned; only the app sets up the log
+    multiprocessing.freeze_support()
+    logger = setup_logging()
     logger.debug("Starting Car Inventory application.")
     try:
         app = CarInventoryApp()
@@ -0,0 +1,82 @@
+import re
+
+# Separator between options in the options and key_features text columns
+SEPARATOR = re.compile(r"\s*,\s*")
+
+_END = None  # trie key holding the option name that ends at a node
+
+# Upper bound on memoized piece keys; free text in the options column could otherwise grow it without limit
+MAX_MEMO = 100000
+
+
+def normalize(piece):
+    """Case and whitespace differences don't matter when matching ("Power  windows" == "POWER WINDOWS")."""
+    return " ".join(piece.split()).casefold()
+
+
+def split_pieces(text):
+    """The comma-separated pieces of option text, stripped, without empties."""
+    return [piece for piece in SEPARATOR.split((text or "").strip()) if piece]
+
+
+class OptionParser:
+    """
+    Turns comma-joined option or key-feature text back into catalog names.
+
+    Some names contain commas themselves ("POWER WINDOWS, LOCKS AND SEAT"), so the names
+    are compiled into a trie keyed by normalized comma pieces, and parsing walks the
+    pieces once, taking the longest name that starts at each piece. Pieces that start no
+    name are returned as leftovers (wheel descriptions, free text).
+    """
+
+    def __init__(self, names):
+        self.names = frozenset(names)
+        self.trie = {}
+        for name in self.names:
+            node = self.trie
+            for piece in split_pieces(name):
+                node = node.setdefault(normalize(piece), {})
+            node[_END] = name
+        # Raw pieces repeat across the whole inventory, so (stripped piece, key) is memoized per raw piece
+        self._pieces = {}
+
+    def _piece(self, raw):
+        piece = self._pieces.get(raw)
+        if piece is None:
+            if len(self._pieces) >= MAX_MEMO:
+                self._pieces.clear()
+            stripped = raw.strip()
+            piece = self._pieces[raw] = (stripped, normalize(stripped))
+        return piece
+
+    def parse(self, text):
+        """Returns (matched names in text order, leftover pieces)."""
+        pieces = [self._piece(raw) for raw in (text or "").split(",")]
+        pieces = [piece for piece in pieces if piece[0]]
+        trie = self.trie
+        matched = []
+        leftover = []
+        i = 0
+        count = len(pieces)
+        while i < count:
+            node = trie
+            name = None
+            end = j = i
+            while j < count:
+                node = node.get(pieces[j][1])
+                if node is None:
+                    break
+                j += 1
+                if _END in node:
+                    name = node[_END]
+                    end = j
+            if name is None:
+                leftover.append(pieces[i][0])
+                i += 1
+            else:
+                matched.append(name)
+                i = end
+        return matched, leftover
+
+    def __contains__(self, name):
+        return name in self.names
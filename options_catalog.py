@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import tempfile
+
+from option_parser import OptionParser
+
+OPTIONS_FILE = 'car_options.json'
+
+
+class OptionsCatalog:
+    """
+    The {category: [option, ...]} catalog from car_options.json, owned by the app.
+
+    refresh() only re-reads the file when its mtime or size changed, save() replaces it
+    atomically, and both notify subscribers with the catalog when the contents changed,
+    so open pages can update in place. The lookups the pages and parsers need
+    (category_of, ids, matcher) are rebuilt once per change instead of per use.
+    """
+
+    def __init__(self, path=OPTIONS_FILE):
+        self.path = path
+        self.categories = {}
+        self.category_of = {}  # option name -> category
+        self.ids = {}  # option name -> option_catalog id, set by the app after syncing the database
+        self.matcher = OptionParser(())
+        self._stamp = None
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Calls callback(catalog) after every change; returns callback so it can be unsubscribed."""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Re-reads the file if it changed since the last load or save. Returns True when it did."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        if stamp is None:
+            logging.error(f"Car options file '{self.path}' not found.")
+            categories = {}
+        else:
+            try:
+                with open(self.path, 'r') as f:
+                    categories = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to load {self.path}: {e}")
+                return False
+            logging.debug(f"Loaded {self.path}")
+        return self._set_categories(categories)
+
+    def save(self, categories):
+        """Writes categories to a temporary file next to the catalog and swaps it into place."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".car_options-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(categories, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._stamp = self._file_stamp()
+        logging.debug(f"Saved {self.path}")
+        self._set_categories(categories)
+
+    def add_option(self, category, option):
+        """Adds option to category (creating the category if needed) and saves. Returns False if it was already there."""
+        if option in self.categories.get(category, ()):
+            return False
+        categories = {name: list(options) for name, options in self.categories.items()}
+        categories.setdefault(category, []).append(option)
+        self.save(categories)
+        return True
+
+    def set_ids(self, option_ids):
+        self.ids = dict(option_ids)
+
+    def _set_categories(self, categories):
+        if categories == self.categories:
+            return False
+        self.categories = categories
+        self.category_of = {option: category for category, options in categories.items() for option in options}
+        self.matcher = OptionParser(self.category_of)
+        for callback in list(self._subscribers):
+            try:
+                callback(self)
+            except Exception as e:
+                logging.error(f"Options catalog subscriber {callback!r} failed: {e}")
+        return True
+
+    def __iter__(self):
+        return iter(self.category_of)
+
+    def __len__(self):
+        return len(self.category_of)
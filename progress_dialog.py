@@ -0,0 +1,41 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class ProgressDialog(tk.Toplevel):
+    """
+    A small window with a status line, a progress bar and a Cancel button for work that
+    runs in the background. update_progress() and close() must be called on the Tk thread,
+    e.g. from callbacks posted through TkCallbackQueue.
+    """
+
+    def __init__(self, parent, title, on_cancel=None):
+        super().__init__(parent)
+        self.title(title)
+        self.resizable(False, False)
+        self.transient(parent.winfo_toplevel())
+        self.on_cancel = on_cancel
+
+        self.status_label = ttk.Label(self, text="Starting...", width=50)
+        self.status_label.pack(padx=15, pady=(15, 5), anchor="w")
+        self.progress = ttk.Progressbar(self, mode="determinate", length=360)
+        self.progress.pack(padx=15, pady=5)
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(pady=(5, 15))
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def update_progress(self, stage, done, total):
+        if not self.winfo_exists():
+            return
+        self.status_label.configure(text=f"{stage}: {done} of {total}")
+        self.progress.configure(maximum=max(total, 1), value=done)
+
+    def cancel(self):
+        self.status_label.configure(text="Cancelling...")
+        self.cancel_button.configure(state="disabled")
+        if self.on_cancel:
+            self.on_cancel()
+
+    def close(self):
+        if self.winfo_exists():
+            self.destroy()
@@ -0,0 +1,348 @@
+import logging
+import sqlite3
+
+from db_pool import write_transaction
+
+# Bumped whenever a step is added to MIGRATIONS; stored in PRAGMA user_version
+SCHEMA_VERSION = 4
+
+# Every column of a car row after the id, in table order
+CAR_COLUMNS = (
+    "vin", "make", "model", "model_year", "series", "options", "key_features", "stock_number",
+    "wheel_size", "alloy_wheels", "two_tone_wheels", "chrome_wheels", "wheels", "custom_wheels",
+    "is_wheel_key_feature",
+)
+
+BOOLEAN_COLUMNS = ("alloy_wheels", "two_tone_wheels", "chrome_wheels", "wheels", "is_wheel_key_feature")
+
+# Columns covered by the inventory_fts full-text index
+FTS_COLUMNS = ("make", "model", "series", "options", "key_features")
+
+# Rows copied per transaction when a migration rebuilds the inventory table
+MIGRATION_BATCH = 5000
+
+INVENTORY_TABLE = '''
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        vin TEXT UNIQUE NOT NULL,
+        make TEXT,
+        model TEXT,
+        model_year INTEGER,
+        series TEXT,
+        options TEXT,
+        key_features TEXT,
+        stock_number TEXT,
+        wheel_size TEXT,
+        alloy_wheels BOOLEAN NOT NULL DEFAULT 0,
+        two_tone_wheels BOOLEAN NOT NULL DEFAULT 0,
+        chrome_wheels BOOLEAN NOT NULL DEFAULT 0,
+        wheels BOOLEAN NOT NULL DEFAULT 0,
+        custom_wheels TEXT,
+        is_wheel_key_feature BOOLEAN NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'active'
+    )
+'''
+
+# Columns older databases may be missing, with the definitions ALTER TABLE adds them with
+LEGACY_COLUMNS = {
+    "wheel_size": "TEXT",
+    "alloy_wheels": "BOOLEAN",
+    "two_tone_wheels": "BOOLEAN",
+    "chrome_wheels": "BOOLEAN",
+    "wheels": "BOOLEAN",
+    "custom_wheels": "TEXT",
+    "is_wheel_key_feature": "BOOLEAN",
+    "status": "TEXT NOT NULL DEFAULT 'active'",
+}
+
+
+def parse_model_year(text):
+    """Model year typed or decoded as text, as an int; None when blank or "N/A"."""
+    text = str(text or "").strip()
+    if not text or text.upper() == "N/A":
+        return None
+    if not (text.isdigit() and len(text) == 4):
+        raise ValueError(f"Model year must be a 4-digit year, not {text!r}")
+    return int(text)
+
+
+def format_model_year(year):
+    return "N/A" if year is None else str(year)
+
+
+# Rules the key_feature_rules table starts with: a car whose key features include the option
+# lists the shorter key feature instead (the rules that used to be hard-coded in CarDetailsPage)
+DEFAULT_KEY_FEATURE_RULES = (
+    ("POWER WINDOWS, LOCKS AND SEAT", "POWER SEAT"),
+    ("POWER WINDOWS, LOCKS, SEAT AND MOONROOF", "MOONROOF"),
+    ("POWER WINDOWS, LOCKS, SEATS AND MOONROOF", "MOONROOF"),
+    ("POWER WINDOWS, LOCKS, SEATS AND DUAL MOONROOF", "DUAL MOONROOF"),
+    ("POWER WINDOWS, LOCKS, SEATS AND PANORAMIC MOONROOF", "PANORAMIC MOONROOF"),
+)
+
+
+def user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def create_tables(conn):
+    """Tables that hang off inventory and are unaffected by rebuilding it."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS option_catalog (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            category TEXT NOT NULL
+        )
+    ''')
+    # Links cars to the options they have, flagging key features
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS car_options (
+            car_id INTEGER NOT NULL,
+            option_id INTEGER NOT NULL,
+            is_key_feature BOOLEAN NOT NULL DEFAULT 0,
+            PRIMARY KEY (car_id, option_id)
+        ) WITHOUT ROWID
+    ''')
+    # Lookups by option ("every car with AWD") go through this index
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_car_options_option ON car_options (option_id, car_id)")
+    # One row per car with the sequence number of its latest change, read by FacetIndex.refresh()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS car_changes (
+            car_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_car_changes_seq ON car_changes (seq)")
+    # How option names are shortened in key_features, applied in position order; see key_features.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS key_feature_rules (
+            position INTEGER PRIMARY KEY,
+            option TEXT UNIQUE NOT NULL,
+            key_feature TEXT NOT NULL
+        )
+    ''')
+
+
+def seed_key_feature_rules(conn):
+    conn.executemany("INSERT OR IGNORE INTO key_feature_rules (option, key_feature) VALUES (?, ?)",
+                     DEFAULT_KEY_FEATURE_RULES)
+
+
+def create_inventory_dependents(conn):
+    """Indexes, the archive view, the FTS index and the triggers that depend on the inventory table."""
+    # Keyset pagination indexes; the status prefix serves the archive list as well
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_stock ON inventory (status, stock_number, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_year ON inventory (status, IFNULL(model_year, 0), id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_make_model ON inventory (status, make, model, id)")
+    # Read-only view kept for code and tools that still look for the old archive table
+    conn.execute('''
+        CREATE VIEW IF NOT EXISTS archived_cars AS
+        SELECT * FROM inventory WHERE status = 'archived'
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS car_options_cleanup AFTER DELETE ON inventory BEGIN
+            DELETE FROM car_options WHERE car_id = old.id;
+        END
+    ''')
+
+    create_change_triggers(conn)
+    create_search_index(conn)
+
+
+# Triggers that record every car and car_options change in car_changes
+CHANGE_TRIGGERS = (
+    ("car_changes_insert", "INSERT", "inventory", "new.id"),
+    ("car_changes_update", "UPDATE", "inventory", "new.id"),
+    ("car_changes_delete", "DELETE", "inventory", "old.id"),
+    ("car_changes_option_insert", "INSERT", "car_options", "new.car_id"),
+    ("car_changes_option_delete", "DELETE", "car_options", "old.car_id"),
+)
+
+
+def create_change_triggers(conn):
+    # An upsert overrides the conflict handling of the statements in triggers it fires, so
+    # INSERT OR REPLACE fails there; an UPDATE plus an INSERT of missing rows can't conflict
+    next_seq = "(SELECT IFNULL(MAX(seq), 0) + 1 FROM car_changes)"
+    for name, event, table, row in CHANGE_TRIGGERS:
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} BEGIN
+                UPDATE car_changes SET seq = {next_seq} WHERE car_id = {row};
+                INSERT INTO car_changes (car_id, seq)
+                SELECT {row}, {next_seq} WHERE NOT EXISTS (SELECT 1 FROM car_changes WHERE car_id = {row});
+            END
+        ''')
+
+
+def create_search_index(conn):
+    """
+    Creates and fills the FTS5 index over FTS_COLUMNS, kept in sync by triggers on inventory.
+    Archived cars are covered too since they are inventory rows. Skipped when this SQLite
+    build has no FTS5; searches then fall back to LIKE.
+    """
+    columns = ", ".join(FTS_COLUMNS)
+    new_columns = ", ".join(f"new.{column}" for column in FTS_COLUMNS)
+    old_columns = ", ".join(f"old.{column}" for column in FTS_COLUMNS)
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts
+            USING fts5({columns}, content='inventory', content_rowid='id')
+        ''')
+    except sqlite3.OperationalError as e:
+        logging.error(f"Full-text search unavailable, falling back to LIKE searches: {e}")
+        return
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_insert AFTER INSERT ON inventory BEGIN
+            INSERT INTO inventory_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_delete AFTER DELETE ON inventory BEGIN
+            INSERT INTO inventory_fts (inventory_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_update AFTER UPDATE OF {columns} ON inventory BEGIN
+            INSERT INTO inventory_fts (inventory_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+            INSERT INTO inventory_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+        END
+    ''')
+    conn.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+
+
+def add_missing_columns(conn):
+    """Version 1: brings databases made by db_setup.py or older app versions up to the full column set."""
+    with write_transaction(conn):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(inventory)")}
+        for column, definition in LEGACY_COLUMNS.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE inventory ADD COLUMN {column} {definition}")
+                logging.debug(f"Added {column} column to inventory")
+        conn.execute("PRAGMA user_version = 1")
+
+
+def typed_expression(column):
+    """SQL converting a version 1 value of column to its version 2 type."""
+    if column == "model_year":
+        return ("CASE WHEN trim(model_year) GLOB '[0-9][0-9][0-9][0-9]' "
+                "THEN CAST(trim(model_year) AS INTEGER) END")
+    if column in BOOLEAN_COLUMNS:
+        return f"CASE WHEN {column} THEN 1 ELSE 0 END"
+    return column
+
+
+def typed_select():
+    return ", ".join(["id"] + [typed_expression(column) for column in CAR_COLUMNS] + ["IFNULL(status, 'active')"])
+
+
+def rebuild_typed_inventory(conn, batch_size=MIGRATION_BATCH):
+    """
+    Version 2: rebuilds inventory with INTEGER model years and NOT NULL 0/1 booleans.
+    Rows are copied into inventory_v2 in id order, batch_size rows per transaction, so the
+    file is upgraded in place without one huge transaction. The swap and the recreated
+    indexes, triggers and FTS index are committed together with the new user_version.
+    """
+    columns = ", ".join(("id",) + CAR_COLUMNS + ("status",))
+    select = typed_select()
+    with write_transaction(conn):
+        # Left over from an upgrade that was interrupted; start over
+        conn.execute("DROP TABLE IF EXISTS inventory_v2")
+        conn.execute(INVENTORY_TABLE.format(name="inventory_v2"))
+    last_id = 0
+    copied = 0
+    while True:
+        with write_transaction(conn):
+            count = conn.execute(f'''
+                INSERT INTO inventory_v2 ({columns})
+                SELECT {select} FROM inventory WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).rowcount
+            if count:
+                last_id = conn.execute("SELECT MAX(id) FROM inventory_v2").fetchone()[0]
+        copied += count
+        if count < batch_size:
+            break
+    logging.debug(f"Copied {copied} cars into the typed inventory table")
+
+    with write_transaction(conn):
+        # Rows added since the last batch, e.g. by another instance of the app
+        conn.execute(f"INSERT INTO inventory_v2 ({columns}) SELECT {select} FROM inventory WHERE id > ?", (last_id,))
+        sequence = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'inventory'").fetchone()[0]
+        conn.execute("DROP VIEW IF EXISTS archived_cars")
+        conn.execute("DROP TABLE IF EXISTS inventory_fts")
+        conn.execute("DROP TABLE inventory")
+        conn.execute("ALTER TABLE inventory_v2 RENAME TO inventory")
+        # Keep ids of deleted cars from being handed out again
+        sequence = max(sequence, conn.execute(
+            "SELECT IFNULL(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'inventory'").fetchone()[0])
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'inventory'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('inventory', ?)", (sequence,))
+        create_tables(conn)
+        create_inventory_dependents(conn)
+        conn.execute("PRAGMA user_version = 2")
+
+
+def add_key_feature_rules(conn):
+    """Version 3: adds the key_feature_rules table with the default rules."""
+    with write_transaction(conn):
+        create_tables(conn)
+        seed_key_feature_rules(conn)
+        conn.execute("PRAGMA user_version = 3")
+
+
+def replace_change_triggers(conn):
+    """Version 4: car_changes triggers that also work under INSERT ... ON CONFLICT."""
+    with write_transaction(conn):
+        for name, *_ in CHANGE_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        create_change_triggers(conn)
+        conn.execute("PRAGMA user_version = 4")
+
+
+# (version, step) pairs; each step leaves the database at its version and sets user_version
+MIGRATIONS = [
+    (1, add_missing_columns),
+    (2, rebuild_typed_inventory),
+    (3, add_key_feature_rules),
+    (4, replace_change_triggers),
+]
+
+
+def create_schema(conn):
+    """Creates the current schema in an empty database."""
+    with write_transaction(conn):
+        if table_exists(conn, "inventory"):
+            # Another connection got there first
+            return
+        conn.execute(INVENTORY_TABLE.format(name="inventory"))
+        create_tables(conn)
+        seed_key_feature_rules(conn)
+        create_inventory_dependents(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def migrate(conn):
+    """
+    Creates or upgrades the database on conn, which must be in autocommit mode. When
+    user_version is already SCHEMA_VERSION nothing but that one PRAGMA runs.
+    Returns True if anything was changed.
+    """
+    version = user_version(conn)
+    if version == SCHEMA_VERSION:
+        return False
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this app supports ({SCHEMA_VERSION})")
+
+    if not table_exists(conn, "inventory"):
+        logging.debug("Creating database schema")
+        create_schema(conn)
+        return True
+
+    for target, step in MIGRATIONS:
+        # Re-read each time; another instance may have run the step meanwhile
+        if user_version(conn) < target:
+            logging.debug(f"Migrating database schema to version {target} ({step.__name__})")
+            step(conn)
+    return True
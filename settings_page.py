@@ -1,9 +1,13 @@
-import json
 import logging
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sv_ttk
 
+from key_features import format_diff
+
+# Cars listed in the key feature preview; the status line has the full count
+KEY_FEATURE_PREVIEW_CARS = 200
+
 class SettingsPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
@@ -15,15 +19,6 @@ class SettingsPage(tk.Frame):
         label.pack(pady=10)
         logging.debug("Settings label created")
 
-        # Load categories and features from JSON file
-        try:
-            with open('car_options.json', 'r') as f:
-                self.car_options = json.load(f)
-                logging.debug("Loaded car_options.json successfully")
-        except FileNotFoundError:
-            logging.error("car_options.json not found")
-            self.car_options = {}
-
         # Dropdown menu for feature categories
         categories_label = ttk.Label(self, text="Choose Category:")
         categories_label.pack(pady=5)
@@ -31,8 +26,9 @@ class SettingsPage(tk.Frame):
 
         self.category_var = tk.StringVar()
         self.category_dropdown = ttk.Combobox(self, textvariable=self.category_var)
-        self.category_dropdown['values'] = list(self.car_options.keys())
+        self.category_dropdown['values'] = list(controller.car_options.keys())
         self.category_dropdown.pack()
+        controller.options_catalog.subscribe(self.on_options_changed)
         logging.debug("Category dropdown created")
 
         # Dropdown menu for features
@@ -54,25 +50,90 @@ class SettingsPage(tk.Frame):
         button.pack(pady=10)
         logging.debug("Toggle theme button created")
 
+        self.create_key_feature_section()
+
+    def create_key_feature_section(self):
+        # Recomputes key_features for the whole inventory after the rule table changed
+        section = ttk.LabelFrame(self, text="Key Features")
+        section.pack(fill="both", expand=True, padx=10, pady=10)
+        buttons = ttk.Frame(section)
+        buttons.pack(fill="x", pady=5)
+        self.preview_button = ttk.Button(buttons, text="Preview Changes",
+                                         command=lambda: self.run_key_feature_job(dry_run=True))
+        self.preview_button.pack(side="left", padx=5)
+        self.apply_button = ttk.Button(buttons, text="Apply Changes", state="disabled",
+                                       command=lambda: self.run_key_feature_job(dry_run=False))
+        self.apply_button.pack(side="left", padx=5)
+        self.cancel_button = ttk.Button(buttons, text="Cancel", state="disabled", command=self.cancel_key_feature_job)
+        self.cancel_button.pack(side="left", padx=5)
+        self.key_feature_progress = ttk.Progressbar(section, mode="determinate")
+        self.key_feature_progress.pack(fill="x", padx=5)
+        self.key_feature_status = ttk.Label(section, text="")
+        self.key_feature_status.pack(anchor="w", padx=5)
+        self.key_feature_diff = tk.Text(section, height=12, state="disabled")
+        self.key_feature_diff.pack(fill="both", expand=True, padx=5, pady=5)
+        self.key_feature_job = None
+
+    def run_key_feature_job(self, dry_run):
+        self.preview_button.configure(state="disabled")
+        self.apply_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.key_feature_status.configure(text="Checking cars..." if dry_run else "Updating cars...")
+        self.key_feature_job = self.controller.regenerate_key_features(
+            dry_run,
+            on_done=lambda changes: self.on_key_features_done(changes, dry_run),
+            on_error=self.on_key_features_error,
+            on_progress=self.on_key_features_progress)
+
+    def cancel_key_feature_job(self):
+        if self.key_feature_job is not None:
+            self.key_feature_job.cancel()
+
+    def on_key_features_progress(self, done, total):
+        self.key_feature_progress.configure(maximum=max(total, 1), value=done)
+
+    def on_key_features_done(self, changes, dry_run):
+        cancelled = self.key_feature_job.cancelled
+        self.key_feature_job = None
+        self.preview_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        verb = "would change" if dry_run else "updated"
+        self.key_feature_status.configure(text=f"{len(changes)} cars {verb}" + (" (cancelled)" if cancelled else ""))
+        self.show_key_feature_diff(changes[:KEY_FEATURE_PREVIEW_CARS])
+        if dry_run and changes and not cancelled:
+            self.apply_button.configure(state="normal")
+
+    def on_key_features_error(self, error):
+        self.key_feature_job = None
+        self.preview_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        self.key_feature_status.configure(text="")
+        messagebox.showerror("Error", f"Failed to regenerate key features: {error}")
+
+    def show_key_feature_diff(self, changes):
+        self.key_feature_diff.configure(state="normal")
+        self.key_feature_diff.delete("1.0", tk.END)
+        self.key_feature_diff.insert("1.0", format_diff(changes))
+        self.key_feature_diff.configure(state="disabled")
+
+    def on_options_changed(self, catalog):
+        self.category_dropdown['values'] = list(catalog.categories.keys())
+
     def save_feature(self):
         selected_category = self.category_var.get()
         selected_feature = self.feature_var.get()
         logging.debug(f"Saving feature: {selected_feature} to category: {selected_category}")
 
-        if selected_category in self.car_options:
-            self.car_options[selected_category].append(selected_feature)
-            logging.debug(f"Feature '{selected_feature}' added to '{selected_category}'")
-        else:
-            self.car_options[selected_category] = [selected_feature]
-            logging.debug(f"Created new category '{selected_category}' and added feature '{selected_feature}'")
-
-        # Save updated car features back to JSON file
+        # The catalog writes car_options.json atomically and notifies the other pages
         try:
-            with open('car_options.json', 'w') as f:
-                json.dump(self.car_options, f, indent=4)
-                logging.debug("Saved updated car_options.json successfully")
-        except IOError as e:
+            if self.controller.options_catalog.add_option(selected_category, selected_feature):
+                logging.debug(f"Feature '{selected_feature}' added to '{selected_category}'")
+            else:
+                logging.debug(f"Feature '{selected_feature}' is already in '{selected_category}'")
+        except OSError as e:
             logging.error(f"Failed to save car_options.json: {e}")
+            messagebox.showerror("Error", f"Failed to save the feature: {e}")
+            return
 
         # Clear feature entry after saving
         self.feature_input.delete(0, tk.END)
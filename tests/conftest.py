@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_db import InventoryDatabase  # noqa: E402
+from vin_check import CHECK_DIGIT_INDEX, check_digit  # noqa: E402
+
+CATALOG = {
+    "Comfort": ["LEATHER", "MOONROOF", "HEATED SEATS"],
+    "Safety": ["REVERSE CAMERA", "BLIND SPOT MONITOR"],
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh inventory database in tmp_path with CATALOG synced into option_catalog."""
+    database = InventoryDatabase(str(tmp_path / "inventory.db"), str(tmp_path / "no_archive.db"))
+    database.sync_option_catalog(CATALOG)
+    yield database
+    database.close()
+
+
+def add_car(db, vin, options=" ", key_features=" ", make="FORD", model="F-150", model_year=2020, series="XLT"):
+    """Inserts one car and returns its id."""
+    assert db.insert_cars([(vin, make, model, model_year, series, options, key_features, vin[-4:])]) == []
+    return db.read().execute("SELECT id FROM inventory WHERE vin = ?", (vin,)).fetchone()[0]
+
+
+def with_check_digit(vin):
+    """vin with its check digit corrected, for made-up VINs that must pass validation."""
+    return vin[:CHECK_DIGIT_INDEX] + check_digit(vin) + vin[CHECK_DIGIT_INDEX + 1:]
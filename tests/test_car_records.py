@@ -0,0 +1,45 @@
+import sys
+
+import pytest
+
+from car_records import LIST_COLUMNS, Car, CarSummary, record_factory, record_type_for
+from conftest import add_car
+
+
+def test_records_compare_by_value(db):
+    add_car(db, "1FTFW1E50KFA00001")
+    add_car(db, "1FTFW1E50KFA00002")
+    first, second = db.query_cars()[0]
+    again = db.query_cars()[0][0]
+    assert type(first) is CarSummary
+    assert first == again and not first != again
+    assert first != second
+
+
+def test_records_of_different_types_are_not_equal():
+    assert CarSummary(id=1, vin="1FTFW1E50KFA00001") != Car(id=1, vin="1FTFW1E50KFA00001")
+
+
+def test_records_are_not_hashable():
+    with pytest.raises(TypeError):
+        hash(CarSummary(id=1))
+
+
+def test_record_type_follows_the_columns(db):
+    add_car(db, "1FTFW1E50KFA00001", options="LEATHER")
+    assert record_type_for(LIST_COLUMNS) is CarSummary
+    assert record_type_for(("id", "vin", "options")) is Car
+    car = db.query_cars(columns=("id", "vin", "options"))[0][0]
+    assert type(car) is Car and car.options == "LEATHER"
+
+
+def test_record_factory_interns_repeated_values(db):
+    add_car(db, "1FTFW1E50KFA00001")
+    add_car(db, "1FTFW1E50KFA00002")
+    cursor = db.read().cursor()
+    cursor.row_factory = record_factory(Car)
+    first, second = cursor.execute("SELECT id, make, vin FROM inventory ORDER BY id").fetchall()
+    assert first.make is second.make is sys.intern("FORD")
+    assert (first.id, first.vin) == (1, "1FTFW1E50KFA00001")
+    # Columns the query didn't select stay unset
+    assert not hasattr(first, "model")
@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from conftest import add_car
+from inventory_db import ACTIVE, ARCHIVED
+from option_parser import OptionParser
+
+
+def car_row(db, car_id, *columns):
+    return db.read().execute(f"SELECT {', '.join(columns)} FROM inventory WHERE id = ?", (car_id,)).fetchone()
+
+
+def test_save_car_details_writes_text_and_options_together(db):
+    car_id = add_car(db, "1FTFW1E50KFA00001")
+    db.save_car_details(car_id, "1FTFW1E50KFA00001", {"series": "LARIAT", "options": "LEATHER"},
+                        ["LEATHER"], ["LEATHER"])
+    assert car_row(db, car_id, "series", "options") == ("LARIAT", "LEATHER")
+    assert db.fetch_car_options(car_id) == {"LEATHER": True}
+
+
+def test_save_car_details_keeps_key_features_whose_option_is_unchecked(db):
+    car_id = add_car(db, "1FTFW1E50KFA00001")
+    db.save_car_details(car_id, "1FTFW1E50KFA00001", {"key_features": "LEATHER, MOONROOF"},
+                        ["LEATHER"], ["LEATHER", "MOONROOF"])
+    assert db.fetch_car_options(car_id) == {"LEATHER": True, "MOONROOF": True}
+
+
+def test_save_car_details_rolls_back_both_writes(db):
+    car_id = add_car(db, "1FTFW1E50KFA00001")
+    db.save_car_details(car_id, "1FTFW1E50KFA00001", {"series": "XLT"}, ["LEATHER"], [])
+    with pytest.raises(sqlite3.OperationalError):
+        db.save_car_details(car_id, "1FTFW1E50KFA00001", {"series": "LARIAT", "no_such_column": 1},
+                            ["MOONROOF"], [])
+    assert car_row(db, car_id, "series") == ("XLT",)
+    assert db.fetch_car_options(car_id) == {"LEATHER": False}
+
+
+def test_update_car_options_rebuilds_option_rows(db):
+    parser = OptionParser(["LEATHER", "MOONROOF", "REVERSE CAMERA"])
+    car_id = add_car(db, "1FTFW1E50KFA00001", key_features="MOONROOF")
+    db.update_car_options("1FTFW1E50KFA00001", "LEATHER", parser)
+    assert db.fetch_car_options(car_id) == {"LEATHER": False}
+    db.update_car_options("1FTFW1E50KFA00001", "MOONROOF, REVERSE CAMERA", parser)
+    assert car_row(db, car_id, "options") == ("MOONROOF, REVERSE CAMERA",)
+    assert db.fetch_car_options(car_id) == {"MOONROOF": True, "REVERSE CAMERA": False}
+
+
+def test_update_cars_rebuilds_option_rows_for_cars_whose_options_change(db):
+    parser = OptionParser(["LEATHER", "MOONROOF", "HEATED SEATS"])
+    first = add_car(db, "1FTFW1E50KFA00001")
+    second = add_car(db, "1FTFW1E50KFA00002")
+    db.update_cars([("1FTFW1E50KFA00001", {"options": "LEATHER"})], parser)
+    db.update_cars([("1FTFW1E50KFA00002", {"options": "MOONROOF, HEATED SEATS"})], parser)
+    updated = db.update_cars(((vin, changes) for vin, changes in (
+        ("1FTFW1E50KFA00001", {"options": "HEATED SEATS"}),
+        ("1FTFW1E50KFA00002", {"series": "LARIAT"}),
+    )), parser)
+    assert updated == 2
+    assert db.fetch_car_options(first) == {"HEATED SEATS": False}
+    assert db.fetch_car_options(second) == {"MOONROOF": False, "HEATED SEATS": False}
+
+
+def new_car(vin):
+    return (vin, "FORD", "F-150", 2020, "XLT", " ", " ", vin[-4:])
+
+
+def test_insert_cars_skips_duplicates_in_one_transaction(db):
+    add_car(db, "1FTFW1E50KFA00001")
+    add_car(db, "1FTFW1E50KFA00002")
+    db.set_status("1FTFW1E50KFA00002", ARCHIVED)
+    failures = db.insert_cars(new_car(vin) for vin in (
+        "1FTFW1E50KFA00001", "1FTFW1E50KFA00002", "1FTFW1E50KFA00003", "1FTFW1E50KFA00003"))
+    assert failures == [
+        ("1FTFW1E50KFA00001", "Car with this VIN already exists in the inventory."),
+        ("1FTFW1E50KFA00002", "Car with this VIN is in the archive. De-archive it instead."),
+        ("1FTFW1E50KFA00003", "Car with this VIN already exists in the inventory."),
+    ]
+    assert db.read().execute("SELECT COUNT(*) FROM inventory").fetchone() == (3,)
+
+
+def test_update_cars_groups_updates_and_counts_rows(db):
+    for i in range(1, 4):
+        add_car(db, f"1FTFW1E50KFA0000{i}")
+    updated = db.update_cars([
+        ("1FTFW1E50KFA00001", {"series": "LARIAT"}),
+        ("1FTFW1E50KFA00002", {"series": "LARIAT", "model_year": 2021}),
+        ("1FTFW1E50KFA00003", {"series": "KING RANCH"}),
+        ("1FTFW1E50KFA00009", {"series": "LARIAT"}),
+    ])
+    assert updated == 3
+    assert db.read().execute("SELECT vin, series, model_year FROM inventory ORDER BY vin").fetchall() == [
+        ("1FTFW1E50KFA00001", "LARIAT", 2020),
+        ("1FTFW1E50KFA00002", "LARIAT", 2021),
+        ("1FTFW1E50KFA00003", "KING RANCH", 2020),
+    ]
+
+
+def test_update_cars_rejects_unknown_columns_before_writing(db):
+    add_car(db, "1FTFW1E50KFA00001")
+    with pytest.raises(ValueError):
+        db.update_cars([("1FTFW1E50KFA00001", {"series": "LARIAT"}), ("1FTFW1E50KFA00001", {"colour": "RED"})])
+    assert db.read().execute("SELECT series FROM inventory").fetchone() == ("XLT",)
+
+
+def test_set_status_many_moves_only_cars_not_already_there(db):
+    for i in range(1, 4):
+        add_car(db, f"1FTFW1E50KFA0000{i}")
+    db.set_status("1FTFW1E50KFA00001", ARCHIVED)
+    assert db.set_status_many(["1FTFW1E50KFA00001", "1FTFW1E50KFA00002", "1FTFW1E50KFA00009"], ARCHIVED) == 1
+    statuses = dict(db.read().execute("SELECT vin, status FROM inventory"))
+    assert statuses == {"1FTFW1E50KFA00001": ARCHIVED, "1FTFW1E50KFA00002": ARCHIVED, "1FTFW1E50KFA00003": ACTIVE}
+
+
+def test_databases_open_in_wal_mode(db):
+    assert db.read().execute("PRAGMA journal_mode").fetchone() == ("wal",)
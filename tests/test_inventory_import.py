@@ -0,0 +1,89 @@
+import json
+
+from conftest import add_car, with_check_digit
+from inventory_db import ARCHIVED
+from inventory_import import InventoryImport, clean_row
+from option_parser import OptionParser
+
+FORD = with_check_digit("1FTFW1E50KFA00001")
+OTHER_FORD = with_check_digit("1FTFW1E50KFA00010")
+HONDA = "1HGCM82633A004352"
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_clean_row_maps_headings_and_values():
+    car = clean_row({"VIN": f" {FORD.lower()} ", "Year": "2019", "Make": "ford", "Trim": "xlt",
+                     "Stock #": "A1", "Alloy Wheels": "yes", "Status": "Archived", "Colour": "red", "Series": ""})
+    assert car == {"vin": FORD, "model_year": 2019, "make": "FORD", "series": "XLT",
+                   "stock_number": "A1", "alloy_wheels": 1, "status": ARCHIVED}
+
+
+def test_import_inserts_updates_and_reports_bad_rows(db, tmp_path):
+    add_car(db, HONDA, series="EX")
+    path = write_csv(tmp_path / "cars.csv", "\n".join([
+        "VIN,Make,Model,Year,Series",
+        f"{FORD},ford,f-150,2019,",
+        f"{HONDA},,,,LX",
+        f"{FORD[:-1]}2,FORD,F-150,2019,",
+        f"{OTHER_FORD},FORD,F-150,twenty,",
+        "ABC,FORD,F-150,2019,",
+    ]) + "\n")
+    report = InventoryImport(db, path, batch_size=2).run()
+
+    assert (report.inserted, report.updated) == (1, 1)
+    errors = {line: (vin, reason) for line, vin, reason in report.errors}
+    assert errors.keys() == {4, 5, 6}
+    assert "check digit" in errors[4][1]
+    assert errors[5][1] == "Invalid model year: twenty"
+    assert errors[6] == ("ABC", "VIN must be between 11 and 17 characters.")
+    rows = dict((vin, rest) for vin, *rest in db.read().execute(
+        "SELECT vin, make, model, model_year, series, stock_number FROM inventory"))
+    # Blank cells leave an existing car's values alone; new cars get the default stock number
+    assert rows == {FORD: ["FORD", "F-150", 2019, None, "0001"], HONDA: ["FORD", "F-150", 2020, "LX", "4352"]}
+
+
+def test_repeated_vin_in_a_batch_merges_into_one_car(db, tmp_path):
+    path = tmp_path / "cars.jsonl"
+    path.write_text("\n".join(json.dumps(row) for row in [
+        {"vin": FORD, "make": "FORD"},
+        {"vin": FORD, "model": "F-150"},
+        [FORD],
+    ]) + "\n", encoding="utf-8")
+    report = InventoryImport(db, str(path)).run()
+
+    assert (report.inserted, report.updated) == (1, 0)
+    assert report.errors == [(3, "", "Not a JSON object")]
+    assert db.read().execute("SELECT make, model FROM inventory").fetchone() == ("FORD", "F-150")
+
+
+def test_import_rebuilds_option_rows_with_a_parser(db, tmp_path):
+    path = write_csv(tmp_path / "cars.csv", f'vin,options,key_features\n{FORD},"LEATHER, MOONROOF",MOONROOF\n')
+    InventoryImport(db, path, parser=OptionParser(["LEATHER", "MOONROOF"])).run()
+    car_id = db.read().execute("SELECT id FROM inventory").fetchone()[0]
+    assert db.fetch_car_options(car_id) == {"LEATHER": False, "MOONROOF": True}
+
+
+def test_decode_fills_in_missing_make_and_model(db, tmp_path):
+    decoded = []
+
+    def decode(vins):
+        decoded.extend(vins)
+        return {FORD: {"Make": "Ford", "Model": "F-150", "ModelYear": "2019", "Series": "XLT"},
+                HONDA: {"ErrorText": "1 - Check Digit (9th position) does not calculate properly"}}
+    path = write_csv(tmp_path / "cars.csv", f"vin,make,model\n{FORD},,\n{HONDA},,\n")
+    report = InventoryImport(db, path, decode=decode).run()
+
+    assert decoded == [FORD, HONDA]
+    assert report.inserted == 1
+    assert report.errors == [(3, HONDA, "1 - Check Digit (9th position) does not calculate properly")]
+    assert db.read().execute("SELECT vin, make, model, series FROM inventory").fetchall() == [
+        (FORD, "FORD", "F-150", "XLT")]
+
+
+def test_upsert_cars_accepts_a_generator(db):
+    inserted, updated = db.upsert_cars(car for car in [{"vin": FORD, "options": "LEATHER"}])
+    assert (inserted, updated) == (1, 0)
@@ -0,0 +1,50 @@
+from conftest import add_car
+from key_features import KeyFeatureJob, KeyFeatureRules
+from option_parser import OptionParser
+
+VIN = "1FTFW1E50KFA00001"
+
+
+def save(db, key_features, options, flagged, **details):
+    car_id = add_car(db, VIN)
+    db.save_car_details(car_id, VIN, dict(details, key_features=key_features), options, flagged)
+    return car_id
+
+
+def key_features(db):
+    return db.read().execute("SELECT key_features FROM inventory WHERE vin = ?", (VIN,)).fetchone()[0]
+
+
+def test_free_text_is_what_no_option_rule_or_wheel_explains():
+    rules = KeyFeatureRules([("MOONROOF", "SUNROOF")])
+    parser = OptionParser(["LEATHER", "MOONROOF"])
+    text = 'LEATHER, SUNROOF, ONE OWNER, 18" ALLOY WHEELS, Clean Carfax'
+    assert rules.free_text(text, parser, '18" ALLOY WHEELS') == ["ONE OWNER", "Clean Carfax"]
+
+
+def test_compose_keeps_free_text_before_the_wheels():
+    rules = KeyFeatureRules([("MOONROOF", "SUNROOF")])
+    assert rules.compose(["MOONROOF", "LEATHER"], '18" ALLOY WHEELS', ["ONE OWNER", "LEATHER"]) == \
+        'LEATHER, SUNROOF, ONE OWNER, 18" ALLOY WHEELS'
+
+
+def test_job_applies_rules_and_keeps_hand_typed_key_features(db):
+    save(db, "LEATHER, MOONROOF, ONE OWNER", ["LEATHER", "MOONROOF"], ["LEATHER", "MOONROOF"])
+    db.set_key_feature_rules([("MOONROOF", "SUNROOF")])
+
+    changes = KeyFeatureJob(db).run(dry_run=True)
+    assert [(old, new) for _, _, old, new in changes] == [
+        ("LEATHER, MOONROOF, ONE OWNER", "LEATHER, SUNROOF, ONE OWNER")]
+    assert key_features(db) == "LEATHER, MOONROOF, ONE OWNER"
+
+    KeyFeatureJob(db).run()
+    assert key_features(db) == "LEATHER, SUNROOF, ONE OWNER"
+    # Running again changes nothing
+    assert KeyFeatureJob(db).run() == []
+
+
+def test_job_drops_unflagged_options_and_stale_wheels_but_not_free_text(db):
+    save(db, '17" WHEELS, LEATHER, HEATED SEATS, ONE OWNER', ["LEATHER", "HEATED SEATS"], ["LEATHER"],
+         wheel_size='18"', alloy_wheels=True, is_wheel_key_feature=True)
+    KeyFeatureJob(db).run()
+    assert key_features(db) == 'LEATHER, ONE OWNER, 18" ALLOY WHEELS'
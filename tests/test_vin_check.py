@@ -0,0 +1,30 @@
+from vin_check import (INVALID_CHARACTERS, INVALID_LENGTH, NOT_ALPHANUMERIC, check_digit, decode_model_year, region,
+                       transposition_suggestions, validate_vins, wmi)
+
+
+def test_check_digit_of_known_vins():
+    assert check_digit("1M8GDM9AXKP042788") == "X"
+    assert check_digit("1HGCM82633A004352") == "3"
+    assert check_digit("11111111111111111") == "1"
+
+
+def test_validate_vins_reports_every_vin_in_order():
+    errors = validate_vins(["1M8GDM9AXKP042788", "1hgcm82633a004352", "ABC", "1HGCM82633A0O4352",
+                            "1HGCM8263-A004352", "1HGCM82633A00435", "1HGCM82633A004353"])
+    assert errors[:6] == [None, None, INVALID_LENGTH, INVALID_CHARACTERS, NOT_ALPHANUMERIC, None]
+    assert errors[6].startswith("VIN check digit is 3 but should be 5")
+
+
+def test_swapped_characters_are_suggested():
+    typo = "1M8GDM9AXKP042878"
+    assert "1M8GDM9AXKP042788" in transposition_suggestions(typo)
+    assert "Did you mean" in validate_vins([typo])[0]
+
+
+def test_model_year_wmi_and_region():
+    assert decode_model_year("1HGCM82633A004352") == 2003
+    assert decode_model_year("1FTFW1E50KFA00001") == 2019
+    assert decode_model_year("1FTFW1E5") is None
+    assert wmi("1HGCM82633A004352") == "1HG"
+    assert wmi("1G9A00000BXABC001") == "1G9ABC"
+    assert region("JHMCM82633A004352") == "Asia"
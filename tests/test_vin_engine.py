@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+
+from vin_engine import LocalVinDecoder, import_snapshot
+
+
+@pytest.fixture
+def decoder(tmp_path):
+    with open(tmp_path / "wmi.csv", "w", newline="") as f:
+        csv.writer(f).writerows([("wmi", "make"), ("1FT", "FORD"), ("1G9ABC", "TINY COACH")])
+    with open(tmp_path / "patterns.csv", "w", newline="") as f:
+        csv.writer(f).writerows([
+            ("wmi", "pattern", "year_from", "year_to", "model", "series"),
+            ("1FT", "FW1", 2015, 2020, "F-150", ""),
+            ("1FT", "FW1E5", 2015, 2020, "F-150", "XLT"),
+            ("1FT", "FW1", 2021, 2039, "F-150 HYBRID", ""),
+            ("1G9ABC", "A", "", "", "SHUTTLE", ""),
+        ])
+    path = str(tmp_path / "snapshot.db")
+    import_snapshot(str(tmp_path), path)
+    local = LocalVinDecoder(path)
+    yield local
+    local.close()
+
+
+def test_most_specific_pattern_for_the_model_year_wins(decoder):
+    assert decoder.decode("1FTFW1E50KFA00001")["Series"] == "XLT"
+    assert decoder.decode("1FTFW1E70KFA00001")["Series"] == ""
+    assert decoder.decode("1FTFW1E50NFA00001")["Model"] == "F-150 HYBRID"
+
+
+def test_six_character_wmi_of_small_manufacturers(decoder):
+    result = decoder.decode("1G9A00000BXABC001")
+    assert (result["Make"], result["Model"]) == ("TINY COACH", "SHUTTLE")
+
+
+def test_unknown_vins_are_not_resolved(decoder):
+    assert decoder.decode("2HGFW1E50KFA00001") is None
+    assert decoder.decode("1FTXX1E50KFA00001") is None
+    assert decoder.decode_many(["1FTFW1E50KFA00001", "2HGFW1E50KFA00001"]).keys() == {"1FTFW1E50KFA00001"}
+
+
+def test_wmis_are_read_once(decoder):
+    decoder.decode("1FTFW1E50KFA00001")
+    decoder.conn.close()
+    # Served from the memoized WMI without touching the closed connection
+    assert decoder.decode("1FTFW1E70KFA00002")["Make"] == "FORD"
@@ -0,0 +1,105 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from conftest import add_car, with_check_digit
+from vin_decoder import VinDecodeService, intake_vins
+
+FORD = with_check_digit("1FTFW1E50KFA00001")
+HONDA = with_check_digit("1HGCM82630A004352")
+UNKNOWN = with_check_digit("5XXGT4L30LG000001")
+IN_STOCK = with_check_digit("1FTFW1E50KFA00002")
+MISTYPED = FORD[:-2] + FORD[-1] + FORD[-2]
+
+
+class VpicStandIn(BaseHTTPRequestHandler):
+    """Answers DecodeVINValuesBatch like vPIC: makes for known WMIs, an error for the rest."""
+
+    makes = {"1FT": ("FORD", "F-150"), "1HG": ("HONDA", "ACCORD")}
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        vins = form["data"][0].split(";")
+        self.server.batches.append(vins)
+        if self.server.fail:
+            self.send_error(503)
+            return
+        results = []
+        for vin in vins:
+            make, model = self.makes.get(vin[:3], ("", ""))
+            error = "" if make else "11 - Incorrect Model Year, decoded data may not be reliable."
+            results.append({"VIN": vin, "Make": make, "Model": model, "ModelYear": "2019", "Series": "",
+                            "ErrorText": error})
+        body = json.dumps({"Results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def vpic():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), VpicStandIn)
+    server.batches = []
+    server.fail = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(vpic):
+    decode_service = VinDecodeService(url=f"http://127.0.0.1:{vpic.server_port}/")
+    yield decode_service
+    decode_service.shutdown()
+
+
+@pytest.fixture
+def transactions(db):
+    """db.insert_cars wrapped to record the VINs of every call, each of which is one transaction."""
+    calls = []
+
+    def insert_cars(cars):
+        calls.append([car[0] for car in cars])
+        return db.insert_cars(cars)
+    return insert_cars, calls
+
+
+def test_mixed_batch_reports_every_vin(db, vpic, service, transactions):
+    add_car(db, IN_STOCK)
+    insert_cars, calls = transactions
+    report = intake_vins([FORD, MISTYPED, UNKNOWN, FORD, IN_STOCK, HONDA], service.decode, insert_cars, batch_size=2)
+
+    assert report.added == [FORD, HONDA]
+    failures = dict(report.failures)
+    assert failures.keys() == {MISTYPED, UNKNOWN, IN_STOCK}
+    assert "check digit" in failures[MISTYPED] and FORD in failures[MISTYPED]
+    assert failures[UNKNOWN].startswith("11 - Incorrect Model Year")
+    assert "already" in failures[IN_STOCK]
+
+    # The mistyped VIN never reached vPIC and the repeated one was sent once, two VINs per request
+    assert vpic.batches == [[FORD, UNKNOWN], [IN_STOCK, HONDA]]
+    # One insert transaction per batch, with only the cars vPIC could decode
+    assert calls == [[FORD], [IN_STOCK, HONDA]]
+    makes = dict(db.read().execute("SELECT vin, make FROM inventory"))
+    assert makes == {FORD: "FORD", IN_STOCK: "FORD", HONDA: "HONDA"}
+
+
+def test_failed_request_fails_its_batch(db, vpic, service, transactions):
+    vpic.fail = True
+    insert_cars, calls = transactions
+    report = intake_vins([FORD, HONDA], service.decode, insert_cars)
+
+    assert report.added == []
+    assert [vin for vin, _ in report.failures] == [FORD, HONDA]
+    assert all(reason.startswith("Decode request failed") for _, reason in report.failures)
+    assert calls == []
@@ -0,0 +1,157 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from db_pool import configure_connection
+
+# Kept next to car_inventory.db
+CACHE_DB = 'vin_cache.db'
+
+# Decoded results are refreshed from vPIC after this many seconds
+CACHE_TTL = 90 * 24 * 60 * 60
+
+# Upper bound on rows kept in each cache table; least recently used rows are evicted first
+MAX_ENTRIES = 50000
+
+# Fields that are shared by every VIN with the same WMI, VDS and model year
+PATTERN_FIELDS = ("Make", "Model", "ModelYear", "Series")
+
+
+def pattern_key(vin):
+    """
+    Key shared by sibling vehicles: the WMI (positions 1-3), the VDS (4-8) and the
+    model year (10). Small manufacturers have a 9 in position 3 and continue their
+    WMI in positions 12-14. Returns None for pre-1981 VINs that aren't 17 characters.
+    """
+    if len(vin) != 17:
+        return None
+    key = vin[:8] + vin[9]
+    if vin[2] == '9':
+        key += vin[11:14]
+    return key
+
+
+class VinDecodeCache:
+    """
+    Persistent cache of vPIC decode results keyed by full VIN, with a secondary
+    cache keyed by pattern_key() so sibling vehicles decode without a request.
+    Safe to use from the decode worker threads.
+    """
+
+    def __init__(self, path=CACHE_DB, ttl=CACHE_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.pattern_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        configure_connection(self.conn)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS vin_cache (
+                vin TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pattern_cache (
+                pattern TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_vin_cache_used_at ON vin_cache (used_at);
+            CREATE INDEX IF NOT EXISTS idx_pattern_cache_used_at ON pattern_cache (used_at);
+        ''')
+        self.conn.commit()
+        self._sizes = {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                       for table in ("vin_cache", "pattern_cache")}
+        logging.debug(f"VIN decode cache opened with {self._sizes['vin_cache']} VINs")
+
+    def get(self, vin, allow_stale=False):
+        """
+        Returns the cached vPIC result for vin, or None. Expired entries are only
+        returned when allow_stale is set, e.g. while the network is unavailable.
+        """
+        now = time.time()
+        min_fetched_at = 0 if allow_stale else now - self.ttl
+        with self._lock:
+            result = self._lookup("vin_cache", "vin", vin, now, min_fetched_at)
+            if result is None:
+                key = pattern_key(vin)
+                if key is not None:
+                    result = self._lookup("pattern_cache", "pattern", key, now, min_fetched_at)
+                    if result is not None:
+                        result["VIN"] = vin
+                        self.pattern_hits += 1
+            elif allow_stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            if result is None and not allow_stale:
+                self.misses += 1
+        return result
+
+    def _lookup(self, table, column, key, now, min_fetched_at):
+        row = self.conn.execute(f"SELECT result FROM {table} WHERE {column} = ? AND fetched_at >= ?",
+                                (key, min_fetched_at)).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute(f"UPDATE {table} SET used_at = ? WHERE {column} = ?", (now, key))
+        return json.loads(row[0])
+
+    def put_many(self, results):
+        """Stores a {vin: vPIC result} mapping from a successful decode."""
+        now = time.time()
+        vin_rows = []
+        pattern_rows = []
+        for vin, result in results.items():
+            if not result.get("Make"):
+                continue
+            vin_rows.append((vin, json.dumps(result), now, now))
+            key = pattern_key(vin)
+            # Only clean decodes are trusted for sibling vehicles
+            if key is not None and str(result.get("ErrorCode", "0")).startswith("0"):
+                shared = {field: result.get(field, "") for field in PATTERN_FIELDS}
+                pattern_rows.append((key, json.dumps(shared), now, now))
+
+        with self._lock:
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO vin_cache VALUES (?, ?, ?, ?)", vin_rows)
+                self.conn.executemany("INSERT OR REPLACE INTO pattern_cache VALUES (?, ?, ?, ?)", pattern_rows)
+            self._sizes["vin_cache"] += len(vin_rows)
+            self._sizes["pattern_cache"] += len(pattern_rows)
+            for table in ("vin_cache", "pattern_cache"):
+                if self._sizes[table] > self.max_entries:
+                    self._evict(table)
+
+    def _evict(self, table):
+        # Trim to 90% of the limit so eviction doesn't run on every insert
+        keep = int(self.max_entries * 0.9)
+        with self.conn:
+            self.conn.execute(f'''
+                DELETE FROM {table} WHERE rowid NOT IN (
+                    SELECT rowid FROM {table} ORDER BY used_at DESC LIMIT ?
+                )
+            ''', (keep,))
+        self._sizes[table] = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        logging.debug(f"Evicted least recently used entries from {table}, {self._sizes[table]} left")
+
+    def stats(self):
+        lookups = self.hits + self.pattern_hits + self.misses
+        hit_rate = (self.hits + self.pattern_hits) / lookups if lookups else 0.0
+        return {
+            "hits": self.hits,
+            "pattern_hits": self.pattern_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": hit_rate,
+        }
+
+    def close(self):
+        logging.debug(f"VIN decode cache stats: {self.stats()}")
+        self.conn.close()
@@ -0,0 +1,164 @@
+import argparse
+import time
+from operator import getitem
+
+# Modern VINs are 17 characters; vehicles built before 1981 have shorter ones without a check digit
+VIN_LENGTH = 17
+MIN_VIN_LENGTH = 11
+
+# ISO 3779 / 49 CFR 565 letter values for the check digit; I, O and Q are never used
+TRANSLITERATION = {
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+TRANSLITERATION.update({str(digit): digit for digit in range(10)})
+
+# Weight of each position in the check digit sum; position 9 holds the check digit itself
+WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+CHECK_DIGIT_INDEX = 8
+
+# Position 10 model year codes, in order starting at 1980 (and again at 2010)
+MODEL_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+MODEL_YEAR_BY_CODE = {code: 1980 + i for i, code in enumerate(MODEL_YEAR_CODES)}
+
+# Region of manufacture by the first character of the WMI
+REGIONS = {}
+for _characters, _region in (("ABCDEFGH", "Africa"), ("JKLMNPR", "Asia"), ("STUVWXYZ", "Europe"),
+                             ("12345", "North America"), ("67", "Oceania"), ("890", "South America")):
+    REGIONS.update(dict.fromkeys(_characters, _region))
+
+ALLOWED = "".join(TRANSLITERATION).encode("ascii")
+
+# Per position, a 256-entry table of weight * character value mod 11, so a VIN's check sum
+# is one lookup per byte; bytes that can't appear in a VIN map to 0 and are caught separately
+_WEIGHTED = tuple(
+    tuple((TRANSLITERATION.get(chr(byte), 0) * weight) % 11 for byte in range(256))
+    for weight in WEIGHTS
+)
+
+INVALID_CHARACTERS = "VIN cannot contain the characters I, O, or Q."
+INVALID_LENGTH = "VIN must be between 11 and 17 characters."
+NOT_ALPHANUMERIC = "VIN can only contain letters and digits."
+
+
+def _check_sum(data):
+    """Check digit value (0-10) of a 17-byte VIN."""
+    return sum(map(getitem, _WEIGHTED, data)) % 11
+
+
+def check_digit(vin):
+    """The check digit position 9 should hold: "0"-"9" or "X"."""
+    total = _check_sum(vin.encode("ascii"))
+    return "X" if total == 10 else str(total)
+
+
+def has_valid_check_digit(vin):
+    return len(vin) == VIN_LENGTH and vin[CHECK_DIGIT_INDEX] == check_digit(vin)
+
+
+def decode_model_year(vin):
+    """
+    Decodes the model year from position 10. A letter in position 7 means the
+    2010-2039 cycle, a digit the 1980-2009 cycle. Returns None if it can't be decoded.
+    """
+    if len(vin) != VIN_LENGTH:
+        return None
+    year = MODEL_YEAR_BY_CODE.get(vin[9])
+    if year is None:
+        return None
+    if vin[6].isalpha():
+        year += 30
+    return year
+
+
+def wmi(vin):
+    """
+    World manufacturer identifier. Small manufacturers have a 9 in position 3 and continue
+    their WMI in positions 12-14, which makes it six characters.
+    """
+    if len(vin) == VIN_LENGTH and vin[2] == "9":
+        return vin[:3] + vin[11:14]
+    return vin[:3]
+
+
+def region(vin):
+    return REGIONS.get(vin[:1])
+
+
+def transposition_suggestions(vin):
+    """
+    VINs that differ from vin by two swapped neighbouring characters and do have a valid
+    check digit: the likely intended VINs when the check digit doesn't match.
+    """
+    suggestions = []
+    for i in range(VIN_LENGTH - 1):
+        if vin[i] == vin[i + 1]:
+            continue
+        candidate = vin[:i] + vin[i + 1] + vin[i] + vin[i + 2:]
+        if has_valid_check_digit(candidate) and candidate not in suggestions:
+            suggestions.append(candidate)
+    return suggestions
+
+
+def check_digit_error(vin, expected):
+    suggestions = transposition_suggestions(vin)
+    message = f"VIN check digit is {vin[CHECK_DIGIT_INDEX]} but should be {expected}; the VIN has a typo."
+    if suggestions:
+        message += f" Did you mean {' or '.join(suggestions)}?"
+    return message
+
+
+def validate_vins(vins):
+    """
+    Returns an error message or None for every VIN, in order. Each VIN costs two byte-table
+    translations and, at full length, one check digit sum over _WEIGHTED, so large
+    lists are checked without a per-character Python loop.
+    """
+    errors = []
+    append = errors.append
+    for vin in vins:
+        vin = vin.upper()
+        data = vin.encode("ascii", "replace")
+        length = len(data)
+        if data.translate(None, ALLOWED):
+            # Something other than an allowed letter or digit: I, O or Q, or punctuation
+            if "I" in vin or "O" in vin or "Q" in vin:
+                append(INVALID_CHARACTERS)
+            elif length > VIN_LENGTH or length < MIN_VIN_LENGTH:
+                append(INVALID_LENGTH)
+            else:
+                append(NOT_ALPHANUMERIC)
+        elif length != VIN_LENGTH:
+            append(None if length >= MIN_VIN_LENGTH else INVALID_LENGTH)
+        else:
+            total = _check_sum(data)
+            expected = "X" if total == 10 else chr(48 + total)
+            append(None if vin[CHECK_DIGIT_INDEX] == expected else check_digit_error(vin, expected))
+    return errors
+
+
+def _benchmark_vins(count):
+    vins = []
+    for i in range(count):
+        vin = f"1FTFW1E{i % 10}0K{i:06d}"
+        vins.append(vin[:CHECK_DIGIT_INDEX] + check_digit(vin) + vin[CHECK_DIGIT_INDEX + 1:])
+    return vins
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check VINs: check digit, model year and manufacturer")
+    parser.add_argument("vins", nargs="*")
+    parser.add_argument("--benchmark", type=int, metavar="COUNT", help="time validate_vins() on COUNT VINs")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        sample = _benchmark_vins(args.benchmark)
+        started = time.perf_counter()
+        validate_vins(sample)
+        elapsed = time.perf_counter() - started
+        print(f"{len(sample)} VINs in {elapsed:.3f} s ({len(sample) / elapsed:,.0f} VINs/s)")
+    for vin, error in zip(args.vins, validate_vins([vin.strip().upper() for vin in args.vins])):
+        vin = vin.strip().upper()
+        print(f"{vin}: {error or 'valid'}, WMI {wmi(vin)} ({region(vin) or 'unknown region'}), "
+              f"model year {decode_model_year(vin) or 'unknown'}")
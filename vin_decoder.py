@@ -0,0 +1,265 @@
+import argparse
+import csv
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from inventory_db import INVENTORY_DB, InventoryDatabase
+from schema import parse_model_year
+from vin_cache import VinDecodeCache
+from vin_check import validate_vins
+from vin_engine import LocalVinDecoder
+
+VPIC_BATCH_URL = 'https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVINValuesBatch/'
+
+# vPIC accepts at most 50 VINs per DecodeVINValuesBatch request
+BATCH_SIZE = 50
+
+# (connect, read) timeouts in seconds for vPIC requests
+REQUEST_TIMEOUT = (5, 30)
+
+# Number of decode requests allowed in flight at once
+MAX_WORKERS = 4
+
+VIN_SEPARATORS = re.compile(r'[\s,;]+')
+
+
+def normalize_vin(vin):
+    return vin.strip().upper()
+
+
+def parse_vin_text(text):
+    """Splits pasted text into unique, normalized VINs, keeping their original order."""
+    vins = []
+    seen = set()
+    for token in VIN_SEPARATORS.split(text):
+        vin = normalize_vin(token)
+        if vin and vin not in seen:
+            seen.add(vin)
+            vins.append(vin)
+    return vins
+
+
+def read_vin_file(path):
+    """
+    Reads VINs from a text or CSV file. CSV files use the column named "VIN" if there
+    is one, otherwise the first column.
+    """
+    with open(path, newline='') as f:
+        if os.path.splitext(path)[1].lower() != '.csv':
+            return parse_vin_text(f.read())
+
+        rows = csv.reader(f)
+        header = next(rows, [])
+        names = [name.strip().upper() for name in header]
+        if 'VIN' in names:
+            column = names.index('VIN')
+            cells = []
+        else:
+            column = 0
+            cells = header[:1]
+        cells.extend(row[column] for row in rows if len(row) > column)
+        return parse_vin_text("\n".join(cells))
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def create_session(pool_size=MAX_WORKERS):
+    """A requests session whose connection pool is shared by all decode workers."""
+    session = requests.Session()
+    # Only retry failed connects; a POST that reached the server is not resent
+    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def decode_vin_batch(vins, url=VPIC_BATCH_URL, session=None, timeout=REQUEST_TIMEOUT):
+    """
+    Decodes a list of VINs with a single DecodeVINValuesBatch request.
+    Returns the vPIC result dicts keyed by VIN.
+    """
+    post_fields = {'format': 'json', 'data': ";".join(vins)}
+    response = (session or requests).post(url, data=post_fields, timeout=timeout)
+    response.raise_for_status()
+    logging.debug(f"API request sent to decode {len(vins)} VINs")
+    results = {}
+    for result in response.json().get("Results", []):
+        results[normalize_vin(result.get("VIN", ""))] = result
+    return results
+
+
+def car_from_result(vin, result):
+    """Builds the values insert_car expects from a vPIC decode result."""
+    make = (result.get("Make") or "N/A").upper()
+    model = (result.get("Model") or "N/A").upper()
+    try:
+        model_year = parse_model_year(result.get("ModelYear"))
+    except ValueError:
+        model_year = None
+    series = (result.get("Series") or "N/A").upper()
+
+    # Default values for options and key features
+    options = " "
+    key_features = " "
+    stock_number = vin[-4:]  # Last 4 digits of VIN
+    return vin, make, model, model_year, series, options, key_features, stock_number
+
+
+class VinDecodeService:
+    """
+    Decodes VINs on a small pool of worker threads sharing one pooled session.
+    VINs found in the decode cache or resolved by the local snapshot decoder skip the
+    request, and cached results (even expired ones) are used when vPIC can't be reached.
+    """
+
+    def __init__(self, url=VPIC_BATCH_URL, max_workers=MAX_WORKERS, timeout=REQUEST_TIMEOUT, cache=None,
+                 local_decoder=None):
+        self.url = url
+        self.timeout = timeout
+        self.cache = cache
+        self.local_decoder = local_decoder
+        self.session = create_session(max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vin-decode")
+
+    def decode(self, vins):
+        # Runs on a worker thread
+        results = {}
+        missing = []
+        for vin in vins:
+            result = self.cache.get(vin) if self.cache else None
+            if result is None and self.local_decoder:
+                result = self.local_decoder.decode(vin)
+            if result is not None:
+                results[vin] = result
+            else:
+                missing.append(vin)
+        if not missing:
+            return results
+
+        try:
+            fetched = decode_vin_batch(missing, url=self.url, session=self.session, timeout=self.timeout)
+        except (requests.RequestException, ValueError) as e:
+            if self.cache is None:
+                raise
+            logging.error(f"vPIC unavailable, falling back to cached results: {e}")
+            for vin in missing:
+                result = self.cache.get(vin, allow_stale=True)
+                results[vin] = result or {"VIN": vin, "ErrorText": f"Not cached and vPIC is unavailable: {e}"}
+            return results
+
+        if self.cache:
+            self.cache.put_many(fetched)
+        results.update(fetched)
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+        if self.local_decoder:
+            self.local_decoder.close()
+
+
+class BulkIntakeReport:
+    def __init__(self):
+        self.added = []
+        self.failures = []  # (vin, reason) pairs
+
+    def fail(self, vin, reason):
+        logging.debug(f"Bulk intake failed for VIN {vin}: {reason}")
+        self.failures.append((vin, reason))
+
+
+def split_valid_vins(vins, report):
+    """
+    Returns the VINs that pass local validation, recording the rest as failures. This runs
+    before anything is sent to vPIC, so mistyped VINs never cost a decode request.
+    """
+    valid_vins = []
+    for vin, error in zip(vins, validate_vins(vins)):
+        if error:
+            report.fail(vin, error)
+        else:
+            valid_vins.append(vin)
+    return valid_vins
+
+
+def insert_decoded_chunk(chunk, results, insert_cars, report):
+    """Inserts the decoded cars of one chunk in a single insert_cars transaction."""
+    cars = []
+    for vin in chunk:
+        result = results.get(vin)
+        if result and result.get("Make"):
+            cars.append(car_from_result(vin, result))
+        elif result and result.get("ErrorText"):
+            report.fail(vin, result["ErrorText"])
+        else:
+            report.fail(vin, "No results found for this VIN.")
+
+    failed = {}
+    for vin, reason in insert_cars(cars):
+        failed[vin] = reason
+        report.fail(vin, reason)
+    added = [car[0] for car in cars if car[0] not in failed]
+    report.added.extend(added)
+    return added
+
+
+def decode_and_insert(chunk, decode, insert_cars, report=None):
+    """
+    Decodes one chunk of valid VINs with decode (VinDecodeService.decode) and inserts the
+    decoded cars in one insert_cars transaction. A failed decode request fails the whole
+    chunk in the report. Safe to run on a worker thread. Returns the report.
+    """
+    if report is None:
+        report = BulkIntakeReport()
+    try:
+        results = decode(chunk)
+    except (requests.RequestException, ValueError) as e:
+        logging.error(f"Batch VIN decode failed: {e}")
+        for vin in chunk:
+            report.fail(vin, f"Decode request failed: {e}")
+        return report
+    insert_decoded_chunk(chunk, results, insert_cars, report)
+    return report
+
+
+def intake_vins(vins, decode, insert_cars, batch_size=BATCH_SIZE):
+    """
+    Bulk intake without the UI: validates the VINs, drops repeats, then decodes and
+    inserts batch_size VINs at a time with decode_and_insert(). Returns a BulkIntakeReport.
+    """
+    report = BulkIntakeReport()
+    for chunk in chunked(split_valid_vins(list(dict.fromkeys(vins)), report), batch_size):
+        decode_and_insert(chunk, decode, insert_cars, report)
+    logging.debug(f"Bulk intake finished: {len(report.added)} added, {len(report.failures)} failed")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode VINs from a text or CSV file and add the cars")
+    parser.add_argument("path")
+    parser.add_argument("--db", default=INVENTORY_DB)
+    parser.add_argument("--url", default=VPIC_BATCH_URL)
+    args = parser.parse_args()
+
+    database = InventoryDatabase(args.db)
+    service = VinDecodeService(url=args.url, cache=VinDecodeCache(), local_decoder=LocalVinDecoder.open_if_present())
+    try:
+        intake = intake_vins(read_vin_file(args.path), service.decode, database.insert_cars)
+        for failed_vin, reason in intake.failures:
+            print(f"{failed_vin}: {reason}")
+        print(f"{len(intake.added)} cars added, {len(intake.failures)} failed")
+    finally:
+        service.shutdown()
+        database.close()
@@ -0,0 +1,216 @@
+import argparse
+import csv
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from vin_check import MODEL_YEAR_CODES, decode_model_year, wmi as world_manufacturer_id
+
+# Local copy of the vPIC WMI and pattern tables, built with import_snapshot()
+SNAPSHOT_DB = 'vpic_snapshot.db'
+
+WILDCARD = '*'
+
+
+def import_snapshot(source_dir, path=SNAPSHOT_DB):
+    """
+    Builds the snapshot database from wmi.csv (wmi, make) and patterns.csv
+    (wmi, pattern, year_from, year_to, model, series). A pattern covers VIN
+    positions 4-8 and uses * for positions that can be anything.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript('''
+            DROP TABLE IF EXISTS wmi;
+            DROP TABLE IF EXISTS vin_patterns;
+            CREATE TABLE wmi (
+                wmi TEXT PRIMARY KEY,
+                make TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE vin_patterns (
+                id INTEGER PRIMARY KEY,
+                wmi TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                year_from INTEGER,
+                year_to INTEGER,
+                model TEXT,
+                series TEXT
+            );
+        ''')
+        with open(os.path.join(source_dir, 'wmi.csv'), newline='') as f:
+            conn.executemany("INSERT OR REPLACE INTO wmi VALUES (?, ?)",
+                             ((row['wmi'].upper(), row['make'].upper()) for row in csv.DictReader(f)))
+        with open(os.path.join(source_dir, 'patterns.csv'), newline='') as f:
+            conn.executemany('''
+                INSERT INTO vin_patterns (wmi, pattern, year_from, year_to, model, series)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', ((row['wmi'].upper(), row['pattern'].upper().ljust(5, WILDCARD), row['year_from'] or None,
+                   row['year_to'] or None, row['model'].upper(), row.get('series', '').upper())
+                  for row in csv.DictReader(f)))
+        conn.execute("CREATE INDEX idx_vin_patterns_wmi ON vin_patterns (wmi, pattern)")
+        conn.commit()
+        logging.debug(f"Imported vPIC snapshot into {path}")
+    finally:
+        conn.close()
+
+
+class LocalVinDecoder:
+    """
+    Decodes make, model, model year and series from a vPIC snapshot without any
+    network access.
+
+    Opening the snapshot costs no more than opening the file: a WMI's make and patterns
+    are read through the wmi primary key and idx_vin_patterns_wmi the first time one of
+    its VINs is decoded, and memoized. Patterns are grouped by which VDS positions they
+    fix (their mask), so a decode is one dict lookup per distinct mask, most specific
+    mask first. decode() may be called from several worker threads.
+    """
+
+    def __init__(self, path=SNAPSHOT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA mmap_size = 268435456")
+        self._lock = threading.Lock()
+        self._wmis = {}  # wmi -> (make, [(mask positions, {projected VDS: [entries]})]), or None if unknown
+        logging.debug(f"Opened vPIC snapshot {path}")
+
+    def close(self):
+        self.conn.close()
+
+    def _load_wmi(self, wmi):
+        with self._lock:
+            row = self.conn.execute("SELECT make FROM wmi WHERE wmi = ?", (wmi,)).fetchone()
+            if row is None:
+                return None
+            masks = {}
+            for pattern, year_from, year_to, model, series in self.conn.execute(
+                    "SELECT pattern, year_from, year_to, model, series FROM vin_patterns WHERE wmi = ?", (wmi,)):
+                positions = tuple(i for i, char in enumerate(pattern) if char != WILDCARD)
+                projected = "".join(pattern[i] for i in positions)
+                masks.setdefault(positions, {}).setdefault(projected, []).append(
+                    (year_from or 0, year_to or 9999, model, series))
+        return row[0], sorted(masks.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _wmi_entry(self, wmi):
+        try:
+            return self._wmis[wmi]
+        except KeyError:
+            entry = self._wmis[wmi] = self._load_wmi(wmi)
+            return entry
+
+    @classmethod
+    def open_if_present(cls, path=SNAPSHOT_DB):
+        if not os.path.exists(path):
+            logging.debug(f"No vPIC snapshot at {path}, VINs will be decoded online")
+            return None
+        return cls(path)
+
+    def decode(self, vin):
+        """Returns a vPIC-style result dict, or None if the snapshot can't resolve the VIN."""
+        if len(vin) != 17:
+            return None
+        # Small manufacturers are listed under their six-character WMI
+        wmi = world_manufacturer_id(vin)
+        entry = self._wmi_entry(wmi)
+        if entry is None and len(wmi) > 3:
+            entry = self._wmi_entry(vin[:3])
+        if entry is None:
+            return None
+        make, masks = entry
+        year = decode_model_year(vin)
+        vds = vin[3:8]
+        for positions, entries in masks:
+            candidates = entries.get("".join([vds[i] for i in positions]))
+            if not candidates:
+                continue
+            for year_from, year_to, model, series in candidates:
+                if year is None or year_from <= year <= year_to:
+                    return {
+                        "VIN": vin,
+                        "Make": make,
+                        "Model": model,
+                        "ModelYear": str(year) if year else "",
+                        "Series": series,
+                        "ErrorCode": "0",
+                        "Source": "local",
+                    }
+        return None
+
+    def decode_many(self, vins):
+        """Returns {vin: result} for the VINs the snapshot can resolve."""
+        results = {}
+        for vin in vins:
+            result = self.decode(vin)
+            if result is not None:
+                results[vin] = result
+        return results
+
+
+def _build_benchmark_snapshot(directory, wmi_count=500, patterns_per_wmi=200):
+    rng = random.Random(1)
+    alphabet = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+    wmis = set()
+    while len(wmis) < wmi_count:
+        wmis.add("".join(rng.choice(alphabet) for _ in range(3)))
+    with open(os.path.join(directory, 'wmi.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['wmi', 'make'])
+        writer.writerows((wmi, f"MAKE{i}") for i, wmi in enumerate(sorted(wmis)))
+    patterns = []
+    with open(os.path.join(directory, 'patterns.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['wmi', 'pattern', 'year_from', 'year_to', 'model', 'series'])
+        for wmi in sorted(wmis):
+            for i in range(patterns_per_wmi):
+                pattern = "".join(rng.choice(alphabet) for _ in range(3)) + rng.choice(["**", "*" + rng.choice(alphabet)])
+                writer.writerow([wmi, pattern, 1980, 2039, f"MODEL{i}", f"SERIES{i % 7}"])
+                patterns.append(wmi + pattern)
+    return patterns
+
+
+def benchmark(count=100000):
+    """Decodes count synthetic VINs against a synthetic snapshot and prints the throughput."""
+    with tempfile.TemporaryDirectory() as directory:
+        patterns = _build_benchmark_snapshot(directory)
+        path = os.path.join(directory, 'snapshot.db')
+        import_snapshot(directory, path)
+        started = time.perf_counter()
+        decoder = LocalVinDecoder(path)
+        print(f"Opened snapshot in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        rng = random.Random(2)
+        alphabet = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+        # Fill the wildcards of random snapshot patterns so most VINs resolve
+        vins = ["".join([char if char != WILDCARD else rng.choice(alphabet) for char in rng.choice(patterns)]
+                        + [rng.choice(alphabet), rng.choice(MODEL_YEAR_CODES)]
+                        + [rng.choice(alphabet) for _ in range(7)])
+                for _ in range(count)]
+
+        # The first pass includes reading every WMI's patterns from the snapshot
+        for label in ("first pass", "memoized"):
+            started = time.perf_counter()
+            results = decoder.decode_many(vins)
+            elapsed = time.perf_counter() - started
+            print(f"Decoded {count} VINs in {elapsed:.3f} s ({elapsed / count * 1e6:.2f} us/VIN), {label}, "
+                  f"{len(results)} resolved locally")
+        decoder.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local vPIC snapshot VIN decoder")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="build the snapshot from wmi.csv and patterns.csv")
+    import_parser.add_argument("source_dir")
+    import_parser.add_argument("path", nargs="?", default=SNAPSHOT_DB)
+    benchmark_parser = subparsers.add_parser("benchmark", help="decode synthetic VINs and report throughput")
+    benchmark_parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_snapshot(args.source_dir, args.path)
+    else:
+        benchmark(args.count)
@@ -0,0 +1,229 @@
+import logging
+
+
+# Extra rows rendered above and below the viewport so fast scrolling doesn't show gaps
+OVERSCAN_ROWS = 2
+
+
+class SelectionModel:
+    """
+    Keeps track of which rows are checked, keyed by car id, so that selection
+    survives row widgets being recycled while scrolling.
+    """
+
+    def __init__(self):
+        self._selected = set()
+
+    def is_selected(self, key):
+        return key in self._selected
+
+    def set_selected(self, key, selected):
+        if selected:
+            self._selected.add(key)
+        else:
+            self._selected.discard(key)
+
+    def discard(self, key):
+        self._selected.discard(key)
+
+    def clear(self):
+        self._selected.clear()
+
+    def selected_keys(self):
+        return set(self._selected)
+
+    def __len__(self):
+        return len(self._selected)
+
+
+class VirtualList:
+    """
+    Renders a long list of items inside a canvas using a small, fixed pool of row widgets.
+
+    Only the rows inside the visible part of the canvas (plus OVERSCAN_ROWS on either side)
+    get real widgets. Rows stay attached to the item key they display, so scrolling or
+    refreshing only re-renders rows for items that came into view or whose data changed;
+    everything else is just moved.
+
+    row_factory(parent) must return a widget with a render(item) method.
+    """
+
+    def __init__(self, canvas, scrollbar, row_factory, key=lambda item: item[0], row_gap=10, padx=10,
+                 overscan=OVERSCAN_ROWS, on_near_end=None):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.row_factory = row_factory
+        self.key = key
+        self.row_gap = row_gap
+        self.padx = padx
+        self.overscan = overscan
+        self.row_height = None
+        self.items = []
+        self.on_near_end = on_near_end  # called once the last rows come into view
+        self._near_end_pending = False
+
+        self._index_of = {}  # item key -> position in self.items
+        self._rows_by_key = {}  # item key -> row widget currently showing it
+        self._free_rows = []  # pooled rows not showing anything
+        self._window_of = {}  # row widget -> canvas window id
+        self._item_of = {}  # row widget -> item it last rendered
+        self._rendering = False
+
+        self.canvas.configure(yscrollcommand=self._on_yview)
+        self.canvas.bind("<Configure>", lambda e: self.render())
+
+    def reconcile(self, items):
+        """
+        Replaces the list contents with items, keeping rows for unchanged keys.
+        Returns (added, removed, changed) counts.
+        """
+        items = list(items)
+        old_items = {self.key(item): item for item in self.items}
+        new_keys = set()
+        added = changed = 0
+        for item in items:
+            key = self.key(item)
+            new_keys.add(key)
+            old_item = old_items.get(key)
+            if old_item is None:
+                added += 1
+            elif old_item != item:
+                changed += 1
+        removed = len(old_items.keys() - new_keys)
+
+        anchor = self._scroll_anchor()
+        self.items = items
+        self._index_of = {self.key(item): index for index, item in enumerate(items)}
+        self._update_scrollregion()
+        self._restore_scroll_anchor(anchor)
+        self.render()
+        logging.debug(f"Reconciled list: {added} added, {removed} removed, {changed} changed")
+        return added, removed, changed
+
+    def _scroll_anchor(self):
+        # The first fully visible item and how far into it the view starts
+        if not self.items or self.row_height is None:
+            return None
+        top = self.canvas.canvasy(0)
+        index = min(int(top // self.row_height), len(self.items) - 1)
+        return self.key(self.items[index]), top - index * self.row_height
+
+    def _restore_scroll_anchor(self, anchor):
+        if anchor is None or not self.items:
+            return
+        key, offset = anchor
+        index = self._index_of.get(key)
+        if index is None:
+            return
+        total = len(self.items) * self.row_height
+        self.canvas.yview_moveto((index * self.row_height + offset) / total)
+
+    def _near_end(self):
+        self._near_end_pending = False
+        self.on_near_end()
+
+    def _on_yview(self, first, last):
+        self.scrollbar.set(first, last)
+        self.render()
+
+    def _update_scrollregion(self):
+        height = len(self.items) * (self.row_height or 0)
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+
+    def _measure_row_height(self):
+        row = self._add_row()
+        self._free_rows.append(row)
+        row.update_idletasks()
+        self.row_height = row.winfo_reqheight() + self.row_gap
+        logging.debug(f"Virtual list row height measured at {self.row_height}px")
+        self._update_scrollregion()
+
+    def _add_row(self):
+        row = self.row_factory(self.canvas)
+        self._window_of[row] = self.canvas.create_window(0, 0, window=row, anchor="nw", state="hidden")
+        return row
+
+    def _visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // self.row_height) - self.overscan)
+        last = min(len(self.items), int(bottom // self.row_height) + 1 + self.overscan)
+        return first, last
+
+    def render(self):
+        if self._rendering:
+            return
+        self._rendering = True
+        try:
+            if self.items and self.row_height is None:
+                self._measure_row_height()
+            first, last = self._visible_range() if self.items else (0, 0)
+            visible = {self.key(self.items[index]) for index in range(first, last)}
+
+            # Release rows whose item scrolled out of view or left the list
+            for key in list(self._rows_by_key):
+                if key not in visible:
+                    row = self._rows_by_key.pop(key)
+                    self.canvas.itemconfigure(self._window_of[row], state="hidden")
+                    self._item_of.pop(row, None)
+                    self._free_rows.append(row)
+
+            width = max(1, self.canvas.winfo_width() - 2 * self.padx)
+            for index in range(first, last):
+                item = self.items[index]
+                key = self.key(item)
+                row = self._rows_by_key.get(key)
+                if row is None:
+                    row = self._free_rows.pop() if self._free_rows else self._add_row()
+                    self._rows_by_key[key] = row
+                if self._item_of.get(row) != item:
+                    row.render(item)
+                    self._item_of[row] = item
+                window = self._window_of[row]
+                self.canvas.coords(window, self.padx, index * self.row_height)
+                self.canvas.itemconfigure(window, state="normal", width=width,
+                                          height=self.row_height - self.row_gap)
+
+            if self.on_near_end and self.items and last >= len(self.items) and not self._near_end_pending:
+                # Deferred so the callback can reconcile new items outside this render pass
+                self._near_end_pending = True
+                self.canvas.after_idle(self._near_end)
+        finally:
+            self._rendering = False
+
+
+class PagedListLoader:
+    """
+    Feeds a VirtualList from a keyset-paginated query, fetching the next page
+    when the user scrolls to the end of what has been loaded so far.
+
+    fetch_page(after, limit) must return (rows, next_cursor), with next_cursor
+    None once there are no more rows.
+    """
+
+    def __init__(self, car_list, fetch_page, page_size):
+        self.car_list = car_list
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.items = []
+        self.cursor = None
+        car_list.on_near_end = self.load_more
+
+    def reset(self):
+        # Start over from the first page, e.g. after the sort order changed
+        self.items = []
+        self.reload()
+
+    def reload(self):
+        # Re-query everything loaded so far in one go so the list can be reconciled in place
+        rows, self.cursor = self.fetch_page(None, max(self.page_size, len(self.items)))
+        self.items = list(rows)
+        self.car_list.reconcile(self.items)
+
+    def load_more(self):
+        if self.cursor is None:
+            return
+        rows, self.cursor = self.fetch_page(self.cursor, self.page_size)
+        self.items.extend(rows)
+        logging.debug(f"Loaded {len(rows)} more rows, {len(self.items)} in total")
+        self.car_list.reconcile(self.items)